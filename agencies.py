@@ -0,0 +1,205 @@
+"""
+複数の管理ライバーリスト（事務所・チームごと）の月次サマリーの一括作成
+
+KPI・ルームリスト・3種類の分配額データはプラットフォーム全体のファイルで、
+どのルームを結果に含めるかは管理ライバーリストだけで決まる。
+そのため、全体のファイルは1回だけ取得・パースし、分配額のルームへの紐づけ（pipeline.revenue_by_room）も1回だけ行い、
+管理ライバーリストごとの結果リストとCSVはその共有の表から並列に作成して、1つの ZIP にまとめる。
+差分再計算・スナップショットは処理月の既定の管理ライバーリスト（pipeline.summarize）だけが対象のため、ここでは行わない。
+"""
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from export import agency_file_name, to_csv_bytes, to_zip_bytes
+from fetch import FetchResult
+from metrics import RunRecorder
+from pipeline import (
+    LIVER_LIST_URL,
+    SOURCE_SCHEMAS,
+    build_results,
+    fetch_status_table,
+    join_sources,
+    load_sources_concurrently,
+    map_liver,
+    map_month_inputs,
+    month_labels,
+    month_sources,
+    no_report,
+    parse_source,
+    revenue_by_room,
+    take_loaded,
+)
+
+
+# --- 定数 ---
+# 結果リストを並列に作成するワーカー数の上限
+AGENCY_WORKERS = int(os.environ.get("SR_SUMMARY_AGENCY_WORKERS", min(8, os.cpu_count() or 1)))
+# 既定の管理ライバーリストの名前
+DEFAULT_LIST_NAME = "全体"
+
+
+@dataclass
+class AgencySummary:
+    """複数の管理ライバーリストの1か月分の処理結果"""
+    year: int
+    month: int
+    total_revenue: float
+    mk_rank: int
+    results: dict = field(default_factory=dict)     # {名前: 結果リスト}
+    csv_files: dict = field(default_factory=dict)   # {ファイル名: 結果CSVのバイト列}
+    errors: dict = field(default_factory=dict)      # {名前: 読み込めなかった理由}
+    metrics: RunRecorder = None
+
+    def zip_bytes(self):
+        """全ての結果CSVをまとめた ZIP"""
+        return to_zip_bytes(self.csv_files)
+
+
+def parse_liver_lists(text):
+    """
+    「名前,URL」の行（1行に1つ）を {名前: URL} にする
+    名前を省略した行（URLだけの行）はファイル名（拡張子を除く）を名前にし、空行と # で始まる行は無視する
+    """
+    liver_lists = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        name, _, url = line.rpartition(",")
+        name = name.strip() or url.rstrip("/").split("/")[-1].rsplit(".", 1)[0]
+        liver_lists[name] = url.strip()
+    return liver_lists
+
+
+def liver_lists_digest(liver_lists):
+    """
+    管理ライバーリストの指定（名前と、URL またはアップロードされたCSVの内容）の指紋
+    同じ指定の一括作成だけを同じジョブとして扱うために使う
+    """
+    digest = hashlib.sha256()
+    for name, source in liver_lists.items():
+        body = source if isinstance(source, bytes) else source.encode("utf-8")
+        for part in (name.encode("utf-8"), b"csv" if isinstance(source, bytes) else b"url", body):
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+    return digest.hexdigest()
+
+
+def default_liver_lists():
+    return {DEFAULT_LIST_NAME: LIVER_LIST_URL}
+
+
+def _liver_key(name):
+    return f"liver:{name}"
+
+
+def agency_file_names(names, year, month):
+    """
+    管理ライバーリストの名前ごとの結果CSVのファイル名 {名前: ファイル名}
+    ファイル名に使えない文字を置き換えた結果が同じになる名前（"A B" と "A/B" など）は、後の名前に "_2" などを付けて区別する
+    """
+    file_names = {}
+    used = set()
+    for name in names:
+        file_name = agency_file_name(name, year, month)
+        number = 2
+        while file_name in used:
+            file_name = agency_file_name(f"{name}_{number}", year, month)
+            number += 1
+        used.add(file_name)
+        file_names[name] = file_name
+    return file_names
+
+
+def _load_uploaded(name, body, recorder):
+    """アップロードされた管理ライバーリストの本文をパースし、並列読み込みと同じ形式の結果を返す"""
+    fetched = FetchResult(f"upload:{name}", body, 200, False)
+    try:
+        with recorder.stage(f"parse.{_liver_key(name)}") as stage:
+            df = parse_source(fetched, SOURCE_SCHEMAS["liver"])
+            stage.rows = len(df)
+            stage.bytes = fetched.nbytes
+        return df, None, fetched
+    except Exception as e:
+        return None, f"管理ライバーリスト（{name}）の読み込み中にエラーが発生しました: {e}", None
+
+
+def summarize_agencies(year, month, liver_lists, report=None, recorder=None, force=False, max_workers=None):
+    """
+    管理ライバーリストごとの月次サマリーを作成し、AgencySummary を返す（全体のファイルが読めない場合は None）
+
+    liver_lists: {名前: 管理ライバーリストのURL または CSVの本文（bytes）}
+    読み込めない・列が足りない管理ライバーリストは errors に記録して除き、残りのリストの結果を作成する
+    report / recorder / force: pipeline.summarize と同じ
+    """
+    report = report or no_report
+    recorder = recorder or RunRecorder(year, month)
+    delivery_month_str, payment_month_str = month_labels(year, month)
+
+    # --- 2. データの読み込み（全体のファイルと、URL指定の管理ライバーリストを1回の並列読み込みで取得する） ---
+    sources = month_sources(year, month)
+    _, liver_name, liver_schema = sources.pop("liver")
+    for name, source in liver_lists.items():
+        if isinstance(source, str):
+            sources[_liver_key(name)] = (source, f"{liver_name}（{name}）", liver_schema)
+    with recorder.stage("load") as stage:
+        loaded = load_sources_concurrently(sources, recorder=recorder, force=force)
+        for name, source in liver_lists.items():
+            if not isinstance(source, str):
+                loaded[_liver_key(name)] = _load_uploaded(name, source, recorder)
+        stage.bytes = sum(fetched.nbytes for _, _, fetched in loaded.values() if fetched is not None)
+
+    report("markdown", "##### データの取得状況")
+    report("table", fetch_status_table(loaded, sources))
+
+    inputs = map_month_inputs(year, month, loaded, report, recorder)
+    if inputs is None:
+        return None
+    summary = AgencySummary(year, month, inputs.total_revenue, inputs.mk_rank, metrics=recorder)
+
+    report("markdown", f"##### 管理ライバーリストの読み込み（{len(liver_lists)} 件）")
+    livers = {}
+    for name in liver_lists:
+        liver_df = take_loaded(loaded, report, _liver_key(name))
+        liver = None if liver_df is None else map_liver(liver_df, report, recorder, stage=f"map.{_liver_key(name)}")
+        if liver is None:
+            summary.errors[name] = loaded[_liver_key(name)][1] or "1列目:ID, 2列目:愛称 が見つかりません。"
+            continue
+        livers[name] = liver
+    if not livers:
+        report("error", "読み込めた管理ライバーリストがありません。")
+        return summary
+
+    # --- 3. 結果生成 ---
+    # 分配額のルームへの紐づけは全てのリストで共通のため、1回だけ行う
+    with recorder.stage("join.revenues", rows=sum(len(f) for f in inputs.revenues.values() if f is not None)):
+        by_room = revenue_by_room(inputs.room_accounts, inputs.revenues)
+
+    def build(name, liver):
+        joined = join_sources(
+            liver, inputs.room_list_ids, inputs.room_accounts, inputs.kpi_room_ids, inputs.revenues,
+            by_room=by_room,
+        )
+        results_df = build_results(joined, inputs.mk_rank, delivery_month_str, payment_month_str)
+        return results_df, to_csv_bytes(results_df)
+
+    file_names = agency_file_names(livers, year, month)
+    for name, file_name in file_names.items():
+        if file_name != agency_file_name(name, year, month):
+            report("warning", f"{name}: 他のリストとファイル名が重なるため、{file_name} として出力します。")
+
+    with recorder.stage("agencies", rows=sum(len(liver) for liver in livers.values())) as stage:
+        with ThreadPoolExecutor(max_workers=min(max_workers or AGENCY_WORKERS, len(livers))) as executor:
+            futures = {name: executor.submit(build, name, liver) for name, liver in livers.items()}
+            for name, future in futures.items():
+                results_df, csv_bytes = future.result()
+                summary.results[name] = results_df
+                summary.csv_files[file_names[name]] = csv_bytes
+        stage.bytes = sum(len(data) for data in summary.csv_files.values())
+        stage.note = f"管理ライバーリスト {len(livers)} 件"
+
+    for name, results_df in summary.results.items():
+        report("success", f"{name}: 結果リスト **{len(results_df)}** 件を作成しました。")
+    return summary
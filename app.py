@@ -1,8 +1,37 @@
+import sqlite3
+
 import streamlit as st
 import pandas as pd
 from io import StringIO
-import datetime
-from dateutil.relativedelta import relativedelta
+
+from pipeline import (
+    KPI_DATA_BASE_URL,
+    LIVER_LIST_URL,
+    ROOM_LIST_URL,
+    SALES_DATA_BASE_URL,
+    PAID_LIVE_BASE_URL,
+    TIME_CHARGE_BASE_URL,
+    OPTIONAL_SOURCES,
+    get_processed_months,
+    load_snapshot,
+    source_urls,
+)
+from export import (
+    EXPORT_FORMATS,
+    export_file_name,
+    to_csv_bytes,
+    to_parquet_bytes,
+    to_xlsx_bytes,
+    xlsx_available,
+)
+from snapshot import snapshot_store
+from jobs import CANCELLED, DONE, STATUS_LABELS, AgencyJob, job_registry
+from agencies import DEFAULT_LIST_NAME, parse_liver_lists
+from preflight import FRESH, MISSING, VERDICT_LABELS, overall_verdict, preflight_cache, status_table
+from viewer import SORT_COLUMNS
+from simulate import MIN_THRESHOLD_SHIFT, MK_RANKS, build_scenarios, parse_numbers
+from delta import TOP_N, compare_with_previous
+from history import SEARCH_LIMIT, history_index
 
 
 # --- ページ設定 ---
@@ -10,55 +39,55 @@ from dateutil.relativedelta import relativedelta
 st.set_page_config(layout="wide", page_title="SHOWROOM 月初サマリー作成ツール")
 
 
-# --- 定数（URL） ---
-KPI_DATA_BASE_URL = "https://mksoul-pro.com/showroom/csv/{year}-{month:02d}_all_all.csv"
-LIVER_LIST_URL = "https://mksoul-pro.com/showroom/file/m-liver-list.csv"
-ROOM_LIST_URL = "https://mksoul-pro.com/showroom/file/room_list.csv"
+## データの準備・読み込み関数
+# ※ URL定数・CSVの取得とパース・集計処理は、バッチ実行と共通化するため pipeline.py に移動
 
-# 【修正箇所】 固定ファイルURLから、処理月（{year}{month:02d}）を挿入する動的ベースURLへ変更
+# @st.cache_data は削除済み（代わりにサーバー側の更新有無を毎回確認するディスクキャッシュと、
+# 本文が同じ場合のみ全セッションで共有するパース済みデータのキャッシュ（source_cache.py）を使用）
+# CSVの読み込みは全て pipeline.summarize（ジョブ）から行う
 
-# ルーム売上分配額データURL
-SALES_DATA_BASE_URL = "https://mksoul-pro.com/showroom/sales-app_v2/db/point_hist_with_mixed_rate_csv_donwload_for_room_{year}{month:02d}.csv"
-# プレミアムライブ分配額データURL
-PAID_LIVE_BASE_URL = "https://mksoul-pro.com/showroom/sales-app_v2/db/paid_live_hist_invoice_format_{year}{month:02d}.csv"
-# タイムチャージ分配額データURL
-TIME_CHARGE_BASE_URL = "https://mksoul-pro.com/showroom/sales-app_v2/db/show_rank_time_charge_hist_invoice_format_{year}{month:02d}.csv"
 
+def report_to_streamlit(level, message):
+    """pipeline.summarize からの進捗通知を画面に表示する"""
+    if level == "table":
+        st.dataframe(message, use_container_width=True, hide_index=True)
+    else:
+        getattr(st, level)(message)
+
+# --- データ更新チェック項目と、事前確認（preflight.py）の対象ファイル ---
+CHECK_SOURCES = {
+    "check1": ("liver",),
+    "check2": ("room_list",),
+    "check3": ("kpi",),
+    "check4": ("sales", "paid_live", "time_charge"),
+}
+SOURCE_NAMES = {
+    "liver": "管理ライバーリスト",
+    "kpi": "KPIデータ",
+    "room_list": "ルームリスト",
+    "sales": "売上分配額データ",
+    "paid_live": "プレミアムライブ分配額データ",
+    "time_charge": "タイムチャージ分配額データ",
+}
+
+
+def apply_preflight(year, month, checked_at, probes):
+    """
+    事前確認の結果をチェックボックスに反映し、{チェック項目: 判定} を返す
+    全てのファイルが最新の項目はチェックを入れ、それ以外は外す（新しい確認結果が出たときだけ反映し、
+    同じ確認結果の間は担当者が入れた・外したチェックを維持する）
+    """
+    verdicts = {
+        key: overall_verdict([probes[source] for source in sources])
+        for key, sources in CHECK_SOURCES.items()
+    }
+    token = (year, month, checked_at)
+    if st.session_state.get("preflight_applied") != token:
+        for key, verdict in verdicts.items():
+            st.session_state[key] = verdict == FRESH
+        st.session_state.preflight_applied = token
+    return verdicts
 
-## データの準備・読み込み関数
-# @st.cache_data は削除済み
-def load_data(url, name="データ", header='infer'):
-    """URLからCSVを読み込み、DataFrameとして返す（文字化け対策のためUTF-8, Shift-JISを試行）"""
-    try:
-        # **【文字化け対策】** まずは標準的な 'utf8' で試行
-        df = pd.read_csv(url, header=header, encoding='utf8') 
-        return df
-    except UnicodeDecodeError:
-        # UTF-8で失敗した場合、次に日本語でよく使われる 'shift-jis' を試行
-        try:
-            df = pd.read_csv(url, header=header, encoding='shift-jis') 
-            return df
-        except Exception as e:
-            st.error(f"{name}の読み込み（Shift-JIS）に失敗しました: {url}\nエラー: {e}")
-            return None
-    except Exception as e:
-        st.error(f"{name}の読み込みに失敗しました: {url}\nエラー: {e}")
-        return None
-
-# @st.cache_data は削除済み
-def get_processed_months():
-    """プルダウンに表示する処理月リストを生成する"""
-    today = datetime.date.today()
-    current_date = today - relativedelta(months=1)
-    processed_months = []
-
-    for i in range(12): 
-        display_str = f"{current_date.year}年{current_date.month:02d}月分"
-        value_str = f"{current_date.year}-{current_date.month:02d}"
-        processed_months.append((display_str, value_str))
-        current_date = current_date - relativedelta(months=1)
-            
-    return processed_months
 
 # --- 【新規追加】チェックボックスのリセット関数 ---
 def reset_checks():
@@ -71,164 +100,6 @@ def reset_checks():
     st.session_state.check4 = False
 
 
-# --- 個別ランク判定関数 ---
-def get_individual_rank(sales_amount_str):
-    """
-    ルーム売上分配額（文字列）から個別ランクを判定する
-    """
-    if sales_amount_str == "#N/A":
-        return "#N/A"
-    
-    try:
-        amount = float(sales_amount_str)
-        
-        if amount >= 900001:
-            return "SSS"
-        elif amount >= 450001:
-            return "SS"
-        elif amount >= 270001:
-            return "S"
-        elif amount >= 135001:
-            return "A"
-        elif amount >= 90001:
-            return "B"
-        elif amount >= 45001:
-            return "C"
-        elif amount >= 22501:
-            return "D"
-        elif amount >= 0:
-            return "E"
-        else:
-            return "E" 
-            
-    except ValueError:
-        return "#ERROR"
-
-# --- MKランク判定関数 ---
-def get_mk_rank(revenue):
-    """
-    全体分配額合計からMKランク（1〜11）を判定する
-    """
-    if revenue <= 175000:
-        return 1
-    elif revenue <= 350000:
-        return 2
-    elif revenue <= 525000:
-        return 3
-    elif revenue <= 700000:
-        return 4
-    elif revenue <= 875000:
-        return 5
-    elif revenue <= 1050000:
-        return 6
-    elif revenue <= 1225000:
-        return 7
-    elif revenue <= 1400000:
-        return 8
-    elif revenue <= 1575000:
-        return 9
-    elif revenue <= 1750000:
-        return 10
-    else:
-        return 11
-        
-# --- ルーム売上支払想定額計算関数 ---
-def calculate_payment_estimate(individual_rank, mk_rank, individual_revenue):
-    """
-    個別ランク、MKランク、個別分配額から支払想定額を計算する
-    """
-    if individual_revenue == "#N/A" or individual_rank == "#N/A":
-        return "#N/A"
-
-    try:
-        individual_revenue = float(individual_revenue)
-        # 個別ランクに応じた基本レートの辞書 (mk_rank 1, 3, 5, 7, 9, 11 のキーを使用)
-        rank_rates = {
-            'D': {1: 0.750, 3: 0.755, 5: 0.760, 7: 0.765, 9: 0.770, 11: 0.775},
-            'E': {1: 0.725, 3: 0.730, 5: 0.735, 7: 0.740, 9: 0.745, 11: 0.750},
-            'C': {1: 0.775, 3: 0.780, 5: 0.785, 7: 0.790, 9: 0.795, 11: 0.800},
-            'B': {1: 0.800, 3: 0.805, 5: 0.810, 7: 0.815, 9: 0.820, 11: 0.825},
-            'A': {1: 0.825, 3: 0.830, 5: 0.835, 7: 0.840, 9: 0.845, 11: 0.850},
-            'S': {1: 0.850, 3: 0.855, 5: 0.860, 7: 0.865, 9: 0.870, 11: 0.875},
-            'SS': {1: 0.875, 3: 0.880, 5: 0.885, 7: 0.890, 9: 0.895, 11: 0.900},
-            'SSS': {1: 0.900, 3: 0.905, 5: 0.910, 7: 0.915, 9: 0.920, 11: 0.925},
-        }
-
-        # MKランクに応じてキーを決定 (1,2 -> 1, 3,4 -> 3, ...)
-        if mk_rank in [1, 2]:
-            key = 1
-        elif mk_rank in [3, 4]:
-            key = 3
-        elif mk_rank in [5, 6]:
-            key = 5
-        elif mk_rank in [7, 8]:
-            key = 7
-        elif mk_rank in [9, 10]:
-            key = 9
-        elif mk_rank == 11:
-            key = 11
-        else:
-            return "#ERROR_MK"
-
-        # 適用レートの取得
-        rate = rank_rates.get(individual_rank, {}).get(key)
-        
-        if rate is None:
-            return "#ERROR_RANK"
-
-        # 計算式の適用: ($individualRevenue * 1.08 * $rate) / 1.10 * 1.10
-        payment_estimate = (individual_revenue * 1.08 * rate) / 1.10 * 1.10
-        
-        # 結果を小数点以下を四捨五入して整数に丸める
-        return str(round(payment_estimate)) 
-
-    except Exception:
-        return "#ERROR_CALC"
-        
-# --- プレミアムライブ支払想定額計算関数 ---
-def calculate_paid_live_payment_estimate(paid_live_amount_str):
-    """
-    プレミアムライブ分配額から支払想定額を計算する
-    """
-    # プレミアムライブ分配額がない場合はブランクを返す
-    if paid_live_amount_str == "" or paid_live_amount_str == "#N/A":
-        return ""
-
-    try:
-        # 分配額を数値に変換
-        individual_revenue = float(paid_live_amount_str)
-        
-        # 計算式の適用: ($individualRevenue * 1.00 * 1.08 * 0.9) / 1.10 * 1.10
-        payment_estimate = (individual_revenue * 1.08 * 0.9) / 1.10 * 1.10
-        
-        # 結果を小数点以下を四捨五入して整数に丸める
-        return str(round(payment_estimate))
-
-    except ValueError:
-        return "#ERROR_CALC"
-
-# --- タイムチャージ支払想定額計算関数 ---
-def calculate_time_charge_payment_estimate(time_charge_amount_str):
-    """
-    タイムチャージ分配額から支払想定額を計算する
-    """
-    # タイムチャージ分配額がない場合はブランクを返す
-    if time_charge_amount_str == "" or time_charge_amount_str == "#N/A":
-        return ""
-
-    try:
-        # 分配額を数値に変換
-        individual_revenue = float(time_charge_amount_str)
-        
-        # 計算式の適用: ($individualRevenue * 1.08 * 1.00) / 1.10 * 1.10
-        payment_estimate = (individual_revenue * 1.08 * 1.00) / 1.10 * 1.10
-        
-        # 結果を小数点以下を四捨五入して整数に丸める
-        return str(round(payment_estimate))
-
-    except ValueError:
-        return "#ERROR_CALC"
-
 ## メインアプリケーション
 def main():
     #st.title("🎤 SHOWROOM 月初サマリー作成ツール")
@@ -265,10 +136,6 @@ def main():
         
         # ファイル名に使う "202510" の文字列を作成
         file_month_suffix = f"{year}{month:02d}"
-
-        delivery_month_str = f"{year}/{month:02d}"
-        payment_date = datetime.date(year, month, 1) + relativedelta(months=2)
-        payment_month_str = f"{payment_date.year}/{payment_date.month:02d}"
         
     except:
         st.warning("有効な処理月が選択されていません。")
@@ -289,14 +156,32 @@ def main():
     if 'check4' not in st.session_state:
         st.session_state.check4 = False
 
-    # チェックボックスの表示
+    # 6つのCSVの更新日時・サイズを HEAD リクエストで並列に確認する（本文はダウンロードしない。結果は短時間保持）
+    recheck = st.button("🔎 更新状況を再確認する")
+    checked_at, probes = preflight_cache.check(year, month, source_urls(year, month), refresh=recheck)
+    verdicts = apply_preflight(year, month, checked_at, probes)
+    st.dataframe(status_table(probes, SOURCE_NAMES), use_container_width=True, hide_index=True)
+    st.caption(
+        f"確認日時: {checked_at:%Y-%m-%d %H:%M:%S}（{preflight_cache.ttl_s:.0f} 秒間は再確認しません）。"
+        f"処理月の翌月1日以降に更新されたファイルを最新と判定し、自動でチェックを入れています。"
+    )
+    # 必須のファイルが無い項目だけ開始できないようにする（プレミアムライブ・タイムチャージは無くても処理できる）
+    missing = {source for source, result in probes.items() if result.verdict == MISSING}
+    blocked = [key for key, sources in CHECK_SOURCES.items() if missing.intersection(sources) - OPTIONAL_SOURCES]
+    if blocked:
+        st.error("取得できないファイルがあるため、処理を開始できません。ファイルの配置とCookieの有効期限を確認してください。")
+    missing_optional = [SOURCE_NAMES[source] for source in probes if source in missing & OPTIONAL_SOURCES]
+    if missing_optional:
+        st.warning(f"{'・'.join(missing_optional)}を取得できません。このまま処理する場合、該当の列はブランクになります。")
+
+    # チェックボックスの表示（最新と判定できなかった項目は、内容を確認してからチェックを入れる）
     st.markdown("以下のファイルが**最新の状態**であることを確認してください。")
-    check1 = st.checkbox(f"① 管理ライバーリスト（`{LIVER_LIST_URL.split('/')[-1]}`）が最新状態か", key='check1')
-    check2 = st.checkbox(f"② ルームリスト（`{ROOM_LIST_URL.split('/')[-1]}`）が最新状態か", key='check2')
+    check1 = st.checkbox(f"① 管理ライバーリスト（`{LIVER_LIST_URL.split('/')[-1]}`）が最新状態か　{VERDICT_LABELS[verdicts['check1']]}", key='check1', disabled='check1' in blocked)
+    check2 = st.checkbox(f"② ルームリスト（`{ROOM_LIST_URL.split('/')[-1]}`）が最新状態か　{VERDICT_LABELS[verdicts['check2']]}", key='check2', disabled='check2' in blocked)
     
     # KPIデータは `2025-10_all_all.csv` の形式で、選択された月がURLに含まれるため、ファイル名を表示。
     kpi_file_name = KPI_DATA_BASE_URL.format(year=year, month=month).split('/')[-1]
-    check3 = st.checkbox(f"③ 処理月（{display_month_text}）のKPIデータ（`{kpi_file_name}`）が最新状態か", key='check3')
+    check3 = st.checkbox(f"③ 処理月（{display_month_text}）のKPIデータ（`{kpi_file_name}`）が最新状態か　{VERDICT_LABELS[verdicts['check3']]}", key='check3', disabled='check3' in blocked)
     
     # 複数の売上ファイルをまとめてチェック
     # 【修正箇所】 動的なファイル名を取得
@@ -306,244 +191,225 @@ def main():
         TIME_CHARGE_BASE_URL.format(year=year, month=month).split('/')[-1]
     ]
     # チェック項目④のテキストから「分」を削除し、ファイル名を動的に表示
-    check4 = st.checkbox(f"④ 処理月（{display_month_text}）の各種売上データが最新状態か (ファイル例: `{sales_file_names[0]}` 他)", key='check4')
+    check4 = st.checkbox(f"④ 処理月（{display_month_text}）の各種売上データが最新状態か (ファイル例: `{sales_file_names[0]}` 他)　{VERDICT_LABELS[verdicts['check4']]}", key='check4', disabled='check4' in blocked)
 
-    # 全てのチェックボックスがTrueであるかを確認
-    all_checked = check1 and check2 and check3 and check4
+    # 全てのチェックボックスがTrueであるかを確認（取得できないファイルがある場合は開始できない）
+    all_checked = check1 and check2 and check3 and check4 and not blocked
     
     st.markdown("---")
+
+    # 通常は、サーバー側で未更新のCSVは他のセッションと共有しているパース済みのデータを使用する
+    force_refresh = st.checkbox(
+        "🔄 キャッシュを使わずに全てのCSVを取り直す（強制再取得）",
+        key="force_refresh",
+        help="サーバー側の更新日時が変わらないままファイルが差し替えられた場合などに使用します。",
+    )
     
+    # データ処理は処理月ごとのバックグラウンドジョブとして実行し、画面の再実行では結果を保持したまま表示し直す
+    job = job_registry.get(year, month)
+    running = job is not None and job.running
+
     # ボタンの有効/無効を制御
-    if st.button("🚀 データ処理を開始する", type="primary", disabled=not all_checked):
-        # ボタンを押すたびに、process_data内からload_dataが実行され、常に最新データが取得されます。
-        process_data(year, month, delivery_month_str, payment_month_str)
+    if st.button("🚀 データ処理を開始する", type="primary", disabled=not all_checked or running):
+        # ボタンを押すたびに新しいジョブを開始し、常に最新データが取得されます。
+        job = start_job(year, month, force_refresh)
     elif not all_checked:
         st.warning("処理を開始するには、上記の**全てのデータチェック項目にチェック**を入れてください。")
-    else:
+    elif not running:
         # 表示テキストから「分」を削除した display_month_text を使用
         st.info(f"選択された配信月: **{display_month_text}分**。処理を開始するには上記のボタンを押してください。")
-    
+
+    if job is not None:
+        show_job(job)
+
+    # 締め済みの月は、保存済みスナップショットから再ダウンロードなしで表示できる
+    snapshot_meta = snapshot_store.meta(year, month)
+    if snapshot_meta is not None:
+        st.caption(f"💾 {display_month_text}分のスナップショットがあります（作成日時: {snapshot_meta['created_at']}、件数: {snapshot_meta['rows']}）")
+        # 読み込んだ結果はセッションに保持し、ダウンロードボタンのクリックなどの再実行でも表示し続ける
+        snapshot_key = (year, month, snapshot_meta.get("snapshot_id"))
+        if st.button("💾 保存済みスナップショットから表示する（再ダウンロードなし）"):
+            st.session_state.snapshot_view = (snapshot_key, load_snapshot(year, month))
+        view = st.session_state.get("snapshot_view")
+        if view is not None and view[0] == snapshot_key:
+            st.button("スナップショットの表示を閉じる", on_click=st.session_state.pop, args=("snapshot_view", None))
+            show_snapshot(year, month, view[1])
+
     st.markdown("---")
 
+    # 複数の管理ライバーリスト（事務所・チームごと）の結果を、全体のファイルを1回だけ取得してまとめて作成する
+    show_agencies(year, month, all_checked, force_refresh)
 
-# データ処理のメインロジック (ボタンが押されたときのみ実行)
-def process_data(year, month, delivery_month_str, payment_month_str):
-    
-    with st.spinner("データを読み込み、配信有無と売上をチェックしています..."):
-        
-        # --- 2. データの読み込みとマッピング ---
-        
-        # 2.1. 管理ライバーリストの読み込み (m-liver-list.csv)
-        st.markdown(f"##### 管理ライバーリストの読み込みと愛称マッピングの作成")
-        liver_df = load_data(LIVER_LIST_URL, "管理ライバーリスト")
-        if liver_df is None: return
-        
-        if liver_df.shape[1] >= 2:
-            df_keys = liver_df.iloc[:, 0].astype(str).str.strip()
-            df_values = liver_df.iloc[:, 1].astype(str).str.strip() 
-            liver_alias_map = pd.Series(df_values.values, index=df_keys).to_dict()
-            liver_ids = df_keys.tolist()
-            st.success(f"管理ライバーのルームIDリスト（1列目）と愛称（2列目）を読み込みました。件数: **{len(liver_ids)}**")
-        else:
-            st.error("管理ライバーリストCSVにデータ（1列目:ID, 2列目:愛称）が見つかりません。")
-            return
-        
-        # 2.2. KPIデータ（配信有無）の読み込み (YYYY-MM_all_all.csv)
-        st.markdown(f"##### {year}年{month:02d}月分のKPIデータの読み込み")
-        kpi_url = KPI_DATA_BASE_URL.format(year=year, month=month)
-        kpi_df = load_data(kpi_url, f"{year}年{month:02d}月分のKPIデータ")
-        if kpi_df is None: return
-
-        if kpi_df.shape[1] > 1:
-            kpi_room_ids = set(kpi_df.iloc[:, 1].astype(str).str.strip().tolist())
-            st.success(f"配信があったルーム件数: **{len(kpi_room_ids)}** (KPIデータは2列目のIDを使用)")
-        else:
-            st.error("KPIデータCSVに配信ルームID（2列目）が見つかりません。")
-            return
-            
-        # 2.3. ルームリストの読み込み (room_list.csv) - IDとアカウントIDの紐づけ用 
-        st.markdown(f"##### ルームIDとアカウントIDの紐づけと管理対象判定リストの作成")
-        room_list_df = load_data(ROOM_LIST_URL, "ルーム名リスト", header='infer')
-        if room_list_df is None: return
-
-        # 既存ロジック：アカウントIDとルームIDのマッピング作成
-        account_id_to_room_id_map = {}
-        if room_list_df.shape[1] >= 4:
-            keys_series = room_list_df.iloc[:, 3].astype(str).str.strip()
-            values_series = room_list_df.iloc[:, 0].astype(str).str.strip()
-            account_id_to_room_id_map = pd.Series(values_series.values, index=keys_series).to_dict()
-            st.success("ルームIDとアカウントIDのマッピングを作成しました。")
-        else:
-            st.error("ルーム名リストCSVにアカウントID（4列目）が見つかりません。売上分配額の紐づけをスキップします。")
-
-        # ROOM_LIST_URLの1列目（ルームID）のセットを作成
-        if room_list_df.shape[1] >= 1:
-            room_list_ids = set(room_list_df.iloc[:, 0].astype(str).str.strip().tolist())
-            st.success(f"room_list.csv のルームIDリストを読み込みました。件数: **{len(room_list_ids)}**")
-        else:
-            st.error("room_list.csvにルームID（1列目）が見つかりません。管理対象の判定をスキップします。")
-            room_list_ids = set()
-
-            
-        # 2.4. ルーム売上分配額データの読み込み (point_hist_with_mixed_rate_csv_donwload_for_room_YYYYMM.csv)
-        st.markdown(f"##### ルーム売上分配額データの読み込みとMKランク決定")
-        # 【修正箇所】動的なURLを生成
-        sales_url = SALES_DATA_BASE_URL.format(year=year, month=month)
-        sales_df = load_data(sales_url, "売上分配額データ", header=None)
-        if sales_df is None: return
-        
-        # 全体分配額合計の取得（1列目1行目）
-        total_revenue = 0.0
-        try:
-            if sales_df.shape[0] > 0 and sales_df.shape[1] > 0:
-                total_revenue = float(sales_df.iloc[0, 0])
-                st.success(f"全体分配額合計（MKランク決定用）: **{round(total_revenue)}** 円")
-            else:
-                st.warning("売上分配額CSVが空のため、全体分配額合計は0として処理します。")
-        except:
-            st.error("売上分配額CSVの1列目1行目から全体分配額合計の取得に失敗しました。0として処理します。")
-            
-        # MKランクの決定
-        mk_rank = get_mk_rank(total_revenue)
-        st.info(f"計算されたMKランク: **{mk_rank}**")
-        
-        # 個別ルームの分配額マッピングの作成
-        room_id_to_sales_map = {}
-        if sales_df.shape[1] >= 2:
-            sales_keys = sales_df.iloc[:, 1].astype(str).str.strip() # アカウントID (キー)
-            sales_values = sales_df.iloc[:, 0].astype(str).str.strip() # 分配額 (値)
-            
-            # 1行目の全体分配額合計を除く
-            # sales_values[1:].values と sales_keys[1:] で1行目をスキップ
-            account_id_to_sales_map = pd.Series(sales_values[1:].values, index=sales_keys[1:]).to_dict()
-            
-            # ルームIDに紐づける
-            for account_id, room_id in account_id_to_room_id_map.items():
-                if account_id in account_id_to_sales_map:
-                    room_id_to_sales_map[room_id] = account_id_to_sales_map[account_id]
-        else:
-            st.error("売上分配額CSVに分配額（1列目）またはアカウントID（2列目）が見つかりません。")
-            account_id_to_sales_map = {}
-        st.success(f"個別売上分配額データ（アカウントIDをキー）を読み込みました。件数: **{len(account_id_to_sales_map)}**")
-        
-        
-        # 2.5. プレミアムライブ分配額データの読み込み (paid_live_hist_invoice_format_YYYYMM.csv)
-        st.markdown(f"##### プレミアムライブ分配額データの読み込み")
-        # 【修正箇所】動的なURLを生成
-        paid_live_url = PAID_LIVE_BASE_URL.format(year=year, month=month)
-        paid_live_df = load_data(paid_live_url, "プレミアムライブ分配額データ", header=None)
-        
-        room_id_to_paid_live_map = {}
-        if paid_live_df is not None and paid_live_df.shape[1] >= 2:
-            paid_live_keys = paid_live_df.iloc[:, 1].astype(str).str.strip() # アカウントID (キー)
-            paid_live_values = paid_live_df.iloc[:, 0].astype(str).str.strip() # 分配額 (値)
-            
-            # 1行目からライバーデータ
-            account_id_to_paid_live_map = pd.Series(paid_live_values.values, index=paid_live_keys).to_dict()
-
-            # ルームIDに対する最終分配額マッピングを作成
-            for account_id, room_id in account_id_to_room_id_map.items():
-                if account_id in account_id_to_paid_live_map:
-                    room_id_to_paid_live_map[room_id] = account_id_to_paid_live_map[account_id]
-        st.success(f"プレミアムライブ分配額データ（アカウントIDをキー）を読み込みました。件数: **{len(account_id_to_paid_live_map)}**")
-        
-        # 2.6. タイムチャージ分配額データの読み込み (show_rank_time_charge_hist_invoice_format_YYYYMM.csv)
-        st.markdown(f"##### タイムチャージ分配額データの読み込み")
-        # 【修正箇所】動的なURLを生成
-        time_charge_url = TIME_CHARGE_BASE_URL.format(year=year, month=month)
-        time_charge_df = load_data(time_charge_url, "タイムチャージ分配額データ", header=None)
-        
-        room_id_to_time_charge_map = {}
-        if time_charge_df is not None and time_charge_df.shape[1] >= 2:
-            time_charge_keys = time_charge_df.iloc[:, 1].astype(str).str.strip() # アカウントID (キー)
-            time_charge_values = time_charge_df.iloc[:, 0].astype(str).str.strip() # 分配額 (値)
-            
-            # 1行目からライバーデータ
-            account_id_to_time_charge_map = pd.Series(time_charge_values.values, index=time_charge_keys).to_dict()
-
-            # ルームIDに対する最終分配額マッピングを作成
-            for account_id, room_id in account_id_to_room_id_map.items():
-                if account_id in account_id_to_time_charge_map:
-                    room_id_to_time_charge_map[room_id] = account_id_to_time_charge_map[account_id]
-        st.success(f"タイムチャージ分配額データ（アカウントIDをキー）を読み込みました。件数: **{len(account_id_to_time_charge_map)}**")
+    st.markdown("---")
 
-        
-        # 3. 配信有無と売上分配額の突き合わせと結果生成
-        st.markdown("#### 3. 結果生成")
-        
-        results = []
-        
-        for room_id in liver_ids:
-            liver_alias = liver_alias_map.get(room_id, "愛称不明") 
-            
-            # 管理対象判定
-            # LIVER_LIST_URLに存在し、ROOM_LIST_URLに存在しない場合「外」
-            is_managed = "外" if room_id not in room_list_ids else ""
-            
-            has_stream = "有り" if room_id in kpi_room_ids else "なし"
-            
-            # ルーム売上
-            sales_amount = room_id_to_sales_map.get(room_id, "#N/A")
-            individual_rank = get_individual_rank(sales_amount)
-            payment_estimate = calculate_payment_estimate(individual_rank, mk_rank, sales_amount)
-            
-            # プレミアムライブ
-            paid_live_amount = room_id_to_paid_live_map.get(room_id, "")
-            paid_live_payment_estimate = calculate_paid_live_payment_estimate(paid_live_amount)
-            
-            # タイムチャージ
-            time_charge_amount = room_id_to_time_charge_map.get(room_id, "")
-            time_charge_payment_estimate = calculate_time_charge_payment_estimate(time_charge_amount)
-                    
-            results.append({
-                "ルームID": room_id,
-                "ルーム名": liver_alias, # <--- 一旦ここで「ルーム名」として定義
-                "管理対象": is_managed,
-                "配信有無": has_stream,
-                "配信月": delivery_month_str,
-                "支払月": payment_month_str,
-                "R分配額": sales_amount, 
-                "個別ランク": individual_rank,
-                "R支払想定額": payment_estimate, 
-                "PL分配額": paid_live_amount, 
-                "PL支払想定額": paid_live_payment_estimate, 
-                "TC支払想定額": time_charge_payment_estimate, 
-            })
-
-        results_df = pd.DataFrame(results)
-
-        # 【修正箇所】CSVと画面表示で統一するため、「ルーム名」を「ライバー愛称」にここで変更
-        results_df = results_df.rename(columns={"ルーム名": "ライバー愛称"})
-
-        # 結果の列順序を明示的に指定
-        column_order = [
-            "ルームID",
-            "ライバー愛称", # 修正: ルーム名 -> ライバー愛称
-            "管理対象",
-            "配信有無",
-            "配信月",
-            "支払月",
-            "R分配額", 
-            "個別ランク",
-            "R支払想定額", 
-            "PL分配額", 
-            "PL支払想定額", 
-            "TC支払想定額", 
-        ]
-        
-        final_columns = [col for col in column_order if col in results_df.columns]
-        results_df = results_df[final_columns]
+    # 1人のライバーの過去の処理月の履歴（処理済みの月の索引から引くため、CSVの取得・処理のやり直しはしない）
+    st.markdown("#### 6. ライバーの履歴")
+    show_history_search([tuple(map(int, value.split('-'))) for value in value_options])
 
-        # Excelの日付自動変換対策（="2025/10" を含むデータ）を results_df に適用
-        results_df_csv = results_df.copy()
-        results_df_csv["配信月"] = results_df_csv["配信月"].astype(str).apply(lambda x: f'="{x}"')
-        results_df_csv["支払月"] = results_df_csv["支払月"].astype(str).apply(lambda x: f'="{x}"')
+    st.markdown("---")
 
-        # 画面表示用データを作成し、Excel対策表記を解除
-        display_df = results_df.copy()
-        
-    st.success("✅ 全てのデータ処理が完了しました！")
+    manage_snapshots()
+
+
+def start_job(year, month, force_refresh, **options):
+    """
+    ジョブを開始して返す（options は job_registry.start に渡す）
+    同じ処理月のジョブが他の画面で実行中の場合は新たに開始せず、そのジョブを返して画面に通知する
+    """
+    job, started = job_registry.start(year, month, force=force_refresh, **options)
+    if started:
+        # ジョブは全セッションで共有するため、中止は開始したセッションからのみ行えるようにする
+        st.session_state.setdefault("started_runs", set()).add(job.recorder.run_id)
+    else:
+        message = "同じ処理月のデータ処理が他の画面で実行中のため、その処理の進捗を表示します。"
+        if force_refresh:
+            message += "強制再取得は適用されていません。その処理の終了後に改めて開始してください。"
+        st.info(message)
+    return job
+
+
+# データ処理のジョブの表示（実行中は進捗、終了後は処理ログと結果）
+def show_job(job):
+    if job.running:
+        show_job_progress(job)
+        return
+
+    # --- 2. データの読み込みとマッピング / 3. 結果生成 ---
+    show_job_log(job)
+
+    if job.status == DONE:
+        st.success("✅ 全てのデータ処理が完了しました！")
+        summary = job.summary
+        show_reconciliation(job.year, job.month, summary.reconciliation)
+        show_results(job.year, job.month, summary, job.csv_bytes)
+    elif job.status == CANCELLED:
+        st.warning("データ処理を中止しました。")
+    else:
+        st.error(job.error or "データ処理に失敗しました。処理ログを確認してください。")
+
+
+def show_job_log(job):
+    """集計処理本体の進捗メッセージを、ジョブに保持したものから表示し直す"""
+    with st.expander(
+        f"📝 処理ログ（{job.started_at:%Y-%m-%d %H:%M:%S} 開始、{job.elapsed_s:.1f} 秒、{STATUS_LABELS[job.status]}）",
+        expanded=job.status != DONE,
+    ):
+        for level, message in job.messages:
+            report_to_streamlit(level, message)
+
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job):
+    """実行中のジョブの進捗（この部分だけを1秒ごとに再実行し、終了したら画面全体を再実行する）"""
+    if not job.running:
+        st.rerun()
+    st.progress(job.progress, text=f"データを読み込み、配信有無と売上をチェックしています...（{job.elapsed_s:.0f} 秒経過）")
+    for message in job.latest_messages():
+        st.caption(message)
+    if job.recorder.cancelled:
+        st.info("中止を指示しました。実行中のステージが終わり次第中止します。")
+    elif job.recorder.run_id not in st.session_state.get("started_runs", ()):
+        st.caption("このデータ処理は他の画面で開始されたため、中止は開始した画面からのみ行えます。")
+    elif st.button("⏹ データ処理を中止する", key=f"cancel_{job.kind}"):
+        job.cancel()
+        st.rerun(scope="fragment")
+
+
+def show_reconciliation(year, month, reconciliation):
+    """分配額の突き合わせ結果（重複したアカウントIDと、結果リストに反映されない分配額の明細）"""
+    if reconciliation is None or not reconciliation.has_issues:
+        return
+    with st.expander(f"🔍 分配額の突き合わせ（管理外ルームの分配額合計: {round(reconciliation.unmanaged_total):,} 円）"):
+        st.dataframe(reconciliation.summary, use_container_width=True, hide_index=True)
+        st.markdown(f"##### 重複したアカウントID（{len(reconciliation.duplicates)} 件、結果リストには後の行の額を採用）")
+        st.dataframe(reconciliation.duplicates, use_container_width=True, hide_index=True)
+        st.markdown(f"##### 結果リストに反映されない分配額（{len(reconciliation.orphans)} 行）")
+        st.dataframe(reconciliation.orphans, use_container_width=True, hide_index=True)
+        st.download_button(
+            label="📥 突き合わせの明細をCSVダウンロード",
+            data=lambda: reconciliation.orphans.to_csv(index=False).encode("utf-8-sig"),
+            file_name=f"reconciliation_{year}{month:02d}.csv",
+            mime=EXPORT_FORMATS["csv"][1],
+        )
+
+
+def show_agencies(year, month, all_checked, force_refresh):
+    """複数の管理ライバーリストの一括作成（リストの指定、実行、ZIPダウンロード）"""
+    st.markdown("#### 5. 複数の管理ライバーリストでまとめて作成")
+    # このセッションで一括作成を開始した処理月は、指定欄を開いたまま表示する
+    started = st.session_state.get("started_runs", ())
+    expanded = any(
+        job.kind == AgencyJob.kind and (job.year, job.month) == (year, month) and job.recorder.run_id in started
+        for job in job_registry.jobs()
+    )
+    with st.expander("事務所・チームごとの管理ライバーリストを指定する", expanded=expanded):
+        text = st.text_area(
+            "管理ライバーリストのURL（1行に1つ、「名前,URL」の形式）",
+            value=f"{DEFAULT_LIST_NAME},{LIVER_LIST_URL}",
+            key="agency_lists",
+        )
+        uploads = st.file_uploader(
+            "管理ライバーリストのCSV（ファイル名を名前として使用）",
+            type="csv", accept_multiple_files=True, key="agency_uploads",
+        )
+        liver_lists = parse_liver_lists(text)
+        for upload in uploads or []:
+            liver_lists[upload.name.rsplit(".", 1)[0]] = upload.getvalue()
+        st.caption(f"対象の管理ライバーリスト: {len(liver_lists)} 件（KPI・ルームリスト・分配額データは全リストで1回だけ取得します）")
+        # 一括作成のジョブは管理ライバーリストの指定ごと（他のセッションが指定したリストの結果は表示しない）
+        job = job_registry.get(year, month, job_class=AgencyJob, liver_lists=liver_lists)
+        running = job is not None and job.running
+        if st.button("📦 まとめて作成する", disabled=not all_checked or running or not liver_lists):
+            job = start_job(year, month, force_refresh, job_class=AgencyJob, liver_lists=liver_lists)
+
+    if job is None:
+        return
+    if job.running:
+        show_job_progress(job)
+        return
+    show_job_log(job)
+    summary = job.summary
+    if summary is not None:
+        for name, error in summary.errors.items():
+            st.warning(f"{name}: {error}")
+    if job.status == DONE:
+        st.success(f"✅ {len(summary.results)} 件の管理ライバーリストの結果を作成しました。（MKランク: **{summary.mk_rank}**）")
+        st.dataframe(
+            pd.DataFrame({
+                "名前": list(summary.results),
+                "件数": [len(results_df) for results_df in summary.results.values()],
+                "ファイル": list(summary.csv_files),
+            }),
+            use_container_width=True, hide_index=True,
+        )
+        st.download_button(
+            label="📥 全ての結果をZIPダウンロード",
+            data=job.zip_bytes,
+            file_name=export_file_name(year, month, "zip"),
+            mime=EXPORT_FORMATS["zip"][1],
+        )
+    elif job.status == CANCELLED:
+        st.warning("一括作成を中止しました。")
+    else:
+        st.error(job.error or "一括作成に失敗しました。処理ログを確認してください。")
+
+
+def show_snapshot(year, month, summary):
+    """保存済みスナップショットから読み込んだ結果リスト（load_snapshot の戻り値）を表示する"""
+    if summary is None:
+        st.error("スナップショットを読み込めませんでした。データ処理を実行してください。")
+        return
+    st.success(f"✅ スナップショットから読み込みました。（MKランク: **{summary.mk_rank}**）")
+    show_results(year, month, summary)
 
+
+def show_results(year, month, summary, csv_bytes=None):
+    """
+    結果リスト（MonthlySummary）の表示とCSVダウンロード（計測結果がある場合はパフォーマンス欄を表示する）
+    csv_bytes: 作成済みの結果CSV（ジョブで作成済みの場合。無い場合はここで作成する）
+    索引とシミュレーションは summary に保持したものを使い、画面の再実行では作り直さない
+    """
+    results_df = summary.results
     # 4. 結果の表示とCSVダウンロード
     st.markdown("#### 4. 結果リスト")
     
@@ -554,25 +420,235 @@ def process_data(year, month, delivery_month_str, payment_month_str):
     
     # 画面表示用のヘッダーとして表示されるDataFrameには、すでに「ライバー愛称」が設定されている
     
-    # st.dataframeに hide_index=True を追加してインデックスを非表示にする
-    st.dataframe(display_df, use_container_width=True, hide_index=True) 
+    # 結果リスト全体はサーバー側に保持し、絞り込み・並べ替えた結果の現在のページだけを表示する
+    show_result_viewer(summary.result_view())
     
     st.markdown(f"##### CSVダウンロード")
 
-    # CSV出力はBOM付きUTF-8（Excel対応）
-    # results_df_csvはすでに「ライバー愛称」の列名を持っている
-    csv_bytes = results_df_csv.to_csv(index=False, encoding='utf-8-sig').encode('utf-8-sig')
+    # CSV出力はBOM付きUTF-8（Excel対応、配信月・支払月は ="2025/10" 形式）
+    if csv_bytes is None:
+        csv_bytes = to_csv_bytes(results_df)
 
     st.download_button(
         label="📥 結果をCSVダウンロード",
         data=csv_bytes,
-        file_name=f'showroom_liver_sales_estimate_{year}{month:02d}.csv',
-        mime='text/csv',
+        file_name=export_file_name(year, month, "csv"),
+        mime=EXPORT_FORMATS["csv"][1],
     )
 
+    # Parquet / XLSX はボタンが押されたときに作成する（使わない形式のためにメモリを使わない）
+    col_parquet, col_xlsx = st.columns(2)
+    with col_parquet:
+        st.download_button(
+            label="📥 Parquetダウンロード",
+            data=lambda: to_parquet_bytes(results_df),
+            file_name=export_file_name(year, month, "parquet"),
+            mime=EXPORT_FORMATS["parquet"][1],
+        )
+    with col_xlsx:
+        st.download_button(
+            label="📥 Excel（XLSX）ダウンロード",
+            data=lambda: to_xlsx_bytes(results_df),
+            file_name=export_file_name(year, month, "xlsx"),
+            mime=EXPORT_FORMATS["xlsx"][1],
+            disabled=not xlsx_available(),
+            help=None if xlsx_available() else "XLSX の出力には xlsxwriter が必要です（任意。pip install xlsxwriter）。",
+        )
+
+    # MKランク・しきい値・レートを変えた場合の支払想定額（処理をやり直さずに計算する）
+    st.markdown("##### 支払想定額のシミュレーション")
+    show_simulator(summary.simulator())
+
+    # 前月の保存済みの結果リスト（スナップショット）との比較（前月のCSVは取得しない）
+    st.markdown("##### 前月との比較")
+    show_month_delta(year, month, results_df)
+
+    if summary.metrics is not None:
+        show_metrics(summary.metrics)
+
     
     #st.markdown("---")
 
 
+@st.fragment
+def show_result_viewer(view):
+    """
+    結果リストのビューア（絞り込み・並べ替え・ページ送りはこの部分だけを再実行する）
+    索引・集計は view（ResultView）の作成時に1回だけ計算済み
+    """
+    # 集計（ランク別件数・支払種別ごとの合計）
+    total_cols = st.columns(len(view.totals) + 1)
+    total_cols[0].metric("ルーム数", f"{view.size:,}")
+    for col, (column, total) in zip(total_cols[1:], view.totals.items()):
+        col.metric(f"{column} 合計", f"{round(total):,} 円")
+    with st.expander("個別ランク別の件数"):
+        st.dataframe(view.rank_counts, hide_index=True)
+
+    # 絞り込み・並べ替え
+    filter_cols = st.columns(4)
+    ranks = filter_cols[0].multiselect("個別ランク", options=view.values("個別ランク"), key="viewer_ranks")
+    managed = filter_cols[1].multiselect(
+        "管理対象", options=view.values("管理対象"), key="viewer_managed",
+        format_func=lambda value: value or "（管理対象）",
+    )
+    streamed = filter_cols[2].multiselect("配信有無", options=view.values("配信有無"), key="viewer_streamed")
+    search = filter_cols[3].text_input("ルームID・愛称で検索", key="viewer_search")
+
+    sort_cols = st.columns(3)
+    sort_by = sort_cols[0].selectbox("並べ替え", options=[None] + SORT_COLUMNS, key="viewer_sort",
+                                     format_func=lambda value: "元の並び順" if value is None else value)
+    descending = sort_cols[1].radio("順序", options=["降順", "昇順"], horizontal=True, key="viewer_order") == "降順"
+    page_size = sort_cols[2].selectbox("1ページの件数", options=[50, 100, 500, 1000], index=1, key="viewer_page_size")
+
+    positions = view.query(
+        {"個別ランク": ranks, "管理対象": managed, "配信有無": streamed},
+        search=search, sort_by=sort_by, descending=descending,
+    )
+    pages = max(1, -(-len(positions) // page_size))
+    page = st.number_input(f"ページ（全 {pages} ページ）", min_value=1, max_value=pages, value=1, step=1, key="viewer_page")
+    page = min(int(page), pages)
+
+    start = (page - 1) * page_size
+    st.caption(f"該当 **{len(positions):,}** 件中 {min(start + 1, len(positions)):,}〜{min(start + page_size, len(positions)):,} 件目を表示")
+    # st.dataframeに hide_index=True を追加してインデックスを非表示にする
+    st.dataframe(view.page(positions, page, page_size), use_container_width=True, hide_index=True)
+
+
+@st.fragment
+def show_simulator(simulator):
+    """
+    What-if シミュレーション（シナリオの変更はこの部分だけを再実行する）
+    MKランク × しきい値の変更率 × レートの倍率 の全ての組み合わせを、ルーム × シナリオ の行列としてまとめて計算する
+    """
+    st.caption(f"実績: MKランク **{simulator.actual.mk_rank}** / 対象ルーム **{len(simulator.amounts):,}** 件（R分配額が数値のルーム）")
+    cols = st.columns(3)
+    mk_ranks = cols[0].multiselect("MKランク", options=MK_RANKS, default=MK_RANKS, key="simulator_mk_ranks")
+    shifts_text = cols[1].text_input(
+        "個別ランクのしきい値の変更率（%、カンマ区切り）", value="0", key="simulator_shifts",
+        help=f"{MIN_THRESHOLD_SHIFT}% より大きい値を指定してください（例: -10, 10）。",
+    )
+    factors_text = cols[2].text_input("レートの倍率（カンマ区切り）", value="1.0", key="simulator_factors")
+    try:
+        shifts, factors = parse_numbers(shifts_text) or [0], parse_numbers(factors_text) or [1.0]
+    except ValueError:
+        st.warning("しきい値の変更率・レートの倍率は、数値をカンマ区切りで入力してください。")
+        return
+    if any(shift <= MIN_THRESHOLD_SHIFT for shift in shifts):
+        st.warning(f"しきい値の変更率は {MIN_THRESHOLD_SHIFT}% より大きい値を入力してください。")
+        return
+    if not mk_ranks:
+        st.info("MKランクを1つ以上選択してください。")
+        return
+
+    scenarios = build_scenarios(mk_ranks, shifts, factors)
+    summary, matrix = simulator.run(scenarios)
+    st.dataframe(
+        summary, use_container_width=True, hide_index=True,
+        column_config={
+            "R支払想定額合計": st.column_config.NumberColumn(format="%,d"),
+            "実績との差額": st.column_config.NumberColumn(format="%,d"),
+        },
+    )
+
+    # 選択したシナリオで実績との差額が大きいルーム
+    names = [scenario.name for scenario in scenarios]
+    name = st.selectbox("ルーム別の差額を表示するシナリオ", options=names, key="simulator_scenario")
+    column = names.index(name)
+    st.dataframe(
+        simulator.room_deltas(matrix, scenarios[column], column + 1),
+        use_container_width=True, hide_index=True,
+    )
+    st.caption("実績との差額の絶対値が大きい順に最大100件を表示しています。")
+
+
+@st.fragment
+def show_month_delta(year, month, results_df):
+    """個別ランクの変化・配信有無の変化・支払想定額合計の増減が大きいルーム（表示件数の変更はこの部分だけを再実行する）"""
+    delta = compare_with_previous(year, month, results_df)
+    if delta is None:
+        st.info("前月の結果が保存されていないため、比較できません。前月のデータ処理を一度実行してください。")
+        return
+    prev_year, prev_month = delta.previous_month
+    rank_changes, stream_changes = delta.rank_changes(), delta.stream_changes()
+    st.caption(
+        f"比較対象: **{prev_year}年{prev_month:02d}月分** / 両月にあるルーム **{len(delta.rooms):,}** 件"
+        f"（今月のみ {delta.added:,} 件、前月のみ {delta.removed:,} 件）"
+    )
+    tab_rank, tab_stream, tab_payout = st.tabs([
+        f"個別ランクの変化（{len(rank_changes):,}）",
+        f"配信有無の変化（{len(stream_changes):,}）",
+        "支払想定額合計の増減",
+    ])
+    with tab_rank:
+        st.dataframe(delta.rank_transitions(), use_container_width=True)
+        st.dataframe(rank_changes, use_container_width=True, hide_index=True)
+    with tab_stream:
+        st.dataframe(stream_changes, use_container_width=True, hide_index=True)
+    with tab_payout:
+        top_n = st.number_input("表示件数", min_value=1, max_value=1000, value=TOP_N, step=10, key="delta_top_n")
+        st.dataframe(
+            delta.payout_changes(int(top_n)), use_container_width=True, hide_index=True,
+            column_config={
+                column: st.column_config.NumberColumn(format="%,d")
+                for column in ("支払想定額合計（前月）", "支払想定額合計", "増減額")
+            },
+        )
+
+
+@st.fragment
+def show_history_search(months):
+    """ルームID・アカウントID・愛称でルームを探し、months の処理月の履歴を表示する（入力の変更はこの部分だけを再実行する）"""
+    try:
+        # 索引の作成前に処理した月は、保存済みの結果リストから索引に追加する
+        history_index.sync(months)
+        indexed = set(history_index.indexed_months())
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f"履歴の索引を読み込めませんでした: {e}")
+        return
+    covered = [f"{year}-{month:02d}" for year, month in months if (year, month) in indexed]
+    st.caption(
+        f"処理済みの {len(covered)} / {len(months)} か月分から検索します。"
+        "未処理の月は、その月のデータ処理を実行すると追加されます。"
+    )
+    query = st.text_input("ルームID・アカウントID、またはライバー愛称（一部）", key="history_query")
+    if not query.strip():
+        return
+    matches = history_index.search(query)
+    if matches.empty:
+        st.info("該当するルームがありません。")
+        return
+    if len(matches) >= SEARCH_LIMIT:
+        st.caption(f"該当するルームが多いため、ルームIDの順に {SEARCH_LIMIT} 件まで表示しています。")
+    aliases = dict(zip(matches["ルームID"], matches["ライバー愛称"]))
+    room_id = st.selectbox(
+        f"該当するルーム（{len(matches)} 件）", options=list(aliases),
+        format_func=lambda room_id: f"{room_id}  {aliases[room_id]}", key="history_room",
+    )
+    st.dataframe(history_index.history(room_id, months), use_container_width=True, hide_index=True)
+
+
+def show_metrics(metrics):
+    """ステージ別の計測結果を折りたたみ欄に表示する（JSON Lines / Prometheus への書き出しはジョブの完了時に実施済み）"""
+    with st.expander("⏱ パフォーマンス"):
+        st.caption(f"全体の所要時間: **{metrics.total_s:.2f}** 秒（実行ID: {metrics.run_id}）")
+        st.dataframe(metrics.table(), use_container_width=True, hide_index=True)
+
+
+def manage_snapshots():
+    """保存済みスナップショットの一覧表示と削除"""
+    with st.expander("🗂 保存済みスナップショットの管理"):
+        entries = snapshot_store.entries()
+        if entries.empty:
+            st.write("保存済みのスナップショットはありません。")
+            return
+        st.caption(f"処理月の新しい順に最大 {snapshot_store.keep_months} か月分を保持し、古いものは自動で削除されます。")
+        st.dataframe(entries, use_container_width=True, hide_index=True)
+        targets = st.multiselect("削除する処理月", options=entries["処理月"].tolist())
+        if st.button("🗑 選択したスナップショットを削除", disabled=not targets):
+            for value in targets:
+                snapshot_store.purge(*map(int, value.split('-')))
+            st.rerun()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,183 @@
+"""
+月初サマリーのバッチ実行（画面なし）
+
+画面（app.py）と同じ集計処理（pipeline.summarize）を、複数の処理月に対してプロセスプールで並列に実行し、
+月ごとに showroom_liver_sales_estimate_YYYYMM.csv を出力する。過去月の再作成や夜間の定期実行用。
+
+使い方:
+    python -m batch                                   # 画面のプルダウンと同じ直近12か月分
+    python -m batch 2025-09 2025-10                   # 指定した処理月のみ
+    python -m batch --from 2025-01 --to 2025-06 --out ./output --workers 4
+    python -m batch 2025-09 --full                    # 前回の結果を使わず全件を再計算
+    python -m batch 2025-09 --liver-lists lists.txt   # 管理ライバーリストごとの結果をZIPで出力
+                                                      # （lists.txt は「名前,URL」を1行に1つ）
+"""
+import argparse
+import datetime
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dateutil.relativedelta import relativedelta
+
+from agencies import parse_liver_lists, summarize_agencies
+from pipeline import get_processed_months, summarize
+from export import to_csv_bytes, csv_file_name, export_file_name
+
+
+logger = logging.getLogger("batch")
+
+
+def parse_month(value):
+    """ "YYYY-MM" 形式の文字列を (year, month) にする"""
+    try:
+        date = datetime.datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"処理月は YYYY-MM 形式で指定してください: {value}")
+    return date.year, date.month
+
+
+def month_range(start, end):
+    """start から end まで（両端を含む）の (year, month) のリスト"""
+    current = datetime.date(start[0], start[1], 1)
+    last = datetime.date(end[0], end[1], 1)
+    months = []
+    while current <= last:
+        months.append((current.year, current.month))
+        current += relativedelta(months=1)
+    return months
+
+
+def run_month(year, month, out_dir, incremental=True, force=False, liver_lists=None):
+    """
+    1か月分を処理してCSVを書き出す（プロセスプールの各ワーカーで実行）
+    liver_lists: {名前: 管理ライバーリストのURL} を指定した場合は、リストごとの結果CSVをまとめたZIPを書き出す
+    戻り値: (year, month, 出力パス または None, 件数, 進捗メッセージのリスト)
+    """
+    messages = []
+
+    def report(level, message):
+        # 表は件数等の確認用のため、バッチでは出力しない
+        if level != "table":
+            messages.append((level, message))
+
+    if liver_lists:
+        return run_agencies(year, month, out_dir, liver_lists, report, force) + (messages,)
+
+    summary = summarize(year, month, report=report, incremental=incremental, force=force)
+    if summary is None:
+        return year, month, None, 0, messages
+
+    path = os.path.join(out_dir, csv_file_name(year, month))
+    with summary.metrics.stage("export", rows=len(summary.results)) as stage:
+        csv_bytes = to_csv_bytes(summary.results)
+        stage.bytes = len(csv_bytes)
+    with open(path, "wb") as f:
+        f.write(csv_bytes)
+    try:
+        summary.metrics.save()
+    except OSError as e:
+        messages.append(("warning", f"計測結果を保存できませんでした: {e}"))
+    return year, month, path, len(summary.results), messages
+
+
+def run_agencies(year, month, out_dir, liver_lists, report, force=False):
+    """管理ライバーリストごとの結果CSVをまとめたZIPを書き出し、(year, month, 出力パス または None, 件数) を返す"""
+    summary = summarize_agencies(year, month, liver_lists, report=report, force=force)
+    if summary is None or not summary.results:
+        return year, month, None, 0
+    for name, error in summary.errors.items():
+        report("warning", f"{name}: {error}")
+    path = os.path.join(out_dir, export_file_name(year, month, "zip"))
+    with summary.metrics.stage("export", rows=len(summary.csv_files)) as stage:
+        zip_bytes = summary.zip_bytes()
+        stage.bytes = len(zip_bytes)
+    with open(path, "wb") as f:
+        f.write(zip_bytes)
+    try:
+        summary.metrics.save()
+    except OSError as e:
+        report("warning", f"計測結果を保存できませんでした: {e}")
+    return year, month, path, sum(len(results_df) for results_df in summary.results.values())
+
+
+def run_batch(months, out_dir=".", workers=None, incremental=True, force=False, liver_lists=None):
+    """
+    複数の処理月を並列に処理する（失敗した月があっても他の月の処理は続ける）
+    戻り値: {(year, month): 出力パス または None（失敗した月）}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    outputs = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_month, year, month, out_dir, incremental, force, liver_lists): (year, month)
+            for year, month in months
+        }
+        for future in as_completed(futures):
+            year, month = futures[future]
+            try:
+                year, month, path, rows, messages = future.result()
+            except Exception as e:
+                # 1か月の失敗（ワーカーの異常終了を含む）で他の月の処理を止めない
+                logger.error("[%d-%02d] 処理に失敗しました: %s", year, month, e)
+                outputs[(year, month)] = None
+                continue
+            for level, message in messages:
+                log_level = {"error": logging.ERROR, "warning": logging.WARNING}.get(level, logging.DEBUG)
+                logger.log(log_level, "[%d-%02d] %s", year, month, message)
+            if path is None:
+                logger.error("[%d-%02d] 処理に失敗しました", year, month)
+            else:
+                logger.info("[%d-%02d] %s を出力しました（%d件）", year, month, path, rows)
+            outputs[(year, month)] = path
+    return outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SHOWROOM 月初サマリーのバッチ作成")
+    parser.add_argument("months", nargs="*", type=parse_month, help="処理月（YYYY-MM）。省略時は直近12か月")
+    parser.add_argument("--from", dest="start", type=parse_month, help="処理月の範囲の開始（YYYY-MM）")
+    parser.add_argument("--to", dest="end", type=parse_month, help="処理月の範囲の終了（YYYY-MM）")
+    parser.add_argument("--out", default=".", help="CSVの出力先ディレクトリ")
+    parser.add_argument("--workers", type=int, default=None, help="並列に処理するプロセス数")
+    parser.add_argument("--full", action="store_true", help="前回の結果を使わず全件を再計算する")
+    parser.add_argument("--refresh", action="store_true", help="キャッシュを使わずに全てのCSVを取り直す")
+    parser.add_argument("--liver-lists", help="管理ライバーリストの一覧ファイル（「名前,URL」を1行に1つ）。指定時はリストごとの結果をZIPで出力")
+    parser.add_argument("-v", "--verbose", action="store_true", help="進捗メッセージをすべて表示する")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+
+    months = list(args.months)
+    if args.start or args.end:
+        if not (args.start and args.end):
+            parser.error("--from と --to は両方指定してください")
+        months += month_range(args.start, args.end)
+    if not months:
+        months = [tuple(map(int, value.split('-'))) for _, value in get_processed_months()]
+    # 重複を除いて古い月から処理する
+    months = sorted(set(months))
+
+    liver_lists = None
+    if args.liver_lists:
+        with open(args.liver_lists, encoding="utf-8") as f:
+            liver_lists = parse_liver_lists(f.read())
+        if not liver_lists:
+            parser.error(f"管理ライバーリストが指定されていません: {args.liver_lists}")
+
+    outputs = run_batch(
+        months, args.out, args.workers, incremental=not args.full, force=args.refresh, liver_lists=liver_lists,
+    )
+    failed = [f"{year}-{month:02d}" for (year, month), path in sorted(outputs.items()) if path is None]
+    if failed:
+        logger.error("処理に失敗した月: %s", ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
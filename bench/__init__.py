@@ -0,0 +1,12 @@
+"""
+月次サマリー処理のベンチマーク
+
+generate.py: 本番と同じ形式・配置の合成CSVを作成する
+server.py:   作成したCSVを配信するローカルHTTPサーバー（本番サーバーの代わり）
+run.py:      ステージ別（取得・パース・突き合わせ・ランク/支払計算・CSV出力）の計測とベースライン比較
+
+使い方:
+    python -m bench.run --rooms 1000 10000 100000
+    python -m bench.run --rooms 1000000 --save-baseline main
+    python -m bench.run --compare main
+"""
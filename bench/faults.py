@@ -0,0 +1,80 @@
+"""
+障害注入下での取得の確認
+
+合成データを、5xx の応答・接続の切断・本文の途中での切断を確率で発生させるローカルサーバーから配信し、
+http_client 経由（fetch）で全てのファイルを取得して、本文がディスク上のファイルと一致するかを確認する。
+転送圧縮あり（gzip）・なし（Range で続きから取得）の両方で確認し、リクエスト数・接続数・注入した障害の回数を表示する。
+
+使い方:
+    python -m bench.faults --rooms 100000 --error-rate 0.2 --reset-rate 0.1 --truncate-rate 0.3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from bench.generate import generate
+from bench.run import DATA_DIR, MONTH, YEAR
+from bench.server import Faults, serve
+from fetch import HttpCache, fetch
+from http_client import HttpClient
+from pipeline import source_urls
+
+
+def check(directory, faults, client):
+    """directory の6つのファイルを faults を注入したサーバーから取得し、{キー: (一致したか, リクエスト数)} を返す"""
+    urls = source_urls(YEAR, MONTH)
+    with serve(directory, faults) as base_url, tempfile.TemporaryDirectory() as cache_dir:
+        cache = HttpCache(cache_dir)
+
+        def fetch_one(key):
+            path = urlparse(urls[key]).path
+            fetched = fetch(base_url + path, cache=cache, client=client)
+            with open(os.path.join(directory, path.lstrip("/")), "rb") as f:
+                return fetched.body == f.read(), fetched.attempts
+
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            return dict(zip(urls, executor.map(fetch_one, urls)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="障害注入下での取得（再試行・続きからの取得）の確認")
+    parser.add_argument("--rooms", type=int, default=100000, help="合成データのルーム数")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="合成データの作成先（作成済みなら再利用）")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="503 を返す確率")
+    parser.add_argument("--reset-rate", type=float, default=0.1, help="応答せずに接続を切る確率")
+    parser.add_argument("--truncate-rate", type=float, default=0.3, help="本文の途中で接続を切る確率")
+    parser.add_argument("--retries", type=int, default=8, help="再試行の回数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    directory = os.path.join(args.data_dir, f"mixed-{args.rooms}")
+    generate(directory, args.rooms, YEAR, MONTH, "mixed")
+    client = HttpClient(retries=args.retries, backoff_s=0.05, backoff_max_s=0.5)
+
+    failed = False
+    for compress in (True, False):
+        faults = Faults(
+            error_rate=args.error_rate, reset_rate=args.reset_rate, truncate_rate=args.truncate_rate,
+            compress=compress, seed=args.seed,
+        )
+        start = time.perf_counter()
+        try:
+            results = check(directory, faults, client)
+        except Exception as e:
+            print(f"compress={compress}: 取得に失敗しました: {e}  {faults.counts}")
+            failed = True
+            continue
+        elapsed = time.perf_counter() - start
+        for key, (same, attempts) in results.items():
+            print(f"compress={compress} {key:<12} {'OK' if same else 'MISMATCH':<9} requests={attempts}")
+            failed |= not same
+        print(f"compress={compress} {elapsed:.2f}s {faults.counts}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
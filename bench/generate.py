@@ -0,0 +1,139 @@
+"""
+合成データの作成
+
+ルーム数を指定して、本番と同じ形式の6つのCSVを、本番URLと同じパス構成でディレクトリに書き出す。
+（管理ライバーリスト・ルームリスト・KPIデータ・ルーム売上分配額（1行目は全体合計）・
+  プレミアムライブ分配額・タイムチャージ分配額）
+文字コードは UTF-8 / BOM付きUTF-8 / Shift-JIS を混在させることができる。
+"""
+import json
+import os
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from pipeline import source_urls
+
+
+# --- 定数（データの構成比） ---
+FIRST_ROOM_ID = 100000
+MANAGED_RATIO = 0.8        # ルームのうち管理ライバーリストに載っている割合
+UNLISTED_RATIO = 0.02      # 管理ライバーのうち room_list.csv に無い（管理対象「外」）割合
+STREAMS_PER_ROOM = 3       # KPIデータの1ルームあたりの平均行数
+STREAMED_RATIO = 0.7       # 処理月に配信があったルームの割合
+SALES_RATIO = 0.5          # ルーム売上分配額があるアカウントの割合
+PAID_LIVE_RATIO = 0.1
+TIME_CHARGE_RATIO = 0.1
+INVALID_AMOUNT_RATIO = 0.01  # 分配額が数値でない行の割合（"#ERROR" 系の計算経路用）
+
+# 各ファイルの文字コード
+ENCODINGS = {
+    "utf-8": dict.fromkeys(("liver", "kpi", "room_list", "sales", "paid_live", "time_charge"), "utf-8"),
+    "shift_jis": dict.fromkeys(("liver", "kpi", "room_list", "sales", "paid_live", "time_charge"), "shift_jis"),
+    "mixed": {
+        "liver": "shift_jis",
+        "kpi": "utf-8",
+        "room_list": "utf-8-sig",
+        "sales": "shift_jis",
+        "paid_live": "utf-8",
+        "time_charge": "utf-8-sig",
+    },
+}
+
+MANIFEST_FILE = "manifest.json"
+
+
+def _amounts(rng, size, scale, decimals=False):
+    """分配額の文字列（一部は数値でない値）"""
+    values = np.round(rng.lognormal(np.log(scale), 1.2, size) * (2 if decimals else 1)) / (2 if decimals else 1)
+    text = values.astype(str) if decimals else values.astype(np.int64).astype(str)
+    invalid = rng.random(size) < INVALID_AMOUNT_RATIO
+    text = text.astype(object)
+    text[invalid] = "zz"
+    return text
+
+
+def _write(directory, url, df, encoding, header=True):
+    path = os.path.join(directory, urlparse(url).path.lstrip("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, index=False, header=header, encoding=encoding)
+    return path
+
+
+def generate(directory, rooms, year=2025, month=9, encoding="mixed", seed=0):
+    """
+    ルーム数 rooms の合成データを directory に書き出し、マニフェスト（ファイルごとの行数・バイト数）を返す
+    同じ引数で作成済みの場合は作り直さない
+    """
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    params = {"rooms": rooms, "year": year, "month": month, "encoding": encoding, "seed": seed}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["params"] == params:
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+
+    rng = np.random.default_rng(seed)
+    urls = source_urls(year, month)
+    encodings = ENCODINGS[encoding]
+
+    room_ids = np.arange(FIRST_ROOM_ID, FIRST_ROOM_ID + rooms)
+    account_ids = np.char.add("acc", room_ids.astype(str)).astype(object)
+
+    # 管理ライバーリスト: 一部は room_list.csv に無いルーム（管理対象「外」）
+    managed = rng.choice(room_ids, int(rooms * MANAGED_RATIO), replace=False)
+    unlisted = np.arange(room_ids[-1] + 1, room_ids[-1] + 1 + int(len(managed) * UNLISTED_RATIO))
+    liver_ids = np.concatenate([managed, unlisted])
+    frames = {
+        "liver": pd.DataFrame({
+            "ルームID": liver_ids,
+            "愛称": np.char.add("ライバー", liver_ids.astype(str)),
+        }),
+        "room_list": pd.DataFrame({
+            "room_id": room_ids,
+            "room_name": np.char.add("ルーム", room_ids.astype(str)),
+            "room_url_key": np.char.add("r", room_ids.astype(str)),
+            "account_id": account_ids,
+        }),
+    }
+
+    # KPIデータ: 配信があったルームごとに複数行（全プラットフォーム分のため列も多い）
+    streamed = rng.choice(room_ids, int(rooms * STREAMED_RATIO), replace=False)
+    kpi_rows = int(rooms * STREAMS_PER_ROOM)
+    days = rng.integers(1, 29, kpi_rows)
+    frames["kpi"] = pd.DataFrame({
+        "配信日": [f"{year}-{month:02d}-{day:02d}" for day in days],
+        "room_id": rng.choice(streamed, kpi_rows),
+        "プラットフォーム": rng.choice(np.array(["アプリ", "ブラウザ", "外部"], dtype=object), kpi_rows),
+        "配信時間": rng.integers(10, 600, kpi_rows),
+        "視聴者数": rng.integers(0, 5000, kpi_rows),
+        "コメント数": rng.integers(0, 20000, kpi_rows),
+        "ギフト数": rng.integers(0, 100000, kpi_rows),
+        "フォロワー増": rng.integers(-50, 500, kpi_rows),
+    })
+
+    # 分配額データ: ルーム売上は1行目に全体合計、その他は1行目からアカウントごとのデータ（ヘッダー行なし）
+    sales_accounts = rng.choice(account_ids, int(rooms * SALES_RATIO), replace=False)
+    sales_amounts = _amounts(rng, len(sales_accounts), 40000)
+    total = pd.to_numeric(pd.Series(sales_amounts), errors="coerce").sum()
+    frames["sales"] = pd.DataFrame({
+        0: np.concatenate([[str(int(total))], sales_amounts]),
+        1: np.concatenate([["total"], sales_accounts]),
+    })
+    for key, ratio, decimals in (("paid_live", PAID_LIVE_RATIO, False), ("time_charge", TIME_CHARGE_RATIO, True)):
+        accounts = rng.choice(account_ids, int(rooms * ratio), replace=False)
+        frames[key] = pd.DataFrame({0: _amounts(rng, len(accounts), 20000, decimals), 1: accounts})
+
+    files = {}
+    for key, df in frames.items():
+        header = key not in ("sales", "paid_live", "time_charge")
+        path = _write(directory, urls[key], df, encodings[key], header)
+        files[key] = {"rows": len(df), "bytes": os.path.getsize(path), "encoding": encodings[key]}
+
+    manifest = {"params": params, "files": files}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
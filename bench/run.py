@@ -0,0 +1,211 @@
+"""
+ステージ別のベンチマーク
+
+ルーム数ごとに合成データを作成してローカルHTTPサーバーから配信し、
+別プロセスで 取得 → パース → 突き合わせ → ランク/支払計算 → CSV出力 を順に実行して、
+ステージごとの所要時間・ピークRSS・処理行数/秒を計測する。
+結果はベースラインとして保存でき、保存済みのベースラインと比較して性能の劣化を検出する。
+
+使い方:
+    python -m bench.run --rooms 1000 10000 100000 1000000 --encoding mixed
+    python -m bench.run --save-baseline main          # bench/baselines/main.json に保存
+    python -m bench.run --compare main --tolerance 0.2  # 20% 以上遅く（大きく）なったステージがあれば終了コード 1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from bench.generate import ENCODINGS, generate
+from bench.server import serve
+from metrics import peak_rss_mb, reset_peak_rss
+
+
+# --- 定数 ---
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, ".cache", "bench")
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_ROOMS = [1000, 10000, 100000]
+YEAR, MONTH = 2025, 9
+# 比較時、これより短い所要時間の差は誤差として扱う（秒）
+NOISE_FLOOR_SECONDS = 0.05
+
+
+# --- ステージの計測 ---
+@contextmanager
+def _stage(results, name, rows):
+    reset_peak_rss()
+    start = time.perf_counter()
+    yield
+    wall = time.perf_counter() - start
+    results.append({
+        "stage": name,
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rows": rows,
+        "rows_per_s": round(rows / wall) if wall > 0 else None,
+    })
+
+
+# --- 各ステージ（計測用のワーカープロセスで実行） ---
+def _rebase(url, base_url):
+    """本番URLのホスト部分をローカルサーバーに置き換える"""
+    return base_url + urlparse(url).path
+
+
+def measure(base_url, input_rows):
+    """1つのデータセットについて全ステージを実行し、ステージごとの計測結果のリストを返す"""
+    import pandas as pd
+
+    from fetch import HttpCache, fetch
+    from engine import get_mk_rank
+    from pipeline import (
+        ACCOUNT_ID, ALIAS, ROOM_ID, SOURCE_SCHEMAS,
+        build_results, has_columns, join_sources, month_labels, normalize_ids,
+        parse_source, revenue_frame, source_urls,
+    )
+    from export import to_csv_bytes
+
+    urls = {key: _rebase(url, base_url) for key, url in source_urls(YEAR, MONTH).items()}
+    results = []
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = HttpCache(cache_dir)
+
+        def fetch_all():
+            with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+                return dict(zip(urls, executor.map(lambda url: fetch(url, cache=cache), urls.values())))
+
+        with _stage(results, "fetch", input_rows):
+            fetched = fetch_all()
+        # 2回目はサーバー側が未更新のため 304 となり、キャッシュの本文を使用する
+        with _stage(results, "fetch_cached", input_rows):
+            fetched = fetch_all()
+
+    with _stage(results, "parse", input_rows):
+        frames = {key: parse_source(fetched[key], SOURCE_SCHEMAS[key]) for key in urls}
+
+    liver_df, room_list_df = frames["liver"], frames["room_list"]
+    liver_rows = len(liver_df)
+    with _stage(results, "join", liver_rows):
+        # pipeline.summarize と同じ正規化を行ってから突き合わせる
+        liver = pd.DataFrame({
+            ROOM_ID: normalize_ids(liver_df[0]).to_numpy(),
+            ALIAS: normalize_ids(liver_df[1]).to_numpy(),
+        })
+        room_accounts = pd.DataFrame({
+            ACCOUNT_ID: normalize_ids(room_list_df[3]).to_numpy(),
+            ROOM_ID: normalize_ids(room_list_df[0]).to_numpy(),
+        })
+        revenues = {
+            "sales": revenue_frame(frames["sales"], skip_first_row=True),
+            "paid_live": revenue_frame(frames["paid_live"]) if has_columns(frames["paid_live"], 0, 1) else None,
+            "time_charge": revenue_frame(frames["time_charge"]) if has_columns(frames["time_charge"], 0, 1) else None,
+        }
+        joined = join_sources(
+            liver,
+            normalize_ids(room_list_df[0]).unique(),
+            room_accounts,
+            normalize_ids(frames["kpi"][1]).unique(),
+            revenues,
+        )
+
+    with _stage(results, "rank_payout", liver_rows):
+        mk_rank = get_mk_rank(float(frames["sales"][0].iloc[0]))
+        results_df = build_results(joined, mk_rank, *month_labels(YEAR, MONTH))
+
+    with _stage(results, "csv_export", liver_rows):
+        to_csv_bytes(results_df)
+
+    return results
+
+
+def run_size(rooms, encoding, data_dir):
+    """ルーム数 rooms のデータセットを作成・配信し、新しいプロセスで計測する"""
+    directory = os.path.join(data_dir, f"{encoding}-{rooms}")
+    manifest = generate(directory, rooms, YEAR, MONTH, encoding)
+    input_rows = sum(info["rows"] for info in manifest["files"].values())
+    # ピークRSSが前のデータセットの影響を受けないよう、データセットごとに新しいプロセスで計測する
+    context = multiprocessing.get_context("spawn")
+    with serve(directory) as base_url:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            stages = executor.submit(measure, base_url, input_rows).result()
+    for stage in stages:
+        stage["rooms"] = rooms
+    return manifest, stages
+
+
+# --- 結果の表示とベースライン ---
+def print_results(results, baseline=None, tolerance=0.2):
+    """計測結果の表を表示し、ベースラインより劣化したステージの一覧を返す"""
+    base = {(r["rooms"], r["stage"]): r for r in (baseline or {}).get("results", [])}
+    regressions = []
+    header = f"{'rooms':>9} {'stage':<13} {'wall_s':>9} {'peak_MB':>9} {'rows/s':>12}"
+    if base:
+        header += f" {'vs base':>9}"
+    print(header)
+    for r in results:
+        line = f"{r['rooms']:>9} {r['stage']:<13} {r['wall_s']:>9.3f} {r['peak_rss_mb']:>9.1f} {r['rows_per_s'] or 0:>12,}"
+        previous = base.get((r["rooms"], r["stage"]))
+        if previous:
+            ratio = r["wall_s"] / previous["wall_s"] if previous["wall_s"] else 1.0
+            slower = ratio > 1 + tolerance and r["wall_s"] - previous["wall_s"] > NOISE_FLOOR_SECONDS
+            larger = r["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance)
+            line += f" {ratio:>8.2f}x"
+            if slower or larger:
+                line += "  << REGRESSION" + (" (time)" if slower else "") + (" (rss)" if larger else "")
+                regressions.append(r)
+        print(line)
+    return regressions
+
+
+def _baseline_path(name):
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="月次サマリー処理のステージ別ベンチマーク")
+    parser.add_argument("--rooms", type=int, nargs="+", default=DEFAULT_ROOMS, help="計測するルーム数（複数指定可）")
+    parser.add_argument("--encoding", choices=sorted(ENCODINGS), default="mixed", help="合成データの文字コード")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="合成データの作成先（作成済みなら再利用）")
+    parser.add_argument("--save-baseline", metavar="NAME", help="結果をベースラインとして保存する")
+    parser.add_argument("--compare", metavar="NAME", help="保存済みのベースラインと比較する")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="劣化と判定する割合（0.2 = 20%%）")
+    parser.add_argument("--json", metavar="PATH", help="結果をJSONで書き出す")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(_baseline_path(args.compare), "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = []
+    for rooms in args.rooms:
+        manifest, stages = run_size(rooms, args.encoding, args.data_dir)
+        total_mb = sum(info["bytes"] for info in manifest["files"].values()) / (1024 * 1024)
+        print(f"# rooms={rooms} encoding={args.encoding} input={total_mb:.1f}MB", file=sys.stderr)
+        results += stages
+
+    regressions = print_results(results, baseline, args.tolerance)
+
+    report = {"encoding": args.encoding, "python": sys.version.split()[0], "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        path = _baseline_path(args.save_baseline)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"ベースラインを保存しました: {path}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
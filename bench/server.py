@@ -0,0 +1,187 @@
+"""
+ローカルHTTPサーバー（本番サーバーの代わり）
+
+generate.py で作成したディレクトリをそのまま配信する。
+HTTP/1.1 の keep-alive、ETag / Last-Modified による条件付きGET（304）、gzip / deflate の転送圧縮、
+Range / If-Range による部分取得に対応しているため、キャッシュ経路や接続の再利用も計測できる。
+faults（Faults）を指定すると、5xx の応答・接続の切断・本文の途中での切断・応答の遅延を確率で発生させ、
+http_client の再試行と続きからの取得を確認できる。
+"""
+import email.utils
+import gzip
+import http.server
+import os
+import random
+import threading
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+
+
+@dataclass
+class Faults:
+    """
+    障害の注入設定（リクエストごとに各確率で発生させる）と、発生した回数の記録
+    every を指定した場合は、確率ではなく every 回に1回（1回目・every+1回目…）発生させる
+    """
+    error_rate: float = 0.0      # 503 を返す
+    reset_rate: float = 0.0      # 応答を返さずに接続を切る
+    truncate_rate: float = 0.0   # 本文の途中で接続を切る（Content-Length は全体の長さ）
+    delay_s: float = 0.0         # 応答を返す前に待つ秒数（読み込みタイムアウトの確認用）
+    retry_after: int = None      # 503 に付ける Retry-After（秒）
+    compress: bool = True        # Accept-Encoding に従って gzip / deflate で返す
+    ranges: bool = True          # Range / If-Range に対応する
+    every: int = None
+    seed: int = None
+    # 記録（リクエスト数・接続数・注入した障害の種類ごとの回数）
+    counts: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            return self.counts[name]
+
+    def draw(self, rate, number):
+        """number 回目のリクエストで、確率 rate の障害を発生させるか"""
+        if not rate:
+            return False
+        if self.every:
+            return (number - 1) % self.every == 0
+        with self._lock:
+            return self._random.random() < rate
+
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    """条件付きGET・転送圧縮・Range に対応し、障害を注入するハンドラー（アクセスログは出力しない）"""
+
+    protocol_version = "HTTP/1.1"
+
+    def __init__(self, *args, faults, **kwargs):
+        self.faults = faults
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.faults.count("connections")
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        try:
+            self._send(send_body)
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが先に接続を切った（タイムアウトなど）
+            self.close_connection = True
+
+    def _send(self, send_body):
+        faults = self.faults
+        number = faults.count("requests")
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        if faults.delay_s:
+            threading.Event().wait(faults.delay_s)
+        if faults.draw(faults.reset_rate, number):
+            faults.count("reset")
+            self.close_connection = True
+            return
+        if faults.draw(faults.error_rate, number):
+            faults.count("error")
+            self.send_response(503)
+            if faults.retry_after is not None:
+                self.send_header("Retry-After", str(faults.retry_after))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        stat = os.stat(path)
+        etag = _etag(stat)
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        if self.headers.get("If-None-Match") == etag or (
+            self.headers.get("If-None-Match") is None and self.headers.get("If-Modified-Since") == last_modified
+        ):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            body = f.read()
+        status, headers = 200, {}
+        start = self._range_start(etag, last_modified)
+        if start is not None and start < len(body):
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            body = body[start:]
+        elif faults.compress:
+            accepted = self.headers.get("Accept-Encoding", "")
+            if "gzip" in accepted:
+                body, headers["Content-Encoding"] = gzip.compress(body, compresslevel=1), "gzip"
+            elif "deflate" in accepted:
+                body, headers["Content-Encoding"] = zlib.compress(body, 1), "deflate"
+
+        self.send_response(status)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if faults.ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not send_body:
+            return
+        if len(body) > 1 and faults.draw(faults.truncate_rate, number):
+            faults.count("truncate")
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def _range_start(self, etag, last_modified):
+        """Range: bytes=N- の N（If-Range が現在の版と一致しない・対応しない場合は None）"""
+        requested = self.headers.get("Range", "")
+        if not self.faults.ranges or not requested.startswith("bytes=") or not requested.endswith("-"):
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range not in (etag, last_modified):
+            return None
+        start = requested[len("bytes="):-1]
+        return int(start) if start.isdigit() else None
+
+
+@contextmanager
+def serve(directory, faults=None):
+    """
+    directory を配信するサーバーをバックグラウンドで起動し、ベースURL（http://127.0.0.1:port）を返す
+    faults（Faults）を指定した場合は障害を注入し、発生した回数を faults.counts に記録する
+    """
+    handler = partial(_Handler, directory=directory, faults=faults or Faults())
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,144 @@
+"""
+前月との比較（Month-over-month）
+
+処理月の結果リストと、前月の保存済みの型付きの結果リスト（スナップショット、無い場合は差分再計算用の保存結果）を
+ルームIDで1回だけ突き合わせ、個別ランクの変化・配信有無の変化・支払想定額の増減を列単位でまとめて求める。
+前月のCSVの再ダウンロード・再パースは行わない。
+同じルームIDが複数行ある場合は、各月とも最初の行を比較に使う。
+"""
+import datetime
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from engine import INDIVIDUAL_RANKS
+from incremental import result_store
+from result_model import ESTIMATE_COLUMNS, RANK_COLUMN, render_column
+from snapshot import snapshot_store
+
+
+# --- 定数 ---
+ROOM_ID_COLUMN = "ルームID"
+ALIAS_COLUMN = "ライバー愛称"
+STREAM_COLUMN = "配信有無"
+PAYOUT_COLUMN = "支払想定額合計"
+# 支払想定額の増減の一覧に表示する件数
+TOP_N = 50
+
+
+@dataclass
+class MonthDelta:
+    """処理月と前月の比較結果"""
+    previous_month: tuple          # (year, month)
+    rooms: pd.DataFrame            # 両月にあるルームの比較表（ルームごとに1行）
+    added: int                     # 処理月にだけあるルームの数
+    removed: int                   # 前月にだけあるルームの数
+
+    def rank_transitions(self):
+        """個別ランクの変化（前月 × 処理月 の件数の表。変化が無いルームを含む。ランクの順、その後に "#N/A" などの表記）"""
+        table = pd.crosstab(self.rooms["個別ランク（前月）"], self.rooms["個別ランク"])
+        labels = set(table.index) | set(table.columns)
+        order = [rank for rank in INDIVIDUAL_RANKS if rank in labels] + sorted(labels - set(INDIVIDUAL_RANKS))
+        return table.reindex(index=order, columns=order, fill_value=0).rename_axis(index="前月 \\ 処理月", columns=None)
+
+    def rank_changes(self):
+        """個別ランクが変わったルームの一覧（上がった段階の大きい順。ランクの有無が変わったルームは最後）"""
+        rows = self.rooms[self.rooms["個別ランク（前月）"] != self.rooms["個別ランク"]]
+        return rows.sort_values("ランクの変化", ascending=False, kind="stable", na_position="last")[
+            [ROOM_ID_COLUMN, ALIAS_COLUMN, "個別ランク（前月）", "個別ランク", "ランクの変化"]
+        ]
+
+    def stream_changes(self):
+        """配信有無が変わったルームの一覧（配信開始・配信停止）"""
+        rows = self.rooms[self.rooms["配信の変化"] != ""]
+        return rows.sort_values("配信の変化", kind="stable")[
+            [ROOM_ID_COLUMN, ALIAS_COLUMN, "配信有無（前月）", STREAM_COLUMN, "配信の変化"]
+        ]
+
+    def payout_changes(self, top_n=TOP_N):
+        """支払想定額合計の増減が大きいルーム（増減の絶対値の大きい順に top_n 件）"""
+        delta = self.rooms["増減額"].to_numpy()
+        top = np.argsort(-np.abs(delta), kind="stable")[:top_n]
+        return self.rooms.iloc[top][
+            [ROOM_ID_COLUMN, ALIAS_COLUMN, f"{PAYOUT_COLUMN}（前月）", PAYOUT_COLUMN, "増減額", "増減率(%)"]
+        ]
+
+
+def previous_month(year, month):
+    date = datetime.date(year, month, 1) - relativedelta(months=1)
+    return date.year, date.month
+
+
+def load_month_results(year, month):
+    """保存済みの型付きの結果リストを返す（スナップショット、無い場合は差分再計算用の保存結果）。無い場合は None"""
+    results = snapshot_store.load(year, month)
+    if results is not None:
+        return results
+    stored = result_store.load(year, month)
+    return None if stored is None else stored[1]
+
+
+def _payout_total(frame):
+    """3種類の支払想定額の合計（計算対象外の支払想定額は 0 とする）"""
+    total = np.zeros(len(frame))
+    for column in ESTIMATE_COLUMNS:
+        total += np.nan_to_num(frame[column].to_numpy(dtype=np.float64, na_value=np.nan))
+    return total
+
+
+def _rank_codes(frame):
+    """個別ランクの位置（INDIVIDUAL_RANKS の添字。ランクが無い場合は -1）"""
+    return frame[RANK_COLUMN].cat.set_categories(INDIVIDUAL_RANKS).cat.codes.to_numpy()
+
+
+def compare(current, previous, previous_ym):
+    """処理月の結果リスト current と前月の結果リスト previous を比較し、MonthDelta を返す"""
+    current = current[~current[ROOM_ID_COLUMN].duplicated()]
+    previous = previous[~previous[ROOM_ID_COLUMN].duplicated()]
+    # 処理月の各行に対応する前月の行の位置（前月に無い場合は -1）
+    position = pd.Index(previous[ROOM_ID_COLUMN].to_numpy(dtype=object)).get_indexer(
+        current[ROOM_ID_COLUMN].to_numpy(dtype=object)
+    )
+    both = position >= 0
+    cur = current[both]
+    prev = previous.iloc[position[both]]
+
+    cur_payout, prev_payout = _payout_total(cur), _payout_total(prev)
+    delta = cur_payout - prev_payout
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(prev_payout != 0, np.round(delta / prev_payout * 100, 1), np.nan)
+
+    cur_streamed = cur[STREAM_COLUMN].to_numpy(dtype=object) == "有り"
+    prev_streamed = prev[STREAM_COLUMN].to_numpy(dtype=object) == "有り"
+    stream_change = np.select(
+        [cur_streamed & ~prev_streamed, ~cur_streamed & prev_streamed], ["配信開始", "配信停止"], default="",
+    )
+
+    cur_rank, prev_rank = _rank_codes(cur), _rank_codes(prev)
+    rooms = pd.DataFrame({
+        ROOM_ID_COLUMN: cur[ROOM_ID_COLUMN].to_numpy(),
+        ALIAS_COLUMN: cur[ALIAS_COLUMN].to_numpy(),
+        "個別ランク（前月）": render_column(prev, RANK_COLUMN),
+        "個別ランク": render_column(cur, RANK_COLUMN),
+        # ランクの段階の差（どちらかの月にランクが無い場合は NaN）
+        "ランクの変化": np.where((cur_rank >= 0) & (prev_rank >= 0), cur_rank - prev_rank, np.nan),
+        "配信有無（前月）": render_column(prev, STREAM_COLUMN),
+        STREAM_COLUMN: render_column(cur, STREAM_COLUMN),
+        "配信の変化": stream_change.astype(object),
+        f"{PAYOUT_COLUMN}（前月）": prev_payout,
+        PAYOUT_COLUMN: cur_payout,
+        "増減額": delta,
+        "増減率(%)": ratio,
+    })
+    return MonthDelta(previous_ym, rooms, added=int((~both).sum()), removed=len(previous) - int(both.sum()))
+
+
+def compare_with_previous(year, month, current):
+    """処理月の結果リストを前月の保存済みの結果リストと比較する。前月の結果が無い場合は None"""
+    previous_ym = previous_month(year, month)
+    previous = load_month_results(*previous_ym)
+    if previous is None:
+        return None
+    return compare(current, previous, previous_ym)
@@ -0,0 +1,337 @@
+"""
+個別ランク・MKランク・支払想定額の計算
+
+1ルームずつ計算する関数（仕様の基準となる実装）と、
+ルーム全件を列単位でまとめて計算するベクトル化版を提供する。
+ベクトル化版は "#N/A" / "#ERROR" / "#ERROR_CALC" などのエラー表記も含め、1ルームずつの関数と同じ結果を返す。
+"""
+import numpy as np
+import pyarrow as pa
+
+
+# --- 定数（ランク・レート表） ---
+# 個別ランク（低い順）と、各ランクの下限となるルーム売上分配額
+INDIVIDUAL_RANKS = ['E', 'D', 'C', 'B', 'A', 'S', 'SS', 'SSS']
+INDIVIDUAL_RANK_THRESHOLDS = [22501, 45001, 90001, 135001, 270001, 450001, 900001]  # D 〜 SSS の下限
+
+# 個別ランクに応じた基本レートの辞書 (mk_rank 1, 3, 5, 7, 9, 11 のキーを使用)
+RANK_RATES = {
+    'D': {1: 0.750, 3: 0.755, 5: 0.760, 7: 0.765, 9: 0.770, 11: 0.775},
+    'E': {1: 0.725, 3: 0.730, 5: 0.735, 7: 0.740, 9: 0.745, 11: 0.750},
+    'C': {1: 0.775, 3: 0.780, 5: 0.785, 7: 0.790, 9: 0.795, 11: 0.800},
+    'B': {1: 0.800, 3: 0.805, 5: 0.810, 7: 0.815, 9: 0.820, 11: 0.825},
+    'A': {1: 0.825, 3: 0.830, 5: 0.835, 7: 0.840, 9: 0.845, 11: 0.850},
+    'S': {1: 0.850, 3: 0.855, 5: 0.860, 7: 0.865, 9: 0.870, 11: 0.875},
+    'SS': {1: 0.875, 3: 0.880, 5: 0.885, 7: 0.890, 9: 0.895, 11: 0.900},
+    'SSS': {1: 0.900, 3: 0.905, 5: 0.910, 7: 0.915, 9: 0.920, 11: 0.925},
+}
+# MKランク（1〜11）からレート表のキーへの対応 (1,2 -> 1, 3,4 -> 3, ...)
+MK_RANK_TO_RATE_KEY = {1: 1, 2: 1, 3: 3, 4: 3, 5: 5, 6: 5, 7: 7, 8: 7, 9: 9, 10: 9, 11: 11}
+RATE_KEYS = [1, 3, 5, 7, 9, 11]
+# 個別ランク × レートキーのレート行列（INDIVIDUAL_RANKS, RATE_KEYS の順）
+RATE_MATRIX = np.array([[RANK_RATES[rank][key] for key in RATE_KEYS] for rank in INDIVIDUAL_RANKS])
+
+# プレミアムライブ・タイムチャージの支払レート
+PAID_LIVE_RATE = 0.9
+TIME_CHARGE_RATE = 1.00
+
+
+# --- 個別ランク判定関数 ---
+def get_individual_rank(sales_amount_str):
+    """
+    ルーム売上分配額（文字列）から個別ランクを判定する
+    """
+    if sales_amount_str == "#N/A":
+        return "#N/A"
+    
+    try:
+        amount = float(sales_amount_str)
+        
+        if amount >= 900001:
+            return "SSS"
+        elif amount >= 450001:
+            return "SS"
+        elif amount >= 270001:
+            return "S"
+        elif amount >= 135001:
+            return "A"
+        elif amount >= 90001:
+            return "B"
+        elif amount >= 45001:
+            return "C"
+        elif amount >= 22501:
+            return "D"
+        elif amount >= 0:
+            return "E"
+        else:
+            return "E" 
+            
+    except ValueError:
+        return "#ERROR"
+
+# --- MKランク判定関数 ---
+def get_mk_rank(revenue):
+    """
+    全体分配額合計からMKランク（1〜11）を判定する
+    """
+    if revenue <= 175000:
+        return 1
+    elif revenue <= 350000:
+        return 2
+    elif revenue <= 525000:
+        return 3
+    elif revenue <= 700000:
+        return 4
+    elif revenue <= 875000:
+        return 5
+    elif revenue <= 1050000:
+        return 6
+    elif revenue <= 1225000:
+        return 7
+    elif revenue <= 1400000:
+        return 8
+    elif revenue <= 1575000:
+        return 9
+    elif revenue <= 1750000:
+        return 10
+    else:
+        return 11
+        
+# --- ルーム売上支払想定額計算関数 ---
+def calculate_payment_estimate(individual_rank, mk_rank, individual_revenue):
+    """
+    個別ランク、MKランク、個別分配額から支払想定額を計算する
+    """
+    if individual_revenue == "#N/A" or individual_rank == "#N/A":
+        return "#N/A"
+
+    try:
+        individual_revenue = float(individual_revenue)
+        # MKランクに応じてキーを決定 (1,2 -> 1, 3,4 -> 3, ...)
+        key = MK_RANK_TO_RATE_KEY.get(mk_rank)
+        if key is None:
+            return "#ERROR_MK"
+
+        # 適用レートの取得
+        rate = RANK_RATES.get(individual_rank, {}).get(key)
+        
+        if rate is None:
+            return "#ERROR_RANK"
+
+        # 計算式の適用: ($individualRevenue * 1.08 * $rate) / 1.10 * 1.10
+        payment_estimate = (individual_revenue * 1.08 * rate) / 1.10 * 1.10
+        
+        # 結果を小数点以下を四捨五入して整数に丸める
+        return str(round(payment_estimate)) 
+
+    except Exception:
+        return "#ERROR_CALC"
+        
+# --- プレミアムライブ支払想定額計算関数 ---
+def calculate_paid_live_payment_estimate(paid_live_amount_str):
+    """
+    プレミアムライブ分配額から支払想定額を計算する
+    """
+    # プレミアムライブ分配額がない場合はブランクを返す
+    if paid_live_amount_str == "" or paid_live_amount_str == "#N/A":
+        return ""
+
+    try:
+        # 分配額を数値に変換
+        individual_revenue = float(paid_live_amount_str)
+        
+        # 計算式の適用: ($individualRevenue * 1.00 * 1.08 * 0.9) / 1.10 * 1.10
+        payment_estimate = (individual_revenue * 1.08 * PAID_LIVE_RATE) / 1.10 * 1.10
+        
+        # 結果を小数点以下を四捨五入して整数に丸める
+        return str(round(payment_estimate))
+
+    except ValueError:
+        return "#ERROR_CALC"
+
+# --- タイムチャージ支払想定額計算関数 ---
+def calculate_time_charge_payment_estimate(time_charge_amount_str):
+    """
+    タイムチャージ分配額から支払想定額を計算する
+    """
+    # タイムチャージ分配額がない場合はブランクを返す
+    if time_charge_amount_str == "" or time_charge_amount_str == "#N/A":
+        return ""
+
+    try:
+        # 分配額を数値に変換
+        individual_revenue = float(time_charge_amount_str)
+        
+        # 計算式の適用: ($individualRevenue * 1.08 * 1.00) / 1.10 * 1.10
+        payment_estimate = (individual_revenue * 1.08 * TIME_CHARGE_RATE) / 1.10 * 1.10
+        
+        # 結果を小数点以下を四捨五入して整数に丸める
+        return str(round(payment_estimate))
+
+    except ValueError:
+        return "#ERROR_CALC"
+
+
+# --- ベクトル化版（ルーム全件を列単位で計算） ---
+# 数値化をまとめて行う単位（数値化できない値を含む塊だけを1件ずつ判定し直す）
+PARSE_CHUNK_SIZE = 1024
+
+
+def parse_amounts(values, skip=None):
+    """
+    分配額の配列を float() と同じ規則で数値化し、(数値配列, 数値化できたかの真偽配列) を返す
+    skip が True の位置（"#N/A" などの表記）は数値化しない
+    値の変換は numpy の object→float64 変換（float() と同じ規則）で塊ごとにまとめて行い、
+    数値化できない値を含む塊のみ1件ずつ float() で判定する
+    """
+    values = np.asarray(values, dtype=object)
+    amounts = np.full(len(values), np.nan)
+    parsed = np.zeros(len(values), dtype=bool)
+    positions = np.arange(len(values)) if skip is None else np.flatnonzero(~skip)
+    targets = values[positions]
+
+    for start in range(0, len(targets), PARSE_CHUNK_SIZE):
+        chunk_positions = positions[start:start + PARSE_CHUNK_SIZE]
+        chunk = targets[start:start + PARSE_CHUNK_SIZE]
+        try:
+            amounts[chunk_positions] = chunk.astype(np.float64)
+            parsed[chunk_positions] = True
+        except (ValueError, TypeError):
+            for position, value in zip(chunk_positions, chunk):
+                try:
+                    amounts[position] = float(value)
+                    parsed[position] = True
+                except (ValueError, TypeError):
+                    pass
+    return amounts, parsed
+
+
+# --- 状態コード（型付きの結果リストで、数値の代わりに表示する表記を表す。uint8 で保持） ---
+STATUS_OK = 0              # 数値あり
+STATUS_NOT_AVAILABLE = 1   # データなし（"#N/A"、プレミアムライブ・タイムチャージはブランク）
+STATUS_INVALID = 2         # 数値にできない分配額（個別ランクは "#ERROR"）
+STATUS_ERROR_CALC = 3      # 計算できない（"#ERROR_CALC"）
+STATUS_ERROR_MK = 4        # MKランクがレート表に無い（"#ERROR_MK"）
+
+# 状態コードごとの表記（STATUS_NOT_AVAILABLE の表記は列ごとに異なる）
+STATUS_TEXT = {
+    STATUS_INVALID: "#ERROR",
+    STATUS_ERROR_CALC: "#ERROR_CALC",
+    STATUS_ERROR_MK: "#ERROR_MK",
+}
+
+
+def format_integers(values):
+    """四捨五入済みの数値の配列を整数の文字列（str(round(v)) と同じ表記）の object 配列にする"""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) and np.abs(values).max() < 2.0 ** 63:
+        # int64 の文字列化は pyarrow でまとめて行う（str(int) と同じ表記）
+        return pa.array(values.astype(np.int64)).cast(pa.string()).to_numpy(zero_copy_only=False)
+    return np.array([str(int(v)) for v in values.tolist()], dtype=object)
+
+
+def format_statuses(values, status, not_available_text):
+    """
+    (四捨五入済みの数値, 状態コード) の配列を表記の object 配列にする
+    STATUS_OK の位置は整数の文字列、それ以外は状態コードの表記
+    """
+    ok = status == STATUS_OK
+    if ok.all():
+        return format_integers(values)
+    out = np.full(len(status), not_available_text, dtype=object)
+    for code, text in STATUS_TEXT.items():
+        out[status == code] = text
+    out[ok] = format_integers(np.asarray(values)[ok])
+    return out
+
+
+def _round_estimates(estimates, parsed):
+    """支払想定額を四捨五入し、(数値, 状態コード) を返す（NaN / 無限大は round() が例外になるため #ERROR_CALC）"""
+    ok = parsed & np.isfinite(estimates)
+    values = np.full(len(estimates), np.nan)
+    values[ok] = np.rint(estimates[ok])
+    status = np.where(ok, STATUS_OK, STATUS_ERROR_CALC).astype(np.uint8)
+    return values, status
+
+
+def classify_sales(sales_amounts):
+    """
+    ルーム売上分配額の配列から個別ランクを判定する
+    戻り値: (ランクの位置（INDIVIDUAL_RANKS の添字）, ランクの状態コード, 数値化した分配額, 数値化できたか, "#N/A" か)
+    """
+    sales_amounts = np.asarray(sales_amounts, dtype=object)
+    not_available = sales_amounts == "#N/A"
+    amounts, parsed = parse_amounts(sales_amounts, skip=not_available)
+
+    # しきい値に対して二分探索でランクを決定（NaN はどの条件も満たさないため "E"）
+    rank_index = np.searchsorted(INDIVIDUAL_RANK_THRESHOLDS, amounts, side='right')
+    rank_index[np.isnan(amounts)] = 0
+    rank_status = np.full(len(sales_amounts), STATUS_OK, dtype=np.uint8)
+    rank_status[~parsed] = STATUS_INVALID
+    rank_status[not_available] = STATUS_NOT_AVAILABLE
+    return rank_index, rank_status, amounts, parsed, not_available
+
+
+def format_ranks(rank_index, rank_status):
+    """(ランクの位置, 状態コード) の配列を個別ランクの表記（"E" 〜 "SSS" / "#ERROR" / "#N/A"）にする"""
+    ranks = np.asarray(INDIVIDUAL_RANKS, dtype=object)[rank_index]
+    ranks[rank_status == STATUS_INVALID] = "#ERROR"
+    ranks[rank_status == STATUS_NOT_AVAILABLE] = "#N/A"
+    return ranks
+
+
+def payment_estimate_values(sales_amounts, mk_rank):
+    """
+    ルーム売上分配額の配列から、個別ランクとルーム売上支払想定額を数値・状態コードで返す
+    戻り値: (ランクの位置, ランクの状態コード, 四捨五入済みの支払想定額, 支払想定額の状態コード)
+    """
+    rank_index, rank_status, amounts, parsed, not_available = classify_sales(sales_amounts)
+
+    key = MK_RANK_TO_RATE_KEY.get(mk_rank)
+    if key is None:
+        values = np.full(len(amounts), np.nan)
+        status = np.where(parsed, STATUS_ERROR_MK, STATUS_ERROR_CALC).astype(np.uint8)
+    else:
+        rates = RATE_MATRIX[rank_index, RATE_KEYS.index(key)]
+        # 計算式の適用: ($individualRevenue * 1.08 * $rate) / 1.10 * 1.10
+        values, status = _round_estimates((amounts * 1.08 * rates) / 1.10 * 1.10, parsed)
+    status[not_available] = STATUS_NOT_AVAILABLE
+    return rank_index, rank_status, values, status
+
+
+def fixed_rate_estimate_values(amount_values, rate):
+    """
+    プレミアムライブ・タイムチャージ分配額の配列から、支払想定額を (四捨五入済みの数値, 状態コード) で返す
+    分配額が無い（"" / "#N/A"）場合は STATUS_NOT_AVAILABLE（ブランク）
+    """
+    amount_values = np.asarray(amount_values, dtype=object)
+    blank = (amount_values == "") | (amount_values == "#N/A")
+    amounts, parsed = parse_amounts(amount_values, skip=blank)
+    # 計算式の適用: ($individualRevenue * 1.08 * $rate) / 1.10 * 1.10
+    values, status = _round_estimates((amounts * 1.08 * rate) / 1.10 * 1.10, parsed)
+    status[blank] = STATUS_NOT_AVAILABLE
+    return values, status
+
+
+def compute_individual_ranks(sales_amounts):
+    """ルーム売上分配額の配列から個別ランクの配列を返す（get_individual_rank の列版）"""
+    rank_index, rank_status = classify_sales(sales_amounts)[:2]
+    return format_ranks(rank_index, rank_status)
+
+
+def compute_payment_estimates(sales_amounts, mk_rank):
+    """
+    ルーム売上分配額の配列から (個別ランク配列, ルーム売上支払想定額配列) を返す
+    （get_individual_rank と calculate_payment_estimate の列版）
+    """
+    rank_index, rank_status, values, status = payment_estimate_values(sales_amounts, mk_rank)
+    return format_ranks(rank_index, rank_status), format_statuses(values, status, "#N/A")
+
+
+def compute_fixed_rate_estimates(amount_values, rate):
+    """
+    プレミアムライブ・タイムチャージ分配額の配列から支払想定額の配列を返す
+    （calculate_paid_live_payment_estimate / calculate_time_charge_payment_estimate の列版）
+    分配額が無い（"" / "#N/A"）場合はブランク
+    """
+    return format_statuses(*fixed_rate_estimate_values(amount_values, rate), "")
@@ -0,0 +1,128 @@
+"""
+結果リストの書き出し（CSV / Parquet / XLSX）
+
+型付きの結果リストを EXPORT_CHUNK_ROWS 行ずつ表記の表に変換し（result_model.render）、1つのバイトバッファに直接書き出す。
+全行分の文字列の表は作らないため、保持する文字列は1チャンク分のみ。
+配信月・支払月は全行同じ値のため、Excel対策の ="2025/10" 表記は値の種類ごとに1回だけ作る。
+XLSX は任意の依存（requirements.txt には含めない）の xlsxwriter が入っている場合のみ作成できる（constant_memory モードで行ごとに書き出す）。
+複数の管理ライバーリストの結果CSVは、1つの ZIP にまとめて書き出す（to_zip_bytes）。
+"""
+import codecs
+import re
+import zipfile
+from io import BytesIO
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from result_model import display_columns, render
+
+try:
+    import xlsxwriter
+except ImportError:  # XLSX 出力は任意機能
+    xlsxwriter = None
+
+
+# --- 定数 ---
+# 1回に書き出す行数
+EXPORT_CHUNK_ROWS = 50_000
+# Excelで日付に自動変換されないよう ="..." 形式にする列
+EXCEL_TEXT_COLUMNS = ["配信月", "支払月"]
+
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "zip": ("zip", "application/zip"),
+}
+
+
+def export_file_name(year, month, fmt="csv"):
+    """結果ファイルのファイル名"""
+    return f'showroom_liver_sales_estimate_{year}{month:02d}.{EXPORT_FORMATS[fmt][0]}'
+
+
+def agency_file_name(name, year, month, fmt="csv"):
+    """管理ライバーリスト（事務所・チーム）ごとの結果ファイルのファイル名（ファイル名に使えない文字は "_" にする）"""
+    safe_name = re.sub(r'[\\/:*?"<>|\s]+', "_", name).strip("_") or "list"
+    return f"{safe_name}_{export_file_name(year, month, fmt)}"
+
+
+def csv_file_name(year, month):
+    """結果CSVのファイル名"""
+    return export_file_name(year, month, "csv")
+
+
+def _chunks(df):
+    """型付きの結果リストを EXPORT_CHUNK_ROWS 行ずつ表記の表に変換する。0行の場合は空の表を1回返す"""
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        yield render(df.iloc[start:start + EXPORT_CHUNK_ROWS])
+
+
+def _excel_text(series):
+    """="値" 形式にした列（同じ値の変換は1回だけ行う）"""
+    values = series.astype(str)
+    return values.map({value: f'="{value}"' for value in values.unique()})
+
+
+def to_csv_bytes(results_df):
+    """結果リストをCSV（BOM付きUTF-8、Excel対応、配信月・支払月は ="2025/10" 形式）のバイト列にする"""
+    buffer = BytesIO()
+    buffer.write(codecs.BOM_UTF8)
+    for i, chunk in enumerate(_chunks(results_df)):
+        # 置き換えるのは該当する2列だけ（チャンク分の小さな表を作り、元の結果リストは変更しない）
+        chunk = chunk.assign(**{
+            column: _excel_text(chunk[column]) for column in EXCEL_TEXT_COLUMNS if column in chunk.columns
+        })
+        # チャンク単位で文字列にしてから書き込む（ファイルハンドルへの直接出力より速く、保持するのは1チャンク分のみ）
+        buffer.write(chunk.to_csv(index=False, header=(i == 0)).encode('utf-8'))
+    return buffer.getvalue()
+
+
+def to_parquet_bytes(results_df):
+    """結果リストを Parquet のバイト列にする（配信月・支払月は "2025/10" の文字列のまま）"""
+    sink = pa.BufferOutputStream()
+    writer = None
+    for chunk in _chunks(results_df):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+    writer.close()
+    return sink.getvalue().to_pybytes()
+
+
+def xlsx_available():
+    return xlsxwriter is not None
+
+
+def to_xlsx_bytes(results_df, sheet_name="結果リスト"):
+    """結果リストを XLSX のバイト列にする（全てのセルを文字列として書き込むため、日付への自動変換は起きない）"""
+    if xlsxwriter is None:
+        raise RuntimeError("XLSX の出力には xlsxwriter が必要です。")
+    buffer = BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {
+        "constant_memory": True,
+        "in_memory": False,
+        "strings_to_formulas": False,
+        "strings_to_urls": False,
+    })
+    worksheet = workbook.add_worksheet(sheet_name)
+    worksheet.write_row(0, 0, display_columns(results_df))
+    row = 1
+    for chunk in _chunks(results_df):
+        for values in chunk.itertuples(index=False, name=None):
+            worksheet.write_row(row, 0, ["" if pd.isna(value) else str(value) for value in values])
+            row += 1
+    workbook.close()
+    return buffer.getvalue()
+
+
+def to_zip_bytes(files):
+    """{ファイル名: バイト列} を1つの ZIP のバイト列にする"""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
@@ -0,0 +1,286 @@
+"""
+CSV取得レイヤー
+
+サーバー側のファイルが更新されていない場合は再ダウンロードしないよう、
+ETag / Last-Modified を用いた条件付きGETで検証するディスクキャッシュを提供する。
+（「常に最新データを取得する」方針は維持し、304 の場合のみ保存済みの内容を使用する）
+取得は共有の接続プール（http_client）経由で行い、転送圧縮・再試行・途中で切れた本文の続きからの取得はそちらで扱う。
+取得した本文は一度だけ読み込み、先頭部分から文字コードを判定してメモリ上でパースする。
+"""
+import codecs
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from io import BytesIO
+
+import pandas as pd
+
+from http_client import HttpError, http_client
+
+
+# --- 定数（キャッシュ設定） ---
+CACHE_DIR = os.environ.get(
+    "SR_SUMMARY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "http"),
+)
+# キャッシュ全体の上限サイズ（超えた場合は最終利用が古いものから削除）
+CACHE_MAX_BYTES = int(os.environ.get("SR_SUMMARY_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# --- 定数（文字コード判定） ---
+# 判定に使う先頭部分のバイト数
+ENCODING_SNIFF_BYTES = 64 * 1024
+# 判定の優先順（BOM付きUTF-8はBOMの有無で別途判定する）
+CANDIDATE_ENCODINGS = ('utf-8', 'shift_jis', 'cp932')
+
+
+@dataclass
+class FetchResult:
+    """1件のURL取得結果"""
+    url: str
+    body: bytes
+    status: int            # サーバーの応答コード（200: 再取得 / 304: 未更新）
+    from_cache: bool       # True の場合、本文はキャッシュから返したもの
+    etag: str = None
+    last_modified: str = None
+    encoding: str = None   # パース時に使用した文字コード（read_csv_bytes で設定）
+    attempts: int = 1      # 送ったリクエストの数（再試行・続きからの取得を含む）
+
+    @property
+    def nbytes(self):
+        return len(self.body)
+
+    @cached_property
+    def sha256(self):
+        """本文の指紋（内容が変わったかどうかの判定用）"""
+        return hashlib.sha256(self.body).hexdigest()
+
+
+class HttpCache:
+    """
+    URLごとに本文とメタ情報（検証子）を保存するディスクキャッシュ
+    本文・メタ情報とも一時ファイルに書き出してから os.replace で差し替える（途中状態を残さない）
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + ".body", base + ".json"
+
+    def lookup(self, url):
+        """キャッシュ済みのメタ情報（検証子）を返す。無い・壊れている場合は None"""
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("url") == url else None
+
+    def read_body(self, url, meta):
+        """保存済みの本文を返す。メタ情報と一致しない（差し替え途中など）場合は None"""
+        body_path, _ = self._paths(url)
+        try:
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        if meta.get("size") != len(body) or meta.get("sha256") != hashlib.sha256(body).hexdigest():
+            return None
+        return body
+
+    def touch(self, url):
+        """LRU判定用に最終利用時刻を更新する"""
+        body_path, _ = self._paths(url)
+        try:
+            os.utime(body_path, None)
+        except OSError:
+            pass
+
+    def store(self, url, body, etag=None, last_modified=None):
+        """本文を保存する（本文→メタ情報の順に原子的に差し替え）"""
+        os.makedirs(self.directory, exist_ok=True)
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": len(body),
+            "sha256": hashlib.sha256(body).hexdigest(),
+        }
+        atomic_write(body_path, body)
+        atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        self.evict()
+
+    def evict(self):
+        """合計サイズが上限を超えている間、最終利用が最も古いエントリから削除する"""
+        with self._lock:
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                return
+            entries = []
+            total = 0
+            for name in names:
+                if not name.endswith(".body"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                for p in (path, path[:-len(".body")] + ".json"):
+                    try:
+                        os.remove(p)
+                    except OSError:
+                        pass
+                total -= size
+
+
+def atomic_write(path, data):
+    """一時ファイルに書き出してから差し替える（読み手が書きかけの内容を見ることはない）"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _get(client, url, headers, timeout):
+    response = client.request("GET", url, headers=headers, timeout=timeout)
+    # 304 は条件付きGETの場合だけ正常な応答
+    if response.status >= 400 or (response.status == 304 and not headers):
+        raise HttpError(url, response.status)
+    return response
+
+
+# プロセス内で共有する既定のキャッシュ
+default_cache = HttpCache()
+
+
+def fetch(url, cache=None, timeout=None, force=False, client=None):
+    """
+    URLの本文を取得する
+    キャッシュがあれば If-None-Match / If-Modified-Since を付けて問い合わせ、
+    304 ならキャッシュの本文を、200 なら新しい本文を返す（キャッシュも差し替える）
+    force=True の場合は検証子を付けずに取り直す（強制再取得）
+    timeout: 秒数 または (接続, 読み込み) の組（None の場合は http_client の既定値）
+    失敗した場合は HttpError（エラー応答）または urllib3 の例外（接続できない・切断が続く）を送出する
+    """
+    cache = cache or default_cache
+    client = client or http_client
+    meta = None if force else cache.lookup(url)
+
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = _get(client, url, headers, timeout)
+    if response.status == 304:
+        body = cache.read_body(url, meta)
+        if body is not None:
+            cache.touch(url)
+            return FetchResult(
+                url, body, 304, True, meta.get("etag"), meta.get("last_modified"), attempts=response.attempts,
+            )
+        # 保存済みの本文が読めない場合は条件なしで取り直す
+        response = _get(client, url, {}, timeout)
+
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    # 検証子が無いレスポンスは次回も再検証できないため保存しない
+    if etag or last_modified:
+        cache.store(url, response.body, etag, last_modified)
+    return FetchResult(url, response.body, response.status, False, etag, last_modified, attempts=response.attempts)
+
+
+# --- 文字コード判定とパース ---
+def detect_encoding(data, limit=ENCODING_SNIFF_BYTES):
+    """
+    本文の先頭 limit バイトから文字コードを判定する
+    'utf-8-sig' / 'utf-8' / 'shift_jis' / 'cp932' のいずれか、判定できない場合は None を返す
+    """
+    if data[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+        return 'utf-8-sig'
+    # memoryview で切り出してコピーを避ける（途中で切れた多バイト文字はインクリメンタルデコーダーが保留する）
+    prefix = memoryview(data)[:limit]
+    is_whole = len(data) <= limit
+    for encoding in CANDIDATE_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(prefix, final=is_whole)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def _parse_csv(body, encoding, header, columns, dtype, chunksize):
+    """本文を1つの文字コードでパースする（columns を指定した場合は、その列だけを読み、列名を位置の番号にする）"""
+    usecols = None
+    if columns is not None:
+        # 列数を超える位置を usecols に指定するとエラーになるため、1行目の列数で絞り込む
+        width = pd.read_csv(BytesIO(body), header=None, nrows=1, encoding=encoding).shape[1]
+        usecols = [position for position in sorted(columns) if position < width]
+    # BytesIO は bytes を初期値にした場合バッファをコピーせず共有する
+    parsed = pd.read_csv(
+        BytesIO(body), header=header, encoding=encoding,
+        usecols=usecols, dtype=dtype, chunksize=chunksize,
+    )
+    if usecols is None:
+        return parsed
+    if chunksize is None:
+        parsed.columns = usecols
+        return parsed
+    return (chunk.set_axis(usecols, axis=1) for chunk in parsed)
+
+
+def read_csv_bytes(fetched, header='infer', columns=None, dtype=None, chunksize=None, reduce=None):
+    """
+    取得済みの本文をメモリ上でパースし、DataFrameを返す（fetched.encoding に使用した文字コードを設定）
+    先頭部分での判定が後半で外れた場合は、残りの候補で同じバイト列を再パースする（再ダウンロードはしない）
+
+    columns: 使用する列の位置（0始まり）。それ以外の列は読まず、列名は位置の番号になる（存在しない位置は無視）
+    dtype: 列の型（str の場合は型推論をせず、ファイル上の文字列のまま読む）
+    chunksize / reduce: 指定した場合は chunksize 行ずつ読み、チャンクの反復を reduce(chunks) で集約した結果を返す
+        （ファイル全体の DataFrame をメモリ上に作らない）
+    """
+    detected = detect_encoding(fetched.body)
+    candidates = [detected] if detected else []
+    if detected != 'utf-8-sig':
+        candidates += [enc for enc in CANDIDATE_ENCODINGS if enc != detected]
+
+    error = None
+    for encoding in candidates:
+        try:
+            parsed = _parse_csv(fetched.body, encoding, header, columns, dtype, chunksize if reduce else None)
+            df = reduce(parsed) if reduce else parsed
+        except UnicodeDecodeError as e:
+            error = e
+            continue
+        fetched.encoding = encoding
+        return df
+    raise error
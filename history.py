@@ -0,0 +1,263 @@
+"""
+ルームごとの月次履歴の索引
+
+処理月ごとの結果リストを、ルームID（と room_list.csv のアカウントID）から引ける1行ずつの小さな記録
+（個別ランク・分配額・支払想定額・配信有無・管理対象。値は CSV と同じ表記）として SQLite に保存する。
+データ処理の完了時に処理月の分だけを差し替えるため、1人のライバーの過去12か月の履歴は、
+各月の処理のやり直しや結果リストの検索をせず、ネットワークにも接続せずに数ミリ秒で返せる。
+索引の作成前に処理した月は、保存済みの結果リスト（スナップショット・差分再計算用の保存結果）から追加する（sync）。
+"""
+import datetime
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+
+from delta import load_month_results
+from result_model import RANK_COLUMN, render_column
+from snapshot import snapshot_store
+
+
+# --- 定数 ---
+HISTORY_DB = os.environ.get(
+    "SR_SUMMARY_HISTORY_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "history.sqlite3"),
+)
+# 保持する処理月の数（超えた場合は処理月が古いものから削除）
+HISTORY_KEEP_MONTHS = int(os.environ.get("SR_SUMMARY_HISTORY_KEEP_MONTHS", 24))
+# 保存形式を変更した場合は番号を上げ、索引を作り直す
+HISTORY_VERSION = 1
+# 検索結果の件数の上限
+SEARCH_LIMIT = 50
+
+ROOM_ID_COLUMN = "ルームID"
+ALIAS_COLUMN = "ライバー愛称"
+# 記録する結果列（CSV と同じ表記の文字列で保存する）と、SQLite の列名
+RECORD_COLUMNS = {
+    RANK_COLUMN: "rank",
+    "R分配額": "r_amount",
+    "R支払想定額": "r_estimate",
+    "PL分配額": "pl_amount",
+    "PL支払想定額": "pl_estimate",
+    "TC支払想定額": "tc_estimate",
+}
+# 有り/外 などのフラグ列（0/1 で保存する）と、1 にする値
+FLAG_COLUMNS = {"配信有無": ("streamed", "有り"), "管理対象": ("unmanaged", "外")}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS months (
+    year_month INTEGER PRIMARY KEY,   -- 処理月（YYYYMM）
+    indexed_at TEXT NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    room_id TEXT NOT NULL,
+    year_month INTEGER NOT NULL,
+    alias TEXT,
+    {", ".join(f"{name} TEXT" for name in RECORD_COLUMNS.values())},
+    {", ".join(f"{name} INTEGER" for name, _ in FLAG_COLUMNS.values())},
+    PRIMARY KEY (year_month, room_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS records_room ON records (room_id, year_month);
+CREATE TABLE IF NOT EXISTS accounts (
+    account_id TEXT NOT NULL,
+    room_id TEXT NOT NULL,
+    year_month INTEGER NOT NULL,
+    PRIMARY KEY (year_month, account_id, room_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS accounts_account ON accounts (account_id);
+-- 愛称の検索用（ルームごとの愛称。月によって愛称が変わった場合はそれぞれ）
+CREATE TABLE IF NOT EXISTS aliases (
+    room_id TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    year_month INTEGER NOT NULL,      -- その愛称が使われた最後の処理月
+    PRIMARY KEY (room_id, alias)
+) WITHOUT ROWID;
+"""
+
+
+def _year_month(year, month):
+    return year * 100 + month
+
+
+def _like_pattern(text):
+    """部分一致の LIKE パターン（% と _ はそのままの文字として扱う）"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class HistoryIndex:
+    """ルームごとの月次履歴の索引（SQLite の1ファイル）"""
+
+    def __init__(self, path=HISTORY_DB, keep_months=HISTORY_KEEP_MONTHS):
+        self.path = path
+        self.keep_months = keep_months
+        # 書き込みはプロセス内で1つずつ行う（読み込みは WAL のため書き込み中でも並行して行える）
+        self._lock = threading.RLock()
+        self._ready = False
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._ready:
+            with self._lock:
+                if connection.execute("PRAGMA user_version").fetchone()[0] != HISTORY_VERSION:
+                    connection.executescript(
+                        "DROP TABLE IF EXISTS months; DROP TABLE IF EXISTS records;"
+                        "DROP TABLE IF EXISTS accounts; DROP TABLE IF EXISTS aliases;"
+                    )
+                    connection.executescript(SCHEMA)
+                    connection.execute(f"PRAGMA user_version = {HISTORY_VERSION}")
+                connection.execute("PRAGMA journal_mode = WAL")
+                self._ready = True
+        # WAL では NORMAL でもコミット済みの内容は壊れない（電源断の直前のコミットだけが失われ得る）
+        connection.execute("PRAGMA synchronous = NORMAL")
+        return connection
+
+    def add_month(self, year, month, results, room_accounts=None):
+        """
+        処理月の結果リストで、その月の記録を差し替える
+        room_accounts: [account_id, room_id] の表（room_list.csv。結果リストにあるルームのアカウントだけを記録する）
+        """
+        year_month = _year_month(year, month)
+        # 索引の並び（ルームID順）に揃えてから書き込む（B木への挿入が順番になり、書き込みが速くなる）
+        results = results[~results[ROOM_ID_COLUMN].duplicated()].sort_values(ROOM_ID_COLUMN, kind="stable")
+        room_ids = results[ROOM_ID_COLUMN].to_numpy(dtype=object)
+        aliases = results[ALIAS_COLUMN].to_numpy(dtype=object)
+        columns = [room_ids, [year_month] * len(results), aliases]
+        columns += [render_column(results, column) for column in RECORD_COLUMNS]
+        columns += [
+            (results[column].to_numpy(dtype=object) == value).astype(int).tolist()
+            for column, (_, value) in FLAG_COLUMNS.items()
+        ]
+        names = ["room_id", "year_month", "alias", *RECORD_COLUMNS.values(), *(name for name, _ in FLAG_COLUMNS.values())]
+
+        accounts = []
+        if room_accounts is not None and len(room_accounts):
+            # 文字列型同士の isin は遅いため、object 配列のハッシュ表で判定する
+            managed = pd.Index(room_ids).get_indexer(room_accounts["room_id"].to_numpy(dtype=object)) >= 0
+            linked = room_accounts[managed].drop_duplicates().sort_values("account_id")
+            accounts = zip(linked["account_id"].tolist(), linked["room_id"].tolist(), [year_month] * len(linked))
+
+        with self._lock, closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM records WHERE year_month = ?", (year_month,))
+            connection.execute("DELETE FROM accounts WHERE year_month = ?", (year_month,))
+            connection.executemany(
+                f"INSERT INTO records ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                zip(*columns),
+            )
+            connection.executemany("INSERT OR IGNORE INTO accounts VALUES (?, ?, ?)", accounts)
+            connection.executemany(
+                "INSERT INTO aliases VALUES (?, ?, ?) ON CONFLICT (room_id, alias) "
+                "DO UPDATE SET year_month = max(year_month, excluded.year_month)",
+                ((room_id, alias, year_month) for room_id, alias in zip(room_ids, aliases) if isinstance(alias, str) and alias),
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO months VALUES (?, ?, ?)",
+                (year_month, datetime.datetime.now().isoformat(timespec="seconds"), len(results)),
+            )
+            self._apply_retention(connection)
+
+    def _apply_retention(self, connection):
+        """処理月の新しい順に keep_months 件を残し、それより古い記録を削除する"""
+        row = connection.execute(
+            "SELECT year_month FROM months ORDER BY year_month DESC LIMIT 1 OFFSET ?", (self.keep_months - 1,)
+        ).fetchone()
+        if row is None:
+            return
+        for table in ("months", "records", "accounts", "aliases"):
+            connection.execute(f"DELETE FROM {table} WHERE year_month < ?", (row[0],))
+
+    def indexed_months(self):
+        """索引にある処理月 [(year, month)]（新しい順）"""
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT year_month FROM months ORDER BY year_month DESC").fetchall()
+        return [divmod(year_month, 100) for year_month, in rows]
+
+    def sync(self, months):
+        """
+        months [(year, month)] のうち索引に無い月を、保存済みの結果リストから追加する（ネットワークには接続しない）
+        追加した処理月のリストを返す
+        """
+        indexed = set(self.indexed_months())
+        added = []
+        for year, month in months:
+            if (year, month) in indexed:
+                continue
+            results = load_month_results(year, month)
+            if results is None:
+                continue
+            self.add_month(year, month, results, snapshot_store.load(year, month, "room_accounts"))
+            added.append((year, month))
+        return added
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """
+        ルームID・アカウントID（完全一致）または愛称（部分一致）でルームを探し、[ルームID, ライバー愛称] の表を返す
+        （月によって愛称が違うルームは、新しい順に " / " でつないで表示する）
+        """
+        text = text.strip()
+        if not text:
+            return pd.DataFrame(columns=[ROOM_ID_COLUMN, ALIAS_COLUMN])
+        # 愛称の無い（空欄の）ルームもルームID・アカウントIDで見つけられるよう、記録とアカウントから探す
+        query = """
+            WITH hits(room_id) AS (
+                SELECT room_id FROM records WHERE room_id = :text
+                UNION SELECT room_id FROM accounts WHERE account_id = :text
+                UNION SELECT room_id FROM aliases WHERE alias LIKE :pattern ESCAPE '\\'
+            ),
+            found(room_id) AS (SELECT room_id FROM hits ORDER BY room_id LIMIT :limit)
+            SELECT found.room_id, aliases.alias FROM found LEFT JOIN aliases USING (room_id)
+            ORDER BY found.room_id, aliases.year_month DESC
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, {"text": text, "pattern": _like_pattern(text), "limit": limit}).fetchall()
+        # group_concat の連結順は保証されない（SQLite 3.44 より前は ORDER BY を指定できない）ため、愛称はここで新しい順に連結する
+        aliases = {}
+        for room_id, alias in rows:
+            aliases.setdefault(room_id, [])
+            if alias is not None:
+                aliases[room_id].append(alias)
+        return pd.DataFrame(
+            [(room_id, " / ".join(names)) for room_id, names in aliases.items()], columns=[ROOM_ID_COLUMN, ALIAS_COLUMN],
+        )
+
+    def history(self, room_id, months=None):
+        """
+        ルームの月次の記録（処理月の新しい順）を表で返す
+        months: 対象の処理月 [(year, month)]（省略時は索引にある全ての月）
+        """
+        names = ["year_month", "alias", *RECORD_COLUMNS.values(), *(name for name, _ in FLAG_COLUMNS.values())]
+        query = f"SELECT {', '.join(names)} FROM records WHERE room_id = ?"
+        params = [room_id]
+        if months:
+            query += " AND year_month BETWEEN ? AND ?"
+            params += [min(_year_month(*m) for m in months), max(_year_month(*m) for m in months)]
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query + " ORDER BY year_month DESC", params).fetchall()
+
+        frame = pd.DataFrame(rows, columns=names)
+        if months:
+            frame = frame[frame["year_month"].isin([_year_month(*m) for m in months])]
+        history = pd.DataFrame({
+            "処理月": [f"{ym // 100}-{ym % 100:02d}" for ym in frame["year_month"]],
+            ALIAS_COLUMN: frame["alias"].to_numpy(),
+        })
+        for column, (name, value) in FLAG_COLUMNS.items():
+            other = "なし" if value == "有り" else ""
+            history[column] = [value if flag else other for flag in frame[name]]
+        for column, name in RECORD_COLUMNS.items():
+            history[column] = frame[name].to_numpy()
+        return history
+
+    def clear(self):
+        """索引の全ての記録を削除する"""
+        with self._lock, closing(self._connect()) as connection, connection:
+            for table in ("months", "records", "accounts", "aliases"):
+                connection.execute(f"DELETE FROM {table}")
+
+
+# プロセス内で共有する既定の索引
+history_index = HistoryIndex()
@@ -0,0 +1,200 @@
+"""
+CSV取得用のHTTPクライアント
+
+プロセス内（全てのセッション・スレッド）で1つの接続プール（urllib3、keep-alive）を共有し、同じホストへの接続を再利用する。
+- gzip / deflate の転送圧縮を要求して受信量を減らす（本文は展開して返す）
+- 接続・読み込みのタイムアウトはリクエストごと（ソースごと）に指定できる
+- 5xx の応答と、接続の失敗・切断・タイムアウトは、上限付きの指数バックオフ（ジッター付き）で再試行する
+- 本文の受信が途中で切れた場合、サーバーが Range に対応していれば受信済みの続きから取得する
+  （If-Range で同じ版であることを確認し、版が変わっていれば最初から取り直す）
+"""
+import os
+import random
+import re
+import time
+import zlib
+from dataclasses import dataclass
+
+import urllib3
+from urllib3.exceptions import HTTPError as TransportError, MaxRetryError
+
+
+# --- 定数 ---
+# 接続・読み込み（受信の間隔）のタイムアウトの既定値（秒）
+HTTP_CONNECT_TIMEOUT_S = float(os.environ.get("SR_SUMMARY_HTTP_CONNECT_TIMEOUT_S", 10))
+HTTP_READ_TIMEOUT_S = float(os.environ.get("SR_SUMMARY_HTTP_READ_TIMEOUT_S", 60))
+# 再試行の回数（最初の1回を除く）と、バックオフの初回・上限の待ち時間（秒）
+HTTP_RETRIES = int(os.environ.get("SR_SUMMARY_HTTP_RETRIES", 4))
+HTTP_BACKOFF_S = float(os.environ.get("SR_SUMMARY_HTTP_BACKOFF_S", 0.5))
+HTTP_BACKOFF_MAX_S = float(os.environ.get("SR_SUMMARY_HTTP_BACKOFF_MAX_S", 8))
+# ホストごとに保持する接続の数（6つのCSVの並列取得が同じホストに接続する）
+HTTP_POOL_SIZE = int(os.environ.get("SR_SUMMARY_HTTP_POOL_SIZE", 10))
+
+# 再試行する応答コード
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+ACCEPT_ENCODING = "gzip, deflate"
+# 本文を受信する単位（途中で切れた場合、ここまで受信した分を続きからの取得に使う）
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class HttpError(Exception):
+    """HTTPのエラー応答（4xx、または再試行しても解消しない 5xx）"""
+
+    def __init__(self, url, status, reason=""):
+        super().__init__(f"HTTP {status}{' ' + reason if reason else ''}: {url}")
+        self.url = url
+        self.status = status
+
+
+@dataclass
+class HttpResponse:
+    """1件のリクエストの結果（本文は展開済み）"""
+    status: int
+    headers: object        # urllib3 の HTTPHeaderDict（大文字・小文字を区別しない）
+    body: bytes
+    attempts: int = 1      # 送ったリクエストの数（再試行・続きからの取得を含む）
+    resumed: int = 0       # Range で続きから取得した回数
+
+
+def _timeout(timeout):
+    """None / 秒数 / (接続, 読み込み) を urllib3 のタイムアウトにする"""
+    if timeout is None:
+        return urllib3.Timeout(connect=HTTP_CONNECT_TIMEOUT_S, read=HTTP_READ_TIMEOUT_S)
+    if isinstance(timeout, tuple):
+        return urllib3.Timeout(connect=timeout[0], read=timeout[1])
+    return urllib3.Timeout(connect=timeout, read=timeout)
+
+
+def _decode(body, encoding):
+    """Content-Encoding に従って本文を展開する"""
+    encoding = (encoding or "identity").strip().lower()
+    if not body or encoding in ("", "identity"):
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        # zlib 形式が正しいが、ヘッダーの無い raw deflate を返すサーバーもある
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    raise ValueError(f"未対応の Content-Encoding です: {encoding}")
+
+
+def _retry_after(headers):
+    """Retry-After（秒数の形式のみ）。無い場合は None"""
+    value = (headers.get("Retry-After") or "").strip()
+    return float(value) if value.isdigit() else None
+
+
+def _range_start(headers):
+    """Content-Range: bytes 100-199/200 の開始位置。読めない場合は None"""
+    match = re.match(r"bytes (\d+)-", headers.get("Content-Range") or "")
+    return int(match.group(1)) if match else None
+
+
+def _validator(headers):
+    """If-Range に使う検証子（強い ETag、無い場合は Last-Modified）"""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def _resumable(response, encoding):
+    """受信が途中で切れた本文を Range で続きから取得できるか（圧縮していない本文で、サーバーが Range に対応している）"""
+    return (
+        response.status in (200, 206)
+        and (encoding or "identity").strip().lower() == "identity"
+        and (response.status == 206 or response.headers.get("Accept-Ranges", "").lower() == "bytes")
+    )
+
+
+class HttpClient:
+    """共有の接続プールと再試行・続きからの取得を行うクライアント"""
+
+    def __init__(self, retries=HTTP_RETRIES, backoff_s=HTTP_BACKOFF_S, backoff_max_s=HTTP_BACKOFF_MAX_S,
+                 pool_size=HTTP_POOL_SIZE, sleep=time.sleep):
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self._sleep = sleep
+        # 再試行はこのクラスで行い、urllib3 にはリダイレクトの追跡だけを任せる
+        self.pool = urllib3.PoolManager(
+            num_pools=8, maxsize=pool_size,
+            retries=urllib3.Retry(total=None, connect=0, read=0, status=0, other=0, redirect=5),
+        )
+
+    def backoff(self, attempt, retry_after=None):
+        """attempt 回目の失敗後の待ち時間（上限付きの指数バックオフの後半をランダムにする。Retry-After があれば優先）"""
+        cap = min(self.backoff_max_s, self.backoff_s * 2 ** attempt)
+        delay = cap / 2 + random.uniform(0, cap / 2)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max_s))
+        return delay
+
+    def request(self, method, url, headers=None, timeout=None, retries=None):
+        """
+        リクエストを送り、HttpResponse を返す（304・4xx も応答として返す）
+        timeout: 秒数 または (接続, 読み込み) の組。None の場合は HTTP_CONNECT_TIMEOUT_S / HTTP_READ_TIMEOUT_S
+        retries: 再試行の回数（None の場合は self.retries）
+        再試行しても 5xx の場合は HttpError、接続できない・切断が続く場合は urllib3 の例外を送出する
+        """
+        headers = {"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+        timeout = _timeout(timeout)
+        # 呼び出し側が範囲を指定したリクエストは、続きからの取得をしない
+        can_resume = method == "GET" and "Range" not in headers
+        # 受信が途中で切れた本文（続きからの取得に使う）と、その版の検証子
+        received, offset, validator = [], 0, None
+        resumed, retry_after = 0, None
+        for attempt in range((self.retries if retries is None else retries) + 1):
+            if attempt:
+                self._sleep(self.backoff(attempt - 1, retry_after))
+            retry_after = None
+            request_headers = dict(headers)
+            if offset:
+                # 続きは圧縮せずに受け取る（圧縮後のバイト位置では続きを指定できない）
+                request_headers.update({"Range": f"bytes={offset}-", "If-Range": validator, "Accept-Encoding": "identity"})
+            try:
+                response = self.pool.request(
+                    method, url, headers=request_headers, timeout=timeout,
+                    preload_content=False, decode_content=False,
+                )
+            except TransportError as e:
+                # urllib3 は接続・読み込みの失敗を MaxRetryError に包むため、元の例外を残す
+                error = e.reason if isinstance(e, MaxRetryError) and e.reason is not None else e
+                continue
+
+            try:
+                if response.status in RETRY_STATUSES:
+                    error = HttpError(url, response.status, response.reason or "")
+                    retry_after = _retry_after(response.headers)
+                    response.drain_conn()
+                    continue
+                if offset and (response.status != 206 or _range_start(response.headers) != offset):
+                    # 続きからの取得に応じなかった（版が変わった・Range 非対応）場合は、この応答の本文を最初から使う
+                    received, offset = [], 0
+                encoding = response.headers.get("Content-Encoding")
+                try:
+                    for chunk in response.stream(READ_CHUNK_BYTES, decode_content=False):
+                        received.append(chunk)
+                        offset += len(chunk)
+                except TransportError as e:
+                    error = e
+                    validator = _validator(response.headers) if can_resume and _resumable(response, encoding) else None
+                    if validator is None:
+                        received, offset = [], 0
+                    elif offset:
+                        resumed += 1
+                    continue
+            finally:
+                response.release_conn()
+
+            body = b"".join(received)
+            status = 200 if response.status == 206 and resumed else response.status
+            return HttpResponse(status, response.headers, _decode(body, encoding), attempt + 1, resumed)
+        raise error
+
+
+# プロセス内（Streamlit の全セッション）で共有する既定のクライアント
+http_client = HttpClient()
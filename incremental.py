@@ -0,0 +1,192 @@
+"""
+差分再計算
+
+処理月ごとに、6つのCSVの指紋（本文の SHA-256）と前回の結果リストを保存しておき、
+再実行時は内容が変わったファイルの影響を受ける列・行だけを再計算する。
+（例: プレミアムライブ分配額データだけが更新された場合は PL 列のみ、
+  管理ライバーリストの更新は追加・削除されたルームの行のみ）
+"""
+import json
+import os
+import pickle
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from fetch import atomic_write
+from result_model import display_columns, internal_columns
+
+
+# --- 定数（保存先） ---
+STATE_DIR = os.environ.get(
+    "SR_SUMMARY_STATE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "incremental"),
+)
+# 計算方法を変更した場合は番号を上げ、保存済みの結果を使わないようにする
+STATE_VERSION = 2
+
+# 各ソースが変更された場合に再計算が必要な結果列（表示列。状態コード・元の文字列の列も合わせて再計算する）
+AFFECTED_COLUMNS = {
+    "liver": ["ライバー愛称"],
+    "kpi": ["配信有無"],
+    "room_list": ["管理対象", "R分配額", "個別ランク", "R支払想定額", "PL分配額", "PL支払想定額", "TC支払想定額"],
+    "sales": ["R分配額", "個別ランク", "R支払想定額"],
+    "paid_live": ["PL分配額", "PL支払想定額"],
+    "time_charge": ["TC支払想定額"],
+}
+# 各ソースが変更された場合に突き合わせが必要な分配額データ
+AFFECTED_REVENUES = {
+    "liver": (),
+    "kpi": (),
+    "room_list": ("sales", "paid_live", "time_charge"),
+    "sales": ("sales",),
+    "paid_live": ("paid_live",),
+    "time_charge": ("time_charge",),
+}
+ALL_REVENUES = ("sales", "paid_live", "time_charge")
+ROOM_ID_COLUMN = "ルームID"
+
+
+def source_fingerprints(loaded):
+    """並列読み込みの結果から {ソースのキー: 本文の SHA-256} を作る（取得できなかったソースは含めない）"""
+    return {key: fetched.sha256 for key, (_, _, fetched) in loaded.items() if fetched is not None}
+
+
+class ResultStore:
+    """処理月ごとの指紋と結果リストの保存先"""
+
+    def __init__(self, directory=STATE_DIR):
+        self.directory = directory
+
+    def _paths(self, year, month):
+        base = os.path.join(self.directory, f"{year}{month:02d}")
+        return base + ".json", base + ".pkl"
+
+    def load(self, year, month):
+        """(指紋, 結果リスト) を返す。無い・読めない・計算方法が古い場合は None"""
+        meta_path, results_path = self._paths(year, month)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != STATE_VERSION:
+                return None
+            with open(results_path, "rb") as f:
+                results = pickle.load(f)
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            return None
+        if len(results) != meta.get("rows"):
+            return None
+        return meta["fingerprints"], results
+
+    def save(self, year, month, fingerprints, results):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path, results_path = self._paths(year, month)
+        meta = {"version": STATE_VERSION, "fingerprints": fingerprints, "rows": len(results)}
+        atomic_write(results_path, pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL))
+        atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+
+
+# プロセス内で共有する既定の保存先
+result_store = ResultStore()
+
+
+@dataclass
+class RecomputePlan:
+    """差分再計算で何を再利用し、何を再計算したか"""
+    full: bool
+    changed_sources: list = field(default_factory=list)
+    recomputed_columns: list = field(default_factory=list)
+    reused_columns: list = field(default_factory=list)
+    added_rows: int = 0
+    removed_rows: int = 0
+    reused_rows: int = 0
+
+    def describe(self):
+        if self.full:
+            return "前回の結果が無い（または比較できない）ため、全件を計算しました。"
+        if not self.changed_sources:
+            return f"全てのファイルが前回から変わっていないため、前回の結果（{self.reused_rows}件）をそのまま使用しました。"
+        lines = [
+            f"変更されたファイル: **{', '.join(self.changed_sources)}**",
+            f"再計算した列: {', '.join(self.recomputed_columns) or 'なし'}",
+            f"再利用した列: {', '.join(self.reused_columns) or 'なし'}",
+            f"行: 再利用 {self.reused_rows}件 / 追加 {self.added_rows}件 / 削除 {self.removed_rows}件",
+        ]
+        return "差分再計算を行いました。  \n" + "  \n".join(lines)
+
+
+def update_results(previous, fingerprints, liver, build):
+    """
+    前回の結果を基に、今回の結果リストを作る。戻り値: (結果リスト, RecomputePlan)
+
+    previous: ResultStore.load の戻り値（(指紋, 結果リスト) または None）
+    fingerprints: 今回の {ソースのキー: 指紋}
+    liver: 今回の管理ライバーリスト [ルームID, 愛称]
+    build(liver_rows, revenue_keys): liver_rows の各ルームについて結果リストを計算する関数
+        （revenue_keys に含まれない分配額データは突き合わせない）
+    """
+    if previous is None:
+        return build(liver, ALL_REVENUES), RecomputePlan(full=True)
+
+    previous_fingerprints, previous_results = previous
+    room_ids = liver.iloc[:, 0]
+    # ルームIDが重複している場合は行の対応が一意に決まらないため、全件を再計算する
+    if room_ids.duplicated().any() or previous_results[ROOM_ID_COLUMN].duplicated().any() \
+            or set(fingerprints) != set(AFFECTED_COLUMNS):
+        return build(liver, ALL_REVENUES), RecomputePlan(full=True)
+
+    changed = [key for key in AFFECTED_COLUMNS if fingerprints[key] != previous_fingerprints.get(key)]
+    columns = list(previous_results.columns)
+    displayed = display_columns(previous_results)
+    recomputed = sorted(
+        {column for key in changed for column in AFFECTED_COLUMNS[key]},
+        key=displayed.index,
+    )
+    plan = RecomputePlan(
+        full=False,
+        changed_sources=changed,
+        recomputed_columns=recomputed,
+        reused_columns=[column for column in displayed if column not in recomputed and column != ROOM_ID_COLUMN],
+    )
+
+    # 1. 行の対応: 管理ライバーリストが変わった場合は、前回にあったルームの行だけを再利用する
+    if "liver" in changed:
+        reused = room_ids.isin(previous_results[ROOM_ID_COLUMN]).to_numpy()
+        base = (
+            previous_results.set_index(ROOM_ID_COLUMN)
+            .reindex(room_ids[reused].to_numpy())
+            .reset_index()
+        )
+        plan.removed_rows = int((~previous_results[ROOM_ID_COLUMN].isin(room_ids)).sum())
+    else:
+        reused = np.ones(len(liver), dtype=bool)
+        base = previous_results.copy()
+    plan.reused_rows = int(reused.sum())
+    plan.added_rows = int((~reused).sum())
+
+    # 2. 再利用する行: 変更の影響を受ける列だけを再計算して差し替える
+    if recomputed and plan.reused_rows:
+        revenue_keys = sorted({key for source in changed for key in AFFECTED_REVENUES[source]}, key=ALL_REVENUES.index)
+        partial = build(liver[reused], revenue_keys)
+        # 列ごとに差し替える（数値・カテゴリ型・状態コードの型を保つ）
+        for column in (internal for display in recomputed for internal in internal_columns(display)):
+            base[column] = partial[column].array
+
+    if not plan.added_rows:
+        return base[columns], plan
+
+    # 3. 追加された行: 全ての列を計算し、管理ライバーリストの並び順に戻す
+    added = build(liver[~reused], ALL_REVENUES)
+    order = np.concatenate([np.flatnonzero(reused), np.flatnonzero(~reused)])
+    results = pd.concat([base[columns], added[columns]], ignore_index=True)
+    # 値の種類が異なるカテゴリ型の列は object 型で連結されるため、値の種類を合わせて作り直す
+    # （union_categoricals は値の型を推論し直すため、全件計算と同じ値の型に戻す）
+    for column in columns:
+        if isinstance(base[column].dtype, pd.CategoricalDtype) and results[column].dtype != base[column].dtype:
+            merged = union_categoricals([base[column], added[column]])
+            categories = merged.categories.astype(base[column].cat.categories.dtype)
+            results[column] = pd.Categorical.from_codes(merged.codes, categories=categories)
+    results = results.iloc[np.argsort(order, kind="stable")].reset_index(drop=True)
+    return results, plan
@@ -0,0 +1,219 @@
+"""
+月次サマリー作成のバックグラウンド実行
+
+データ処理を画面の再実行（ダウンロードボタンのクリック、チェックボックスの操作など）と切り離すため、
+処理月ごとのジョブとしてワーカースレッドで実行し、完了した結果リストとCSVのバイト列をプロセス内に保持する。
+画面は再実行のたびにジョブの状態を参照するだけで、取得・計算はやり直さない。
+実行中も進捗（report の通知と計測済みのステージ）を参照でき、中止（cancel）は次のステージの開始時に反映される。
+ジョブは種類（月次サマリー / 複数の管理ライバーリストの一括作成）と処理月をキーとしてプロセス内（Streamlit の全セッション）で共有する。
+一括作成のジョブは管理ライバーリストの指定もキーに含め、他のセッションが指定した（アップロードした）リストの結果は返さない。
+"""
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from agencies import liver_lists_digest, summarize_agencies
+from export import to_csv_bytes
+from metrics import RunCancelled, RunRecorder
+from pipeline import summarize
+
+
+# --- 定数 ---
+# 保持する終了済みジョブの数（超えた場合は開始が古いものから削除）
+JOB_KEEP = int(os.environ.get("SR_SUMMARY_JOB_KEEP", 12))
+
+# ジョブの状態
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+STATUS_LABELS = {RUNNING: "実行中", DONE: "完了", FAILED: "失敗", CANCELLED: "中止"}
+
+# 進捗の目安に使うステージ（pipeline.summarize の主なステージと CSV 出力）
+PROGRESS_STAGES = (
+    "load", "map.liver", "map.kpi", "map.room_accounts", "map.room_list_ids",
+    "map.sales", "map.paid_live", "map.time_charge",
+    "reconcile", "results", "store.incremental", "store.snapshot", "store.history", "export", "index",
+)
+# 一括作成の進捗の目安に使うステージ（agencies.summarize_agencies の主なステージと ZIP 出力）
+AGENCY_PROGRESS_STAGES = (
+    "load", "map.kpi", "map.room_accounts", "map.room_list_ids",
+    "map.sales", "map.paid_live", "map.time_charge",
+    "join.revenues", "agencies", "export",
+)
+
+
+class Job:
+    """1か月分のデータ処理（summarize と CSV 出力）のジョブ"""
+    kind = "summary"
+    progress_stages = PROGRESS_STAGES
+
+    def __init__(self, year, month, force=False):
+        self.year = year
+        self.month = month
+        self.force = force
+        self.status = RUNNING
+        self.messages = []     # report の通知 [(level, message)]（完了後に処理ログとして再表示する）
+        self.summary = None    # 完了時の MonthlySummary
+        self.csv_bytes = None  # 完了時の結果CSV
+        self.error = None
+        self.recorder = RunRecorder(year, month)
+        self.started_at = datetime.datetime.now()
+        self.finished_at = None
+        self._started = time.perf_counter()
+        self._duration_s = None
+        self._thread = threading.Thread(target=self._run, name=f"{self.kind}-{year}{month:02d}", daemon=True)
+
+    @classmethod
+    def registry_key(cls, year, month):
+        """JobRegistry でジョブを見分けるキー（サブクラスは start に渡す追加の引数もキーに含められる）"""
+        return (cls.kind, year, month)
+
+    @property
+    def running(self):
+        return self.status == RUNNING
+
+    @property
+    def elapsed_s(self):
+        return self._duration_s if self._duration_s is not None else time.perf_counter() - self._started
+
+    @property
+    def progress(self):
+        """進捗の目安（0.0〜1.0。終了したステージの数から求める）"""
+        if not self.running:
+            return 1.0
+        finished = {stage.name for stage in list(self.recorder.stages)}
+        return sum(name in finished for name in self.progress_stages) / len(self.progress_stages)
+
+    def latest_messages(self, limit=3):
+        """表以外の直近の通知"""
+        return [message for level, message in list(self.messages) if level != "table"][-limit:]
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        """中止を指示する（実行中のステージが終わり次第中止する）"""
+        self.recorder.cancel()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _report(self, level, message):
+        self.messages.append((level, message))
+
+    def _execute(self):
+        """処理の本体（結果を self に設定する。必須データが読めなかった場合は False を返す）"""
+        summary = summarize(self.year, self.month, report=self._report, recorder=self.recorder, force=self.force)
+        if summary is None:
+            return False
+        # CSV は完了時に1回だけ作成し、画面の再実行のたびに作り直さない
+        with self.recorder.stage("export", rows=len(summary.results)) as stage:
+            self.csv_bytes = to_csv_bytes(summary.results)
+            stage.bytes = len(self.csv_bytes)
+        # 画面表示用の索引とシミュレーションも完了時に1回だけ作成する
+        with self.recorder.stage("index", rows=len(summary.results)):
+            summary.result_view()
+            summary.simulator()
+        self.summary = summary
+        return True
+
+    def _run(self):
+        try:
+            if not self._execute():
+                self.status = FAILED
+                return
+            self.recorder.finish()
+            try:
+                self.recorder.save()
+            except OSError as e:
+                self._report("warning", f"計測結果を保存できませんでした: {e}")
+            self.status = DONE
+        except RunCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.status = FAILED
+        finally:
+            self._duration_s = time.perf_counter() - self._started
+            self.finished_at = datetime.datetime.now()
+
+
+class AgencyJob(Job):
+    """複数の管理ライバーリストの一括作成（summarize_agencies と ZIP 出力）のジョブ"""
+    kind = "agencies"
+    progress_stages = AGENCY_PROGRESS_STAGES
+
+    def __init__(self, year, month, force=False, liver_lists=None):
+        super().__init__(year, month, force)
+        self.liver_lists = liver_lists or {}
+        self.zip_bytes = None   # 完了時の全リストの結果CSVの ZIP
+
+    @classmethod
+    def registry_key(cls, year, month, liver_lists=None):
+        # 管理ライバーリストの指定が同じ一括作成だけを同じジョブとする
+        return (cls.kind, year, month, liver_lists_digest(liver_lists or {}))
+
+    def _execute(self):
+        summary = summarize_agencies(
+            self.year, self.month, self.liver_lists,
+            report=self._report, recorder=self.recorder, force=self.force,
+        )
+        # 読み込めなかったリストの理由を表示できるよう、結果が無い場合も保持する
+        self.summary = summary
+        if summary is None or not summary.results:
+            return False
+        with self.recorder.stage("export", rows=len(summary.csv_files)) as stage:
+            self.zip_bytes = summary.zip_bytes()
+            stage.bytes = len(self.zip_bytes)
+        return True
+
+
+class JobRegistry:
+    """種類・処理月（一括作成は管理ライバーリストの指定も）ごとのジョブの一覧（キーごとに最新の1件を保持する）"""
+
+    def __init__(self, keep=JOB_KEEP):
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, year, month, job_class=Job, **options):
+        """job_class・処理月（と options）のジョブ。無い場合は None"""
+        key = job_class.registry_key(year, month, **options)
+        with self._lock:
+            return self._jobs.get(key)
+
+    def start(self, year, month, force=False, job_class=Job, **options):
+        """
+        job_class のジョブを開始し、(ジョブ, 新たに開始したか) を返す
+        同じキー（種類・処理月など）のジョブが実行中の場合は、新たに開始せず (そのジョブ, False) を返す
+        （force=True でも実行中のジョブはそのまま。他のセッションが開始したジョブのこともあるため中止しない）
+        options: job_class に渡す追加の引数（AgencyJob の liver_lists など）
+        """
+        key = job_class.registry_key(year, month, **options)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.running:
+                return job, False
+            job = job_class(year, month, force, **options)
+            self._jobs.pop(key, None)
+            self._jobs[key] = job
+            self._evict()
+        job.start()
+        return job, True
+
+    def _evict(self):
+        """終了済みのジョブが keep 件を超えている間、開始が古いものから削除する"""
+        finished = [key for key, job in self._jobs.items() if not job.running]
+        for key in finished[:max(0, len(finished) - self.keep)]:
+            del self._jobs[key]
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+
+# プロセス内（Streamlit の全セッション）で共有する既定のジョブ一覧
+job_registry = JobRegistry()
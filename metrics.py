@@ -0,0 +1,239 @@
+"""
+処理のステージ別計測
+
+月次サマリー作成の各ステージ（CSVの取得・パース、各マッピングの作成、結果生成、CSV出力など）の
+所要時間・バイト数・行数・ピークメモリ（RSS）を記録する。
+ピークRSS はプロセス全体の値のため、他の実行（別のセッションのジョブなど）と同時に計測したステージでは
+他の実行のメモリも含む概算となる（peak_rss_shared に記録し、Prometheus には書き出さない）。
+記録した内容は画面の「パフォーマンス」欄に表示するほか、月をまたいでグラフ化できるよう
+JSON Lines（1回の実行につき1行）と Prometheus のテキストファイル（node_exporter の textfile collector 用）に書き出す。
+"""
+import datetime
+import json
+import numbers
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+import pandas as pd
+
+from fetch import atomic_write
+
+
+# --- 定数（出力先） ---
+METRICS_DIR = os.environ.get(
+    "SR_SUMMARY_METRICS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "metrics"),
+)
+JSONL_FILE = "runs.jsonl"
+PROMETHEUS_PREFIX = "sr_summary"
+
+
+# --- ピークRSS ---
+def reset_peak_rss():
+    """
+    ピークRSS（VmHWM）を現在値に戻す（Linux のみ。戻せない場合は False）
+    プロセス全体の値を戻すため、計測中の他のステージのピークも失われる（RunRecorder は計測中のステージが無い時だけ戻す）
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """プロセスのピークRSS（MB）"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # /proc が無い環境ではプロセス開始からのピークになる（macOS はバイト単位）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _prometheus_value(value):
+    """Prometheus の値の表記（整数はそのまま、小数は丸めずに repr。"{:g}" は有効数字6桁に丸めるため使わない）"""
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    return repr(float(value))
+
+
+class RunCancelled(Exception):
+    """実行の中止が指示された（RunRecorder.cancel の後、次のステージの開始時に送出する）"""
+
+
+@dataclass
+class StageMetrics:
+    """1ステージの計測結果（rows / bytes / note は計測中に呼び出し側が設定する）"""
+    name: str
+    duration_s: float = None
+    rows: int = None
+    bytes: int = None
+    peak_rss_mb: float = None
+    note: str = None
+    peak_rss_shared: bool = False   # 他の実行のステージと同時に計測した（ピークRSS は概算）
+
+
+# プロセス内で計測中の全ての実行のステージ {id(StageMetrics): (run_id, StageMetrics)}
+_active_stages = {}
+_active_lock = threading.Lock()
+
+
+def _begin_stage(run_id, stage):
+    """
+    計測中のステージに加える。プロセス内で計測中のステージが無い場合だけピークRSS を戻し、
+    他の実行のステージと重なる場合は、重なった全てのステージのピークRSS を概算として記録する
+    """
+    with _active_lock:
+        if not _active_stages:
+            reset_peak_rss()
+        others = [other for other_run_id, other in _active_stages.values() if other_run_id != run_id]
+        if others:
+            stage.peak_rss_shared = True
+            for other in others:
+                other.peak_rss_shared = True
+        _active_stages[id(stage)] = (run_id, stage)
+
+
+def _end_stage(stage):
+    with _active_lock:
+        _active_stages.pop(id(stage), None)
+
+
+class RunRecorder:
+    """
+    1回の実行（1か月分）のステージ別計測
+    ワーカースレッドから同時に使用できる。プロセス内で他のステージが計測中でない場合のみピークRSSを戻すため、
+    並列に実行されたステージのピークRSSは、それらのうち最初に始まったステージからのピークになる
+    （他の実行のステージと重なった場合は peak_rss_shared を設定する）
+    cancel() の後は、他のステージが計測中でない時点で始まるステージで RunCancelled を送出する
+    （並列に取得中のCSVなど、実行中のステージは最後まで実行される）
+    """
+
+    def __init__(self, year=None, month=None):
+        self.year = year
+        self.month = month
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = datetime.datetime.now()
+        self.stages = []
+        self._started = time.perf_counter()
+        self._total_s = None
+        self._active = 0
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """実行の中止を指示する"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @contextmanager
+    def stage(self, name, rows=None, nbytes=None):
+        """with 内の処理を1ステージとして計測する（例外で抜けた場合も記録する）"""
+        stage = StageMetrics(name, rows=rows, bytes=nbytes)
+        with self._lock:
+            if self._active == 0:
+                if self._cancel.is_set():
+                    raise RunCancelled(f"{name} の開始前に中止しました")
+            self._active += 1
+        _begin_stage(self.run_id, stage)
+        start = time.perf_counter()
+        try:
+            yield stage
+        except BaseException:
+            stage.note = stage.note or "失敗"
+            raise
+        finally:
+            stage.duration_s = time.perf_counter() - start
+            stage.peak_rss_mb = peak_rss_mb()
+            _end_stage(stage)
+            with self._lock:
+                self._active -= 1
+                self.stages.append(stage)
+
+    @property
+    def total_s(self):
+        return self._total_s if self._total_s is not None else time.perf_counter() - self._started
+
+    def finish(self):
+        """実行全体の所要時間を確定する（後から表示しても所要時間が伸びないように）"""
+        self._total_s = self.total_s
+
+    def table(self):
+        """画面表示用の一覧表（記録した順）"""
+        rows = [{
+            "ステージ": stage.name,
+            "所要時間(秒)": round(stage.duration_s, 3),
+            "行数": stage.rows,
+            "バイト数": stage.bytes,
+            "ピークRSS(MB)": round(stage.peak_rss_mb, 1),
+            "備考": "、".join(filter(None, [stage.note, "ピークRSSは他の実行と同時のため概算" if stage.peak_rss_shared else None])) or None,
+        } for stage in self.stages]
+        return pd.DataFrame(rows, columns=["ステージ", "所要時間(秒)", "行数", "バイト数", "ピークRSS(MB)", "備考"])
+
+    def to_record(self):
+        """JSON Lines の1行分"""
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "month": f"{self.year}-{self.month:02d}" if self.year else None,
+            "total_s": round(self.total_s, 4),
+            "stages": [asdict(stage) for stage in self.stages],
+        }
+
+    def to_prometheus(self):
+        """Prometheus のテキスト形式（処理月とステージをラベルにしたゲージ）"""
+        month = f"{self.year}-{self.month:02d}" if self.year else ""
+        gauges = {
+            "stage_duration_seconds": ("ステージの所要時間", lambda s: s.duration_s),
+            "stage_rows": ("ステージで処理した行数", lambda s: s.rows),
+            "stage_bytes": ("ステージで扱ったバイト数", lambda s: s.bytes),
+            # 他の実行と同時に計測したステージのピークRSS は概算のため書き出さない
+            "stage_peak_rss_bytes": (
+                "ステージ終了時点のピークRSS",
+                lambda s: None if s.peak_rss_shared else s.peak_rss_mb * 1024 * 1024,
+            ),
+        }
+        lines = []
+        for metric, (help_text, value_of) in gauges.items():
+            lines += [f"# HELP {PROMETHEUS_PREFIX}_{metric} {help_text}", f"# TYPE {PROMETHEUS_PREFIX}_{metric} gauge"]
+            for stage in self.stages:
+                value = value_of(stage)
+                if value is not None:
+                    lines.append(f'{PROMETHEUS_PREFIX}_{metric}{{month="{month}",stage="{stage.name}"}} {_prometheus_value(value)}')
+        lines += [
+            f"# HELP {PROMETHEUS_PREFIX}_run_duration_seconds 実行全体の所要時間",
+            f"# TYPE {PROMETHEUS_PREFIX}_run_duration_seconds gauge",
+            f'{PROMETHEUS_PREFIX}_run_duration_seconds{{month="{month}"}} {_prometheus_value(self.total_s)}',
+            f"# HELP {PROMETHEUS_PREFIX}_run_timestamp_seconds 実行を開始した時刻",
+            f"# TYPE {PROMETHEUS_PREFIX}_run_timestamp_seconds gauge",
+            f'{PROMETHEUS_PREFIX}_run_timestamp_seconds{{month="{month}"}} {_prometheus_value(self.started_at.timestamp())}',
+        ]
+        return "\n".join(lines) + "\n"
+
+    def save(self, directory=METRICS_DIR):
+        """
+        runs.jsonl に1行追記し、処理月ごとの Prometheus テキストファイル（sr_summary_YYYYMM.prom）を差し替える
+        """
+        os.makedirs(directory, exist_ok=True)
+        line = json.dumps(self.to_record(), ensure_ascii=False) + "\n"
+        # 1回の write で追記する（バッチの複数プロセスから同時に追記しても行が混ざらない）
+        with open(os.path.join(directory, JSONL_FILE), "a", encoding="utf-8") as f:
+            f.write(line)
+        suffix = f"{self.year}{self.month:02d}" if self.year else "adhoc"
+        prom_path = os.path.join(directory, f"{PROMETHEUS_PREFIX}_{suffix}.prom")
+        atomic_write(prom_path, self.to_prometheus().encode("utf-8"))
@@ -0,0 +1,739 @@
+"""
+月次サマリーの作成処理（画面に依存しない部分）
+
+6つのCSVの取得・パース、管理ライバーリスト・ルームリスト・KPIデータ・3種類の分配額データの
+突き合わせ（正規化したID列でまとめて結合し、ルーム単位の1枚の表にする）と
+支払想定額の計算を行う（CSV等への書き出しは export.py）。st.* は呼ばず、進捗メッセージは report コールバックで通知する。
+（画面: app.py / バッチ実行: batch.py から使用）
+"""
+import datetime
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from fetch import fetch, read_csv_bytes
+from history import history_index
+from http_client import HTTP_CONNECT_TIMEOUT_S, HTTP_READ_TIMEOUT_S
+from incremental import result_store, source_fingerprints, update_results
+from snapshot import snapshot_store
+from source_cache import source_cache
+from metrics import RunCancelled, RunRecorder
+from reconcile import Reconciliation, reconcile
+from simulate import Simulator
+from viewer import ResultView
+from engine import (
+    get_mk_rank,
+    payment_estimate_values,
+    fixed_rate_estimate_values,
+    PAID_LIVE_RATE,
+    TIME_CHARGE_RATE,
+)
+from result_model import (
+    amount_columns,
+    constant_categorical,
+    flag_categorical,
+    estimate_columns,
+    internal_columns,
+    rank_columns,
+)
+
+
+# --- 定数（URL） ---
+KPI_DATA_BASE_URL = "https://mksoul-pro.com/showroom/csv/{year}-{month:02d}_all_all.csv"
+LIVER_LIST_URL = "https://mksoul-pro.com/showroom/file/m-liver-list.csv"
+ROOM_LIST_URL = "https://mksoul-pro.com/showroom/file/room_list.csv"
+
+# 【修正箇所】 固定ファイルURLから、処理月（{year}{month:02d}）を挿入する動的ベースURLへ変更
+
+# ルーム売上分配額データURL
+SALES_DATA_BASE_URL = "https://mksoul-pro.com/showroom/sales-app_v2/db/point_hist_with_mixed_rate_csv_donwload_for_room_{year}{month:02d}.csv"
+# プレミアムライブ分配額データURL
+PAID_LIVE_BASE_URL = "https://mksoul-pro.com/showroom/sales-app_v2/db/paid_live_hist_invoice_format_{year}{month:02d}.csv"
+# タイムチャージ分配額データURL
+TIME_CHARGE_BASE_URL = "https://mksoul-pro.com/showroom/sales-app_v2/db/show_rank_time_charge_hist_invoice_format_{year}{month:02d}.csv"
+
+
+# --- 定数（内部で使用する列名） ---
+ROOM_ID = "room_id"
+ACCOUNT_ID = "account_id"
+ALIAS = "alias"
+AMOUNT = "amount"
+IN_ROOM_LIST = "in_room_list"
+STREAMED = "streamed"
+PRESENT_SUFFIX = "_present"
+
+# 結果の列順序（CSV・画面表示共通）
+RESULT_COLUMNS = [
+    "ルームID",
+    "ライバー愛称", # 修正: ルーム名 -> ライバー愛称
+    "管理対象",
+    "配信有無",
+    "配信月",
+    "支払月",
+    "R分配額", 
+    "個別ランク",
+    "R支払想定額", 
+    "PL分配額", 
+    "PL支払想定額", 
+    "TC支払想定額", 
+]
+
+# 分配額データの種類と、該当データが無いルームに入れる値
+REVENUE_DEFAULTS = {
+    "sales": "#N/A",
+    "paid_live": "",
+    "time_charge": "",
+}
+
+
+# --- 読み込み設定（CSVごとのスキーマ） ---
+@dataclass(frozen=True)
+class SourceSchema:
+    """CSVの読み込み方（使用する列・型・ヘッダー行の扱い）"""
+    columns: tuple          # 使用する列の位置（0始まり）。それ以外の列は読み込まない
+    header: object = 'infer'  # pandas の header 指定（分配額データは None: 1行目からデータ）
+    dtype: object = str     # 型推論をせず文字列として読む（欠損のある数値列で ID が "123.0" に変わらないように）
+    chunked: bool = False   # True の場合、分割して読み込み、使用する列の値の組（重複なし）だけを保持する
+
+
+# 分割読み込みの1チャンクの行数
+CHUNK_ROWS = 100_000
+
+SOURCE_SCHEMAS = {
+    "liver": SourceSchema(columns=(0, 1)),                     # ルームID, 愛称
+    "kpi": SourceSchema(columns=(1,), chunked=True),           # 配信ルームID（全プラットフォーム分で最も大きいファイル）
+    "room_list": SourceSchema(columns=(0, 3)),                 # ルームID, アカウントID
+    "sales": SourceSchema(columns=(0, 1), header=None),        # 分配額, アカウントID（1行目は全体合計）
+    "paid_live": SourceSchema(columns=(0, 1), header=None),    # 分配額, アカウントID
+    "time_charge": SourceSchema(columns=(0, 1), header=None),  # 分配額, アカウントID
+}
+
+
+# ソースごとの (接続, 読み込み) のタイムアウト（秒）。指定の無いソースは http_client の既定値
+# 読み込みのタイムアウトは受信の間隔に対するもので、大きいファイルほどサーバー側で応答を作り始めるまでが長い
+SOURCE_TIMEOUTS = {
+    "kpi": (HTTP_CONNECT_TIMEOUT_S, HTTP_READ_TIMEOUT_S * 3),
+    "sales": (HTTP_CONNECT_TIMEOUT_S, HTTP_READ_TIMEOUT_S * 2),
+}
+
+
+def normalize_ids(series):
+    """ID・分配額の列を文字列にして前後の空白を除く（各CSV共通の正規化）"""
+    return series.astype(str).str.strip()
+
+
+def has_columns(df, *positions):
+    """SourceSchema で読み込んだ DataFrame に、指定した位置の列が全てあるか"""
+    return all(position in df.columns for position in positions)
+
+
+def unique_rows(chunks):
+    """分割読み込みした各チャンクを正規化し、重複を除いた行だけを残して1つの DataFrame にする"""
+    frames = [chunk.apply(normalize_ids).drop_duplicates() for chunk in chunks]
+    return pd.concat(frames, ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def revenue_frame(df, skip_first_row=False):
+    """
+    分配額CSV（1列目: 分配額, 2列目: アカウントID）から [アカウントID, 分配額] の表を作る
+    skip_first_row: ルーム売上分配額データのように1行目が全体合計の場合に True
+    """
+    start = 1 if skip_first_row else 0
+    return pd.DataFrame({
+        ACCOUNT_ID: normalize_ids(df[1].iloc[start:]).to_numpy(),
+        AMOUNT: normalize_ids(df[0].iloc[start:]).to_numpy(),
+    })
+
+
+def _is_in(keys, values):
+    """keys の各値が values に含まれるか（文字列型同士の isin は遅いため、object 配列のハッシュ表で判定）"""
+    return keys.astype(object).isin(pd.Series(values).to_numpy(dtype=object))
+
+
+def _unique_accounts(room_accounts):
+    """
+    アカウントID→ルームIDの対応を、辞書化した場合と同じ結果にする
+    （同じアカウントIDが複数ある場合は最後のルームIDを採用し、並びは最初に現れた位置）
+    """
+    first_seen = room_accounts.loc[~room_accounts[ACCOUNT_ID].duplicated(keep="first"), ACCOUNT_ID]
+    last_room = room_accounts.drop_duplicates(ACCOUNT_ID, keep="last").set_index(ACCOUNT_ID)[ROOM_ID]
+    return pd.DataFrame({
+        ACCOUNT_ID: first_seen.to_numpy(),
+        ROOM_ID: last_room.reindex(first_seen).to_numpy(),
+    })
+
+
+def revenue_by_room(room_accounts, revenues):
+    """
+    3種類の分配額をルームIDに紐づけ、ルーム単位で1行の表（列: 各分配額と、その有無（{種類}_present））にする
+    管理ライバーリストによらないため、複数の管理ライバーリストで共有できる（join_sources の by_room）
+    """
+    # 1. 3種類の分配額を縦に積み、アカウントIDでルームIDに紐づける（1回の結合）
+    frames = [
+        frame.assign(source=source)
+        for source, frame in revenues.items()
+        if frame is not None
+    ]
+    if frames:
+        accounts = _unique_accounts(room_accounts)
+        accounts["order"] = range(len(accounts))
+        stacked = (
+            pd.concat(frames, ignore_index=True)
+            .drop_duplicates([ACCOUNT_ID, "source"], keep="last")
+            .merge(accounts, on=ACCOUNT_ID, how="inner")
+            # 同じルームに複数アカウントがある場合は、room_list.csv で後に現れたアカウントを採用
+            .sort_values("order", kind="stable")
+            .drop_duplicates([ROOM_ID, "source"], keep="last")
+            .set_index([ROOM_ID, "source"])[AMOUNT]
+        )
+        # 2. ルームID × 種類の横持ちに変換（ルーム単位で1行）
+        # 分配額そのものが欠損値の場合と、データが無い場合を区別するため、有無の列を別に持つ
+        present = pd.Series(True, index=stacked.index).unstack("source", fill_value=False)
+        by_room = stacked.unstack("source").join(present.add_suffix(PRESENT_SUFFIX))
+    else:
+        by_room = pd.DataFrame(index=pd.Index([], name=ROOM_ID))
+    return by_room
+
+
+def join_sources(liver, room_list_ids, room_accounts, kpi_room_ids, revenues, by_room=None):
+    """
+    全ソースを突き合わせ、管理ライバーリストの1行につき1行の表を返す
+
+    liver: [ルームID, 愛称] の表（管理ライバーリストの並び順）
+    room_list_ids: room_list.csv のルームID（管理対象判定用）
+    room_accounts: [アカウントID, ルームID] の表（room_list.csv の並び順）
+    kpi_room_ids: 処理月に配信があったルームID
+    revenues: {分配額の種類: [アカウントID, 分配額] の表 または None}
+    by_room: revenue_by_room(room_accounts, revenues) の結果（作成済みの場合。省略時はここで作成する）
+
+    戻り値の列: ルームID, 愛称, ルームリスト掲載有無, 配信有無, 各分配額（REVENUE_DEFAULTS のキー）
+    同じアカウントID・ルームIDが重複する場合は、従来の辞書による紐づけと同じく後の行を採用する
+    """
+    if by_room is None:
+        by_room = revenue_by_room(room_accounts, revenues)
+
+    # 3. 管理ライバーリストを基準に結合（同じルームIDが複数行ある場合、愛称は後の行を採用）
+    alias_by_room = liver.drop_duplicates(ROOM_ID, keep="last").set_index(ROOM_ID)[ALIAS]
+    joined = pd.DataFrame({ROOM_ID: liver[ROOM_ID].to_numpy()})
+    joined[ALIAS] = joined[ROOM_ID].map(alias_by_room)
+    joined = joined.merge(by_room, left_on=ROOM_ID, right_index=True, how="left")
+
+    result = pd.DataFrame({
+        ROOM_ID: joined[ROOM_ID],
+        ALIAS: joined[ALIAS],
+        IN_ROOM_LIST: _is_in(joined[ROOM_ID], room_list_ids).to_numpy(),
+        STREAMED: _is_in(joined[ROOM_ID], kpi_room_ids).to_numpy(),
+    })
+    for source, default in REVENUE_DEFAULTS.items():
+        if source in joined.columns:
+            present = joined[source + PRESENT_SUFFIX].fillna(False).astype(bool)
+            result[source] = joined[source].astype(object).where(present, default)
+        else:
+            result[source] = default
+    return result
+
+
+## データの準備・読み込み関数
+class DataLoadError(Exception):
+    """CSVの読み込みに失敗したことを表す例外（メッセージはそのまま画面表示用）"""
+
+
+def read_source(url, name="データ", schema=None, recorder=None, key=None, force=False, timeout=None):
+    """
+    URLからCSVを読み込み、(DataFrame, 取得結果) を返す
+    本文の取得は条件付きGETのディスクキャッシュ経由で1回だけ行い、
+    **【文字化け対策】** 先頭部分から UTF-8 / BOM付きUTF-8 / Shift-JIS / CP932 を判定してメモリ上でパースする
+    schema（SourceSchema）を指定した場合は、使用する列だけを文字列として読む（列名は列の位置の番号）
+    schema が無い場合は、全ての列を型推論して読む
+    同じソースの読み込みが他のセッション・スレッドで実行中の場合はその結果を共有し、
+    本文が前回と同じ場合はパース済みの DataFrame を再利用する（source_cache。DataFrame は変更しないこと）
+    force=True の場合は、どちらのキャッシュも使わずに取得・パースし直す
+    timeout: 取得の (接続, 読み込み) のタイムアウト（秒）。None の場合は SOURCE_TIMEOUTS[key]、無ければ既定値
+    recorder（RunRecorder）を指定した場合は、取得・パースを "fetch.{key}" / "parse.{key}" のステージとして記録する
+    失敗した場合は DataLoadError を送出する（st.* は呼ばないため、ワーカースレッドからも使用可能）
+    """
+    recorder = recorder or RunRecorder()
+    key = key or name
+    timeout = timeout or SOURCE_TIMEOUTS.get(key)
+
+    @contextmanager
+    def waiting():
+        # 他で実行中の読み込みを待った時間を、取得のステージとして記録する
+        with recorder.stage(f"fetch.{key}") as stage:
+            stage.note = "同時に実行中の読み込みを共有"
+            yield
+
+    # 強制再取得は、実行中の通常の読み込み（再取得の指示より前に始まったもの）とは共有しない
+    (df, fetched), _ = source_cache.single_flight(
+        (url, schema, force), lambda: _read_source(url, name, schema, recorder, key, force, timeout), waiting,
+    )
+    return df, fetched
+
+
+def _read_source(url, name, schema, recorder, key, force, timeout):
+    """read_source の本体（取得・パースとパース済み DataFrame の保存）"""
+    try:
+        with recorder.stage(f"fetch.{key}") as stage:
+            fetched = fetch(url, force=force, timeout=timeout)
+            stage.bytes = fetched.nbytes
+            stage.note = "キャッシュ（304）" if fetched.from_cache else f"再取得（{fetched.status}）"
+            if fetched.attempts > 1:
+                stage.note += f"、リクエスト {fetched.attempts} 回（再試行・続きからの取得を含む）"
+    except Exception as e:
+        raise DataLoadError(f"{name}の読み込みに失敗しました: {url}\nエラー: {e}") from e
+
+    try:
+        with recorder.stage(f"parse.{key}", nbytes=fetched.nbytes) as stage:
+            cached = None if force else source_cache.get((url, schema), fetched.sha256)
+            if cached is not None:
+                df, fetched.encoding = cached
+                stage.note = f"{fetched.encoding}（パース済みを再利用）"
+            else:
+                df = parse_source(fetched, schema)
+                source_cache.put((url, schema), fetched.sha256, fetched.encoding, df)
+                # 分割読み込みしたソースの行数は、重複を除いた後の件数
+                stage.note = fetched.encoding + ("（重複除去後の行数）" if schema is not None and schema.chunked else "")
+            stage.rows = len(df)
+        return df, fetched
+    except UnicodeDecodeError as e:
+        raise DataLoadError(f"{name}の読み込み（文字コード判定）に失敗しました: {url}\nエラー: {e}") from e
+    except Exception as e:
+        raise DataLoadError(f"{name}の読み込みに失敗しました: {url}\nエラー: {e}") from e
+
+
+def parse_source(fetched, schema=None):
+    """取得済みの本文を SourceSchema に従ってパースする（schema が無い場合は全ての列を型推論して読む）"""
+    if schema is None:
+        return read_csv_bytes(fetched)
+    options = {"chunksize": CHUNK_ROWS, "reduce": unique_rows} if schema.chunked else {}
+    return read_csv_bytes(fetched, header=schema.header, columns=schema.columns, dtype=schema.dtype, **options)
+
+
+def load_sources_concurrently(sources, max_workers=None, recorder=None, force=False):
+    """
+    複数のCSVを並列にダウンロード・パースする
+    sources: {キー: (url, name, schema)} の辞書
+    recorder: 各ソースの取得・パースを記録する RunRecorder
+    force: True の場合、キャッシュを使わずに全て取得・パースし直す（read_source を参照）
+    戻り値: {キー: (DataFrame または None, エラーメッセージ または None, 取得結果 または None)} の辞書
+    ※ Streamlitの st.* はワーカースレッドから呼べないため、エラー表示は呼び出し側（メインスレッド）で行う
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(sources)) as executor:
+        futures = {
+            executor.submit(read_source, url, name, schema, recorder, key, force): key
+            for key, (url, name, schema) in sources.items()
+        }
+        # 到着した順にパース済みの結果を受け取る
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                df, fetched = future.result()
+                results[key] = (df, None, fetched)
+            except DataLoadError as e:
+                results[key] = (None, str(e), None)
+    return results
+
+
+def fetch_status_table(loaded, sources):
+    """各ソースの取得元（キャッシュ 304 / 再取得 200）、判定した文字コード、バイト数の一覧表を返す"""
+    rows = []
+    for key, (url, name, _) in sources.items():
+        _, error, fetched = loaded[key]
+        if fetched is None:
+            status = "取得失敗"
+        elif fetched.from_cache:
+            status = "キャッシュ（未更新 304）"
+        else:
+            status = f"再取得（{fetched.status}）"
+        rows.append({
+            "データ": name,
+            "ファイル": url.split('/')[-1],
+            "取得元": status,
+            "文字コード": fetched.encoding if fetched is not None else None,
+            "バイト数": fetched.nbytes if fetched is not None else None,
+        })
+    return pd.DataFrame(rows)
+
+
+def take_loaded(loaded, report, key):
+    """並列読み込みの結果を取り出し、失敗していればその時点でエラーを通知してNoneを返す"""
+    df, error, _ = loaded[key]
+    if error is not None:
+        report("error", error)
+    return df
+
+
+def count_accounts(revenue):
+    """分配額データのアカウントID件数（重複は1件として数える）"""
+    return 0 if revenue is None else revenue[ACCOUNT_ID].nunique(dropna=False)
+
+
+## 処理月
+def get_processed_months():
+    """プルダウンに表示する処理月リストを生成する"""
+    today = datetime.date.today()
+    current_date = today - relativedelta(months=1)
+    processed_months = []
+
+    for i in range(12): 
+        display_str = f"{current_date.year}年{current_date.month:02d}月分"
+        value_str = f"{current_date.year}-{current_date.month:02d}"
+        processed_months.append((display_str, value_str))
+        current_date = current_date - relativedelta(months=1)
+            
+    return processed_months
+
+
+def month_labels(year, month):
+    """処理月から (配信月, 支払月) の表示文字列を返す（例: "2025/10", "2025/12"）"""
+    delivery_month_str = f"{year}/{month:02d}"
+    payment_date = datetime.date(year, month, 1) + relativedelta(months=2)
+    payment_month_str = f"{payment_date.year}/{payment_date.month:02d}"
+    return delivery_month_str, payment_month_str
+
+
+# 無くても処理できるソース（読み込めない場合は該当の列をブランクにする）
+OPTIONAL_SOURCES = frozenset({"paid_live", "time_charge"})
+
+
+def source_urls(year, month):
+    """処理月の6つのCSVのURL {ソースのキー: URL}"""
+    return {
+        "liver": LIVER_LIST_URL,
+        "kpi": KPI_DATA_BASE_URL.format(year=year, month=month),
+        "room_list": ROOM_LIST_URL,
+        "sales": SALES_DATA_BASE_URL.format(year=year, month=month),
+        "paid_live": PAID_LIVE_BASE_URL.format(year=year, month=month),
+        "time_charge": TIME_CHARGE_BASE_URL.format(year=year, month=month),
+    }
+
+
+def month_sources(year, month):
+    """処理月の6つのCSVの {ソースのキー: (URL, データ名, SourceSchema)}"""
+    urls = source_urls(year, month)
+    names = {
+        "liver": "管理ライバーリスト",
+        "kpi": f"{year}年{month:02d}月分のKPIデータ",
+        "room_list": "ルーム名リスト",
+        "sales": "売上分配額データ",
+        "paid_live": "プレミアムライブ分配額データ",
+        "time_charge": "タイムチャージ分配額データ",
+    }
+    # 使用する列だけを文字列として読む（KPIデータは分割して読み、配信ルームIDの一覧だけを保持する）
+    return {key: (urls[key], name, SOURCE_SCHEMAS[key]) for key, name in names.items()}
+
+
+def map_liver(liver_df, report, recorder, stage="map.liver"):
+    """管理ライバーリストの DataFrame から [ルームID, 愛称] の表を作る（列が無い場合はエラーを通知して None）"""
+    if has_columns(liver_df, 0, 1):
+        with recorder.stage(stage, rows=len(liver_df)):
+            liver = pd.DataFrame({
+                ROOM_ID: normalize_ids(liver_df[0]).to_numpy(),
+                ALIAS: normalize_ids(liver_df[1]).to_numpy(),
+            })
+        report("success", f"管理ライバーのルームIDリスト（1列目）と愛称（2列目）を読み込みました。件数: **{len(liver)}**")
+        return liver
+    report("error", "管理ライバーリストCSVにデータ（1列目:ID, 2列目:愛称）が見つかりません。")
+    return None
+
+
+@dataclass
+class MonthInputs:
+    """処理月の、管理ライバーリストによらない入力（KPI・ルームリスト・分配額）"""
+    kpi_room_ids: object          # 処理月に配信があったルームID
+    room_list_ids: object         # room_list.csv のルームID（管理対象判定用）
+    room_accounts: pd.DataFrame   # [アカウントID, ルームID] の表
+    total_revenue: float
+    mk_rank: int
+    revenues: dict                # {分配額の種類: [アカウントID, 分配額] の表 または None}
+
+
+def map_month_inputs(year, month, loaded, report, recorder):
+    """並列読み込みの結果から MonthInputs を作る（必須データが読めない場合は None）"""
+    # 2.2. KPIデータ（配信有無）の読み込み (YYYY-MM_all_all.csv)
+    report("markdown", f"##### {year}年{month:02d}月分のKPIデータの読み込み")
+    kpi_df = take_loaded(loaded, report, "kpi")
+    if kpi_df is None: return None
+
+    if has_columns(kpi_df, 1):
+        with recorder.stage("map.kpi", rows=len(kpi_df)):
+            kpi_room_ids = normalize_ids(kpi_df[1]).unique()
+        report("success", f"配信があったルーム件数: **{len(kpi_room_ids)}** (KPIデータは2列目のIDを使用)")
+    else:
+        report("error", "KPIデータCSVに配信ルームID（2列目）が見つかりません。")
+        return None
+        
+    # 2.3. ルームリストの読み込み (room_list.csv) - IDとアカウントIDの紐づけ用 
+    report("markdown", "##### ルームIDとアカウントIDの紐づけと管理対象判定リストの作成")
+    room_list_df = take_loaded(loaded, report, "room_list")
+    if room_list_df is None: return None
+
+    # 既存ロジック：アカウントIDとルームIDの対応表を作成（紐づけ自体は後段の結合でまとめて行う）
+    room_accounts = pd.DataFrame({ACCOUNT_ID: [], ROOM_ID: []}, dtype=object)
+    if has_columns(room_list_df, 0, 3):
+        with recorder.stage("map.room_accounts", rows=len(room_list_df)):
+            room_accounts = pd.DataFrame({
+                ACCOUNT_ID: normalize_ids(room_list_df[3]).to_numpy(),
+                ROOM_ID: normalize_ids(room_list_df[0]).to_numpy(),
+            })
+        report("success", "ルームIDとアカウントIDのマッピングを作成しました。")
+    else:
+        report("error", "ルーム名リストCSVにアカウントID（4列目）が見つかりません。売上分配額の紐づけをスキップします。")
+
+    # ROOM_LIST_URLの1列目（ルームID）のセットを作成
+    if has_columns(room_list_df, 0):
+        with recorder.stage("map.room_list_ids", rows=len(room_list_df)):
+            room_list_ids = normalize_ids(room_list_df[0]).unique()
+        report("success", f"room_list.csv のルームIDリストを読み込みました。件数: **{len(room_list_ids)}**")
+    else:
+        report("error", "room_list.csvにルームID（1列目）が見つかりません。管理対象の判定をスキップします。")
+        room_list_ids = []
+
+        
+    # 2.4. ルーム売上分配額データの読み込み (point_hist_with_mixed_rate_csv_donwload_for_room_YYYYMM.csv)
+    report("markdown", "##### ルーム売上分配額データの読み込みとMKランク決定")
+    sales_df = take_loaded(loaded, report, "sales")
+    if sales_df is None: return None
+    
+    # 全体分配額合計の取得（1列目1行目）
+    total_revenue = 0.0
+    try:
+        if sales_df.shape[0] > 0 and has_columns(sales_df, 0):
+            total_revenue = float(sales_df[0].iloc[0])
+            report("success", f"全体分配額合計（MKランク決定用）: **{round(total_revenue)}** 円")
+        else:
+            report("warning", "売上分配額CSVが空のため、全体分配額合計は0として処理します。")
+    except:
+        report("error", "売上分配額CSVの1列目1行目から全体分配額合計の取得に失敗しました。0として処理します。")
+        
+    # MKランクの決定
+    mk_rank = get_mk_rank(total_revenue)
+    report("info", f"計算されたMKランク: **{mk_rank}**")
+    
+    # 個別ルームの分配額（アカウントID, 分配額）の作成
+    sales = None
+    if has_columns(sales_df, 0, 1):
+        # 1行目の全体分配額合計を除く
+        with recorder.stage("map.sales", rows=len(sales_df)):
+            sales = revenue_frame(sales_df, skip_first_row=True)
+    else:
+        report("error", "売上分配額CSVに分配額（1列目）またはアカウントID（2列目）が見つかりません。")
+    report("success", f"個別売上分配額データ（アカウントIDをキー）を読み込みました。件数: **{count_accounts(sales)}**")
+    
+    
+    # 2.5. プレミアムライブ分配額データの読み込み (paid_live_hist_invoice_format_YYYYMM.csv)
+    report("markdown", "##### プレミアムライブ分配額データの読み込み")
+    paid_live_df = take_loaded(loaded, report, "paid_live")
+    
+    paid_live = None
+    if paid_live_df is not None and has_columns(paid_live_df, 0, 1):
+        # 1行目からライバーデータ
+        with recorder.stage("map.paid_live", rows=len(paid_live_df)):
+            paid_live = revenue_frame(paid_live_df)
+    report("success", f"プレミアムライブ分配額データ（アカウントIDをキー）を読み込みました。件数: **{count_accounts(paid_live)}**")
+    
+    # 2.6. タイムチャージ分配額データの読み込み (show_rank_time_charge_hist_invoice_format_YYYYMM.csv)
+    report("markdown", "##### タイムチャージ分配額データの読み込み")
+    time_charge_df = take_loaded(loaded, report, "time_charge")
+    
+    time_charge = None
+    if time_charge_df is not None and has_columns(time_charge_df, 0, 1):
+        # 1行目からライバーデータ
+        with recorder.stage("map.time_charge", rows=len(time_charge_df)):
+            time_charge = revenue_frame(time_charge_df)
+    report("success", f"タイムチャージ分配額データ（アカウントIDをキー）を読み込みました。件数: **{count_accounts(time_charge)}**")
+
+    revenues = {"sales": sales, "paid_live": paid_live, "time_charge": time_charge}
+    return MonthInputs(kpi_room_ids, room_list_ids, room_accounts, total_revenue, mk_rank, revenues)
+
+
+## 月次サマリーの作成
+@dataclass
+class MonthlySummary:
+    """1か月分の処理結果"""
+    year: int
+    month: int
+    results: pd.DataFrame   # 結果リスト（列は RESULT_COLUMNS の順）
+    total_revenue: float
+    mk_rank: int
+    metrics: RunRecorder = None   # ステージ別の計測結果（スナップショットから読み込んだ場合は None）
+    reconciliation: Reconciliation = None   # 分配額の突き合わせ結果（スナップショットから読み込んだ場合は None）
+    # 画面表示用の索引とシミュレーション（最初に使う時に1回だけ作成し、画面の再実行では作り直さない）
+    _view: ResultView = field(default=None, init=False, repr=False, compare=False)
+    _simulator: Simulator = field(default=None, init=False, repr=False, compare=False)
+
+    def result_view(self):
+        """結果リストの索引と集計（ResultView）"""
+        if self._view is None:
+            self._view = ResultView(self.results)
+        return self._view
+
+    def simulator(self):
+        """支払想定額のシミュレーション（Simulator）"""
+        if self._simulator is None:
+            self._simulator = Simulator(self.results, self.mk_rank)
+        return self._simulator
+
+
+def no_report(level, message):
+    pass
+
+
+def summarize(year, month, report=None, incremental=True, snapshot=True, recorder=None, force=False):
+    """
+    指定した処理月の月次サマリーを作成し、MonthlySummary を返す（必須データが読めない場合は None）
+
+    incremental: True の場合、前回の結果とファイルの指紋を比較し、変更の影響を受ける列・行だけを再計算する
+    snapshot: True の場合、正規化済みの入力データと結果リストをスナップショットとして保存する
+    （ルームごとの月次履歴の索引（history.py）は常に更新する）
+    force: True の場合、HTTPキャッシュ・パース済みCSVの共有キャッシュを使わずに全てのCSVを取得し直す
+
+    report: 進捗の通知先 report(level, message)
+        level は "markdown" / "success" / "info" / "warning" / "error"（message は文字列）、
+        または "table"（message は DataFrame）
+    recorder: ステージ別の計測先（省略時は新しい RunRecorder。戻り値の metrics で参照できる）
+    """
+    report = report or no_report
+    recorder = recorder or RunRecorder(year, month)
+    delivery_month_str, payment_month_str = month_labels(year, month)
+
+    # --- 2. データの読み込みとマッピング ---
+
+    # 2.0. 6つのCSVを並列に取得・パース（所要時間は最も遅い1ファイル分に短縮される）
+    sources = month_sources(year, month)
+    with recorder.stage("load") as stage:
+        loaded = load_sources_concurrently(sources, recorder=recorder, force=force)
+        stage.bytes = sum(fetched.nbytes for _, _, fetched in loaded.values() if fetched is not None)
+
+    # サーバー側で未更新（304）のファイルはキャッシュを使用し、更新されたものだけ再取得している
+    report("markdown", "##### データの取得状況")
+    report("table", fetch_status_table(loaded, sources))
+    
+    # 2.1. 管理ライバーリストの読み込み (m-liver-list.csv)
+    report("markdown", "##### 管理ライバーリストの読み込みと愛称マッピングの作成")
+    liver_df = take_loaded(loaded, report, "liver")
+    if liver_df is None: return None
+    liver = map_liver(liver_df, report, recorder)
+    if liver is None: return None
+
+    # 2.2〜2.6. 管理ライバーリスト以外（KPI・ルームリスト・分配額）の読み込み
+    inputs = map_month_inputs(year, month, loaded, report, recorder)
+    if inputs is None: return None
+    kpi_room_ids, room_list_ids, room_accounts = inputs.kpi_room_ids, inputs.room_list_ids, inputs.room_accounts
+    total_revenue, mk_rank, revenues = inputs.total_revenue, inputs.mk_rank, inputs.revenues
+
+    # 3. 配信有無と売上分配額の突き合わせと結果生成
+    report("markdown", "#### 3. 結果生成")
+    
+    # 重複したアカウントID・ルームに紐づかない分配額など、結果リストに反映されない分配額を集計する
+    # 突き合わせは確認用のため、失敗しても処理月の結果の作成は続ける
+    report("markdown", "##### 分配額の突き合わせ")
+    try:
+        with recorder.stage("reconcile", rows=sum(len(frame) for frame in revenues.values() if frame is not None)):
+            reconciliation = reconcile(revenues, room_accounts, liver[ROOM_ID])
+    except RunCancelled:
+        raise
+    except Exception as e:
+        reconciliation = None
+        report("warning", f"分配額の突き合わせに失敗しました（結果リストの作成は続けます）: {e}")
+    else:
+        report("warning" if reconciliation.has_issues else "success", reconciliation.describe())
+        report("table", reconciliation.summary)
+
+    def build(liver_rows, revenue_keys):
+        # 全ソースを正規化したID列で一度に突き合わせ、ルーム単位の1枚の表にする
+        joined = join_sources(
+            liver_rows, room_list_ids, room_accounts, kpi_room_ids,
+            {key: revenues[key] for key in revenue_keys},
+        )
+        return build_results(joined, mk_rank, delivery_month_str, payment_month_str)
+
+    # 前回の結果があれば、内容が変わったファイルの影響を受ける列・行だけを再計算する
+    fingerprints = source_fingerprints(loaded)
+    previous = result_store.load(year, month) if incremental else None
+    with recorder.stage("results", rows=len(liver)) as stage:
+        results_df, plan = update_results(previous, fingerprints, liver, build)
+        stage.note = "全件計算" if plan.full else f"差分再計算（再計算した列: {len(plan.recomputed_columns)}）"
+    report("info", plan.describe())
+    try:
+        with recorder.stage("store.incremental", rows=len(results_df)):
+            result_store.save(year, month, fingerprints, results_df)
+    except OSError as e:
+        report("warning", f"差分再計算用の結果を保存できませんでした（次回は全件を再計算します）: {e}")
+
+    if snapshot:
+        inputs = {
+            "liver": liver,
+            "room_list_ids": pd.DataFrame({ROOM_ID: room_list_ids}),
+            "room_accounts": room_accounts,
+            "kpi_room_ids": pd.DataFrame({ROOM_ID: kpi_room_ids}),
+            **revenues,
+        }
+        try:
+            with recorder.stage("store.snapshot", rows=len(results_df)):
+                snapshot_store.save(year, month, results_df, inputs, total_revenue, mk_rank, fingerprints)
+        except OSError as e:
+            report("warning", f"スナップショットを保存できませんでした: {e}")
+
+    # ルームごとの月次履歴の索引を、処理月の分だけ差し替える（ライバー1人の履歴を処理のやり直しなしで引けるように）
+    try:
+        with recorder.stage("store.history", rows=len(results_df)):
+            history_index.add_month(year, month, results_df, room_accounts)
+    except (OSError, sqlite3.Error) as e:
+        report("warning", f"履歴の索引を更新できませんでした: {e}")
+
+    return MonthlySummary(year, month, results_df, total_revenue, mk_rank, recorder, reconciliation)
+
+
+def load_snapshot(year, month):
+    """保存済みスナップショットから MonthlySummary を返す（CSVの取得・パースは行わない）。無い場合は None"""
+    meta = snapshot_store.meta(year, month)
+    # メタ情報と結果リストは同じ保存のものを使う
+    results_df = None if meta is None else snapshot_store.load(year, month, meta=meta)
+    if results_df is None:
+        return None
+    return MonthlySummary(year, month, results_df, meta["total_revenue"], meta["mk_rank"])
+
+
+def build_results(joined, mk_rank, delivery_month_str, payment_month_str):
+    """
+    突き合わせ済みの表（join_sources の戻り値）から、型付きの結果リストを作る
+    （表示列は RESULT_COLUMNS の順、その後に状態コード・元の文字列の列。表記への変換は result_model.render）
+    """
+    # ルーム全件を列単位でまとめて判定・計算する（1ルームずつのループは行わない）
+    size = len(joined)
+    columns = {
+        "ルームID": joined[ROOM_ID].array,
+        # CSVと画面表示で統一するため、「ルーム名」ではなく「ライバー愛称」とする
+        "ライバー愛称": joined[ALIAS].array,
+        # 管理対象判定
+        # LIVER_LIST_URLに存在し、ROOM_LIST_URLに存在しない場合「外」
+        "管理対象": flag_categorical("管理対象", joined[IN_ROOM_LIST]),
+        "配信有無": flag_categorical("配信有無", joined[STREAMED]),
+        "配信月": constant_categorical(delivery_month_str, size),
+        "支払月": constant_categorical(payment_month_str, size),
+    }
+
+    # ルーム売上
+    rank_index, rank_status, estimates, status = payment_estimate_values(joined["sales"], mk_rank)
+    columns.update(amount_columns("R分配額", joined["sales"]))
+    columns.update(rank_columns(rank_index, rank_status))
+    columns.update(estimate_columns("R支払想定額", estimates, status))
+
+    # プレミアムライブ
+    columns.update(amount_columns("PL分配額", joined["paid_live"]))
+    columns.update(estimate_columns("PL支払想定額", *fixed_rate_estimate_values(joined["paid_live"], PAID_LIVE_RATE)))
+
+    # タイムチャージ
+    columns.update(estimate_columns("TC支払想定額", *fixed_rate_estimate_values(joined["time_charge"], TIME_CHARGE_RATE)))
+
+    # 結果の列順序を明示的に指定（表示列、状態コード・元の文字列の列の順）
+    internal = [column for display in RESULT_COLUMNS for column in internal_columns(display)[1:]]
+    results_df = pd.DataFrame(columns)
+    return results_df[RESULT_COLUMNS + internal]
+
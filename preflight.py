@@ -0,0 +1,187 @@
+"""
+データ更新状況の事前確認（プリフライト）
+
+処理開始前に、処理月の6つのCSVへ HEAD リクエストを並列に送り、本文をダウンロードせずに
+更新日時（Last-Modified）とサイズ（Content-Length）を取得して、処理月に対して最新かどうかを判定する。
+- 最新: 処理月の翌月1日（日本時間）以降に更新されている（処理月の締め後に出力されたファイル）
+- 古い可能性: それより前に更新されている
+- 不明: サーバーが更新日時を返さない・接続できない（タイムアウト、5xx など一時的な失敗の可能性がある）
+- 取得不可: ファイルが無い（4xx。処理を開始しても読み込みに失敗する）
+画面の移動・操作のたびに問い合わせないよう、結果は処理月ごとに短い時間（PREFLIGHT_TTL_S 秒）保持する。
+"""
+import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from fetch import default_cache
+from http_client import HttpError, TransportError, http_client
+
+
+# --- 定数 ---
+# 確認結果を保持する秒数
+PREFLIGHT_TTL_S = float(os.environ.get("SR_SUMMARY_PREFLIGHT_TTL_S", 60))
+# 1件の問い合わせのタイムアウト（秒）
+PREFLIGHT_TIMEOUT_S = float(os.environ.get("SR_SUMMARY_PREFLIGHT_TIMEOUT_S", 10))
+# 5xx・切断の再試行の回数（確認は速さを優先し、読み込みより少なくする）
+PREFLIGHT_RETRIES = int(os.environ.get("SR_SUMMARY_PREFLIGHT_RETRIES", 1))
+# 処理月の締めの判定に使うタイムゾーン（日本時間）
+JST = datetime.timezone(datetime.timedelta(hours=9), "JST")
+
+# 判定
+FRESH = "fresh"
+STALE = "stale"
+UNKNOWN = "unknown"
+MISSING = "missing"
+VERDICT_LABELS = {FRESH: "✅ 最新", STALE: "⚠️ 古い可能性", UNKNOWN: "❔ 不明", MISSING: "❌ 取得不可"}
+
+
+@dataclass
+class ProbeResult:
+    """1件のURLの確認結果"""
+    key: str
+    url: str
+    verdict: str
+    status: int = None                        # サーバーの応答コード
+    last_modified: datetime.datetime = None   # 更新日時（日本時間）
+    size: int = None                          # Content-Length（バイト）
+    changed: bool = None                      # 前回取得したキャッシュから更新されているか（キャッシュが無い場合は None）
+    error: str = None
+
+
+def fresh_since(year, month):
+    """処理月のファイルが「最新」とみなせる更新日時の下限（処理月の翌月1日 0時、日本時間）"""
+    return datetime.datetime(year, month, 1, tzinfo=JST) + relativedelta(months=1)
+
+
+def _head(url, timeout):
+    # 読み込みと同じ接続プールを使う（確認で開いた接続を、続く読み込みで再利用できる）
+    # 転送圧縮を要求すると Content-Length が圧縮後のサイズになるため、圧縮しない形で問い合わせる
+    headers = {"Accept-Encoding": "identity"}
+    response = http_client.request("HEAD", url, headers=headers, timeout=timeout, retries=PREFLIGHT_RETRIES)
+    if response.status in (405, 501):
+        # HEAD に対応していないサーバーには、先頭1バイトだけの GET で問い合わせる
+        response = http_client.request(
+            "GET", url, headers={**headers, "Range": "bytes=0-0"}, timeout=timeout, retries=PREFLIGHT_RETRIES,
+        )
+    if response.status >= 400:
+        raise HttpError(url, response.status)
+    return response.status, response.headers
+
+
+def _size(status, headers):
+    if status == 206:
+        # Content-Range: bytes 0-0/12345
+        total = (headers.get("Content-Range") or "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def probe(key, url, since, timeout=PREFLIGHT_TIMEOUT_S, cache=None):
+    """url の更新日時とサイズを問い合わせ、since 以降に更新されているかを判定する"""
+    try:
+        status, headers = _head(url, timeout)
+    except HttpError as e:
+        # 5xx はサーバー側の一時的な失敗の可能性があるため、ファイルが無いとは判定しない
+        verdict = UNKNOWN if e.status >= 500 else MISSING
+        return ProbeResult(key, url, verdict, status=e.status, error=f"HTTP {e.status}")
+    except (TransportError, OSError) as e:
+        # 接続できない・タイムアウトの場合も、ファイルの有無は分からない
+        return ProbeResult(key, url, UNKNOWN, error=str(e))
+
+    last_modified_text = headers.get("Last-Modified")
+    try:
+        last_modified = parsedate_to_datetime(last_modified_text).astimezone(JST)
+    except (TypeError, ValueError):
+        last_modified = None
+    if last_modified is None:
+        verdict = UNKNOWN
+    else:
+        verdict = FRESH if last_modified >= since else STALE
+
+    # 前回取得時の検証子と比べ、ダウンロードし直すことになるかを示す
+    meta = (cache or default_cache).lookup(url)
+    changed = None
+    if meta is not None:
+        etag = headers.get("ETag")
+        if etag and meta.get("etag"):
+            changed = etag != meta["etag"]
+        elif last_modified_text and meta.get("last_modified"):
+            changed = last_modified_text != meta["last_modified"]
+    return ProbeResult(key, url, verdict, status, last_modified, _size(status, headers), changed)
+
+
+def probe_all(urls, since, timeout=PREFLIGHT_TIMEOUT_S, cache=None):
+    """{キー: URL} の全てを並列に確認し、{キー: ProbeResult} を返す"""
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        futures = {key: executor.submit(probe, key, url, since, timeout, cache) for key, url in urls.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+
+def overall_verdict(results):
+    """複数のファイルの判定をまとめる（取得不可 > 古い可能性 > 不明 > 最新 の順に優先）"""
+    for verdict in (MISSING, STALE, UNKNOWN):
+        if any(result.verdict == verdict for result in results):
+            return verdict
+    return FRESH
+
+
+def status_table(results, names):
+    """確認結果の一覧表（names: {キー: データ名}）"""
+    rows = []
+    for key, result in results.items():
+        rows.append({
+            "データ": names.get(key, key),
+            "ファイル": result.url.split('/')[-1],
+            "判定": VERDICT_LABELS[result.verdict],
+            "更新日時": f"{result.last_modified:%Y-%m-%d %H:%M}" if result.last_modified else None,
+            "サイズ（バイト）": result.size,
+            "前回取得から": {True: "更新あり", False: "更新なし", None: "-"}[result.changed],
+            "エラー": result.error,
+        })
+    return pd.DataFrame(rows)
+
+
+class PreflightCache:
+    """処理月ごとの確認結果を ttl_s 秒だけ保持する"""
+
+    def __init__(self, ttl_s=PREFLIGHT_TTL_S):
+        self.ttl_s = ttl_s
+        # {(year, month): (確認した時刻（time.monotonic）, 確認日時, {キー: ProbeResult})}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def check(self, year, month, urls, refresh=False):
+        """
+        処理月の確認結果を (確認日時, {キー: ProbeResult}) で返す
+        保持している結果が ttl_s 秒以内のもので、refresh=False の場合は問い合わせない
+        """
+        key = (year, month)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not refresh and time.monotonic() - entry[0] < self.ttl_s:
+            return entry[1], entry[2]
+        results = probe_all(urls, fresh_since(year, month))
+        entry = (time.monotonic(), datetime.datetime.now(), results)
+        with self._lock:
+            self._entries[key] = entry
+            # 期限切れの結果を削除する
+            now = entry[0]
+            for stale_key in [k for k, e in self._entries.items() if now - e[0] >= self.ttl_s]:
+                del self._entries[stale_key]
+        return entry[1], entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# プロセス内（Streamlit の全セッション）で共有する既定の確認結果
+preflight_cache = PreflightCache()
@@ -0,0 +1,184 @@
+"""
+分配額データの突き合わせレポート（Reconciliation）
+
+結果リストの作成（pipeline.join_sources）では、次の分配額が結果に現れないまま除かれる。
+- 同じアカウントIDが複数行ある場合は後の行だけを採用する（前の行の分配額は使われない）
+- room_list.csv にアカウントIDが無い行は、どのルームにも紐づかない
+- 紐づいたルームが管理ライバーリストに無い行は、管理外の分配額になる
+- 同じルームに複数のアカウントがある場合は、room_list.csv で後に現れたアカウントの分配額だけを採用する
+これらを分配額の種類ごとに、IDを整数の符号にした配列の突き合わせ・集計で（1行ずつ辞書を引かずに）まとめて求める。
+分配額は engine.parse_amounts と同じ規則で数値化し、数値にできない値は金額の集計から除く。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from engine import parse_amounts
+
+
+# --- 定数 ---
+# 分配額・ルームリストの表の列名（pipeline と同じ）
+ACCOUNT_ID = "account_id"
+ROOM_ID = "room_id"
+AMOUNT = "amount"
+SOURCE_NAMES = {"sales": "ルーム売上", "paid_live": "プレミアムライブ", "time_charge": "タイムチャージ"}
+
+# 結果に現れない行（重複を除く）の理由
+REASON_NO_ACCOUNT = "room_list.csv にアカウントIDが無い"
+REASON_UNMANAGED = "管理ライバーリストに無いルーム"
+REASON_SHADOWED = "同じルームの別アカウントを採用"
+REASONS = (REASON_NO_ACCOUNT, REASON_UNMANAGED, REASON_SHADOWED)
+
+DUPLICATE_COLUMNS = ["データ", "アカウントID", "件数", "合計額", "採用額（後の行）", "差額（合計 − 採用）"]
+ORPHAN_COLUMNS = ["データ", "アカウントID", "ルームID", "分配額", "理由"]
+
+
+@dataclass
+class Reconciliation:
+    """1か月分の突き合わせ結果"""
+    summary: pd.DataFrame      # 分配額の種類ごとの件数・金額
+    duplicates: pd.DataFrame   # 重複したアカウントIDごとの合計額と採用額
+    orphans: pd.DataFrame      # 結果に現れない行（重複を除く）の一覧
+    unmanaged_total: float     # 管理外ルームの分配額の合計（全種類）
+
+    @property
+    def has_issues(self):
+        return len(self.duplicates) > 0 or len(self.orphans) > 0
+
+    def describe(self):
+        """突き合わせ結果の1行の説明"""
+        if not self.has_issues:
+            return "全ての分配額が結果リストに反映されています（重複・紐づかない行はありません）。"
+        counts = self.orphans["理由"].value_counts()
+        parts = [f"重複アカウントID {len(self.duplicates)} 件"]
+        parts += [f"{reason} {counts.get(reason, 0)} 行" for reason in REASONS]
+        return "、".join(parts) + f"。管理外ルームの分配額合計: **{round(self.unmanaged_total)}** 円"
+
+
+def _amounts(values):
+    raw = np.asarray(values, dtype=object)
+    amounts, _ = parse_amounts(raw, skip=(raw == "") | (raw == "#N/A"))
+    return amounts
+
+
+def _last_positions(codes):
+    """符号の配列で、各符号が最後に現れた位置（位置の昇順）"""
+    _, reversed_first = np.unique(codes[::-1], return_index=True)
+    return np.sort(len(codes) - 1 - reversed_first)
+
+
+def _duplicates(source, account_ids, codes, values):
+    """重複したアカウントIDごとの行数・合計額・採用額（後の行の額）"""
+    counts = np.bincount(codes)
+    duplicated = counts[codes] > 1
+    if not duplicated.any():
+        return None
+    valid = ~np.isnan(values)
+    sums = np.bincount(codes, weights=np.where(valid, values, 0.0), minlength=len(counts))
+    valid_counts = np.bincount(codes, weights=valid, minlength=len(counts))
+    last = _last_positions(codes)
+    last = last[duplicated[last]]
+    dup_codes = codes[last]
+    total = np.where(valid_counts[dup_codes] > 0, sums[dup_codes], np.nan)
+    return pd.DataFrame({
+        "データ": SOURCE_NAMES[source],
+        "アカウントID": account_ids[last],
+        "件数": counts[dup_codes],
+        "合計額": total,
+        "採用額（後の行）": values[last],
+        "差額（合計 − 採用）": total - values[last],
+    })
+
+
+def reconcile(revenues, room_accounts, liver_room_ids):
+    """
+    revenues: {分配額の種類: [アカウントID, 分配額] の表 または None}（pipeline.revenue_frame の出力）
+    room_accounts: [アカウントID, ルームID] の表（room_list.csv の並び順）
+    liver_room_ids: 管理ライバーリストのルームID
+    """
+    revenues = {source: frame for source, frame in revenues.items() if frame is not None}
+    # アカウントID・ルームIDは全ての表をまとめて一度だけ整数の符号にし、以降は符号の配列で突き合わせる
+    account_ids = {source: frame[ACCOUNT_ID].to_numpy(dtype=object) for source, frame in revenues.items()}
+    room_account_ids = room_accounts[ACCOUNT_ID].to_numpy(dtype=object)
+    # 空欄（NaN）のIDも1つの値として符号にする（符号 -1 を作らない。pipeline.join_sources の結合でも NaN 同士は一致する）
+    account_codes, accounts = pd.factorize(
+        np.concatenate([room_account_ids, *account_ids.values()]), use_na_sentinel=False,
+    )
+    room_codes, rooms = pd.factorize(np.concatenate([
+        room_accounts[ROOM_ID].to_numpy(dtype=object), np.asarray(liver_room_ids, dtype=object),
+    ]), use_na_sentinel=False)
+    list_accounts = account_codes[:len(room_account_ids)]
+    list_rooms = room_codes[:len(room_account_ids)]
+    managed = np.zeros(len(rooms), dtype=bool)
+    managed[room_codes[len(room_account_ids):]] = True
+
+    # アカウントID→ルームID は後の行を採用し、並びは最初に現れた位置とする（pipeline._unique_accounts と同じ）
+    room_of = np.full(len(accounts), -1, dtype=np.int64)
+    last = _last_positions(list_accounts)
+    room_of[list_accounts[last]] = list_rooms[last]
+    order_of = np.full(len(accounts), -1, dtype=np.int64)
+    _, first = np.unique(list_accounts, return_index=True)
+    order_of[list_accounts[first]] = first
+
+    summaries, duplicate_tables, orphan_tables = [], [], []
+    offset = len(room_account_ids)
+    for source, frame in revenues.items():
+        ids = account_ids[source]
+        codes = account_codes[offset:offset + len(ids)]
+        offset += len(ids)
+        raw = frame[AMOUNT].to_numpy(dtype=object)
+        values = _amounts(raw)
+        table = _duplicates(source, ids, codes, values)
+        if table is not None:
+            duplicate_tables.append(table)
+
+        # 重複は後の行だけを残し、ルームに紐づける
+        kept = _last_positions(codes)
+        kept_rooms = room_of[codes[kept]]
+        no_account = kept_rooms < 0
+        unmanaged = ~no_account & ~managed[kept_rooms]
+        # 同じルームに複数のアカウントがある場合、room_list.csv で後に現れたアカウント（並びが後のもの）以外は採用されない
+        linked = np.flatnonzero(~no_account & ~unmanaged)
+        by_room = linked[np.lexsort((order_of[codes[kept[linked]]], kept_rooms[linked]))]
+        group_last = np.ones(len(by_room), dtype=bool)
+        group_last[:-1] = kept_rooms[by_room][1:] != kept_rooms[by_room][:-1]
+        shadowed = np.zeros(len(kept), dtype=bool)
+        shadowed[by_room[~group_last]] = True
+
+        orphan = no_account | unmanaged | shadowed
+        if orphan.any():
+            reasons = np.where(no_account, 0, np.where(unmanaged, 1, 2))
+            room_ids = np.append(np.asarray(rooms, dtype=object), None)[kept_rooms[orphan]]
+            orphan_tables.append(pd.DataFrame({
+                "データ": SOURCE_NAMES[source],
+                "アカウントID": ids[kept[orphan]],
+                "ルームID": room_ids,
+                "分配額": raw[kept[orphan]],
+                "理由": pd.Categorical.from_codes(reasons[orphan], categories=REASONS),
+            }))
+
+        kept_values = values[kept]
+        dropped = np.ones(len(codes), dtype=bool)
+        dropped[kept] = False
+        summaries.append({
+            "データ": SOURCE_NAMES[source],
+            "行数": len(codes),
+            "数値でない分配額（空欄を含む）": int(np.isnan(values).sum()),
+            "重複アカウント数": 0 if table is None else len(table),
+            "重複で除いた金額": float(np.nansum(values[dropped])),
+            "アカウント未登録（件数）": int(no_account.sum()),
+            "アカウント未登録（金額）": float(np.nansum(kept_values[no_account])),
+            "管理外ルーム（件数）": int(unmanaged.sum()),
+            "管理外ルーム（金額）": float(np.nansum(kept_values[unmanaged])),
+            "別アカウント採用（件数）": int(shadowed.sum()),
+            "別アカウント採用（金額）": float(np.nansum(kept_values[shadowed])),
+            "結果に反映した金額": float(np.nansum(kept_values[~orphan])),
+        })
+
+    summary = pd.DataFrame(summaries)
+    duplicates = pd.concat(duplicate_tables, ignore_index=True) if duplicate_tables else pd.DataFrame(columns=DUPLICATE_COLUMNS)
+    orphans = pd.concat(orphan_tables, ignore_index=True) if orphan_tables else pd.DataFrame(columns=ORPHAN_COLUMNS)
+    unmanaged_total = float(summary["管理外ルーム（金額）"].sum()) if len(summary) else 0.0
+    return Reconciliation(summary, duplicates, orphans, unmanaged_total)
+
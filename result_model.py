@@ -0,0 +1,166 @@
+"""
+結果リストの型付き表現
+
+結果リストは内部では数値・カテゴリ型の列と状態コードの列で保持し、
+"#N/A" / "#ERROR_CALC" などの表記は CSV 出力・画面表示の時にだけ作る（render）。
+- 分配額: Float64 の数値、状態コード（{列}_status）、
+  元の文字列が表記の規則（整数は "22501"、それ以外は str(float)）と異なる行だけ元の文字列（{列}_text、カテゴリ型）
+- 支払想定額: 四捨五入済みの Float64 と状態コード
+- 個別ランク: INDIVIDUAL_RANKS のカテゴリ型と状態コード
+- 管理対象・配信有無・配信月・支払月: カテゴリ型
+"""
+import numpy as np
+import pandas as pd
+
+from engine import (
+    INDIVIDUAL_RANKS,
+    STATUS_INVALID,
+    STATUS_NOT_AVAILABLE,
+    STATUS_OK,
+    format_integers,
+    format_ranks,
+    format_statuses,
+    parse_amounts,
+)
+
+
+# --- 定数 ---
+STATUS_SUFFIX = "_status"
+TEXT_SUFFIX = "_text"
+# 分配額の列と、データが無い場合の表記
+AMOUNT_COLUMNS = {"R分配額": "#N/A", "PL分配額": ""}
+# 支払想定額の列と、計算対象外の場合の表記
+ESTIMATE_COLUMNS = {"R支払想定額": "#N/A", "PL支払想定額": "", "TC支払想定額": ""}
+RANK_COLUMN = "個別ランク"
+# カテゴリ型で保持するフラグ列と、その値
+FLAG_CATEGORIES = {"管理対象": ["", "外"], "配信有無": ["有り", "なし"]}
+
+
+def status_column(column):
+    return column + STATUS_SUFFIX
+
+
+def text_column(column):
+    return column + TEXT_SUFFIX
+
+
+def internal_columns(column):
+    """表示列 column の値を保持する内部の列（値の列、状態コードの列、元の文字列の列）"""
+    if column in AMOUNT_COLUMNS:
+        return [column, status_column(column), text_column(column)]
+    if column in ESTIMATE_COLUMNS or column == RANK_COLUMN:
+        return [column, status_column(column)]
+    return [column]
+
+
+def display_columns(frame):
+    """frame の表示列（状態コード・元の文字列の列を除く）"""
+    return [column for column in frame.columns if not column.endswith((STATUS_SUFFIX, TEXT_SUFFIX))]
+
+
+# --- 型付きの列の作成 ---
+def flag_categorical(column, mask):
+    """フラグ列（管理対象・配信有無）のカテゴリ型の列。mask が True の行は FLAG_CATEGORIES の1つ目の値"""
+    return pd.Categorical.from_codes((~np.asarray(mask, dtype=bool)).astype(np.int8), categories=FLAG_CATEGORIES[column])
+
+
+def constant_categorical(value, size):
+    """全行が同じ値のカテゴリ型の列（配信月・支払月）"""
+    return pd.Categorical.from_codes(np.zeros(size, dtype=np.int8), categories=[value])
+
+
+def _format_amounts(amounts, status, missing_text):
+    """分配額の表記（数値は整数なら "22501"、それ以外は str(float)、数値が無い行は missing_text）"""
+    ok = status == STATUS_OK
+    values = amounts[ok]
+    integral = (np.abs(values) < 2.0 ** 53) & (values == np.floor(values))
+    if integral.all():
+        text = format_integers(values)
+    else:
+        text = np.empty(len(values), dtype=object)
+        text[integral] = format_integers(values[integral])
+        text[~integral] = [str(value) for value in values[~integral].tolist()]
+    if ok.all():
+        return text
+    out = np.full(len(status), missing_text, dtype=object)
+    out[ok] = text
+    return out
+
+
+def amount_columns(column, raw_values):
+    """
+    分配額の元の文字列の配列から {列名: 値} を作る（値、状態コード、元の文字列）
+    元の文字列は、表記の規則で作った文字列と異なる行（"022501"、数値にできない値など）だけ保持する
+    """
+    raw = np.asarray(raw_values, dtype=object)
+    blank = (raw == "") | (raw == "#N/A")
+    amounts, parsed = parse_amounts(raw, skip=blank)
+    status = np.full(len(raw), STATUS_OK, dtype=np.uint8)
+    status[~parsed] = STATUS_INVALID
+    status[blank] = STATUS_NOT_AVAILABLE
+
+    # 欠損（NaN）は CSV では空欄になるため "" として扱う
+    raw_text = np.where(pd.isna(raw), "", raw)
+    differs = raw_text != _format_amounts(amounts, status, AMOUNT_COLUMNS[column])
+    codes = np.full(len(raw), -1, dtype=np.int32)
+    codes[differs], texts = pd.factorize(raw_text[differs])
+    return {
+        column: pd.array(np.where(status == STATUS_OK, amounts, np.nan), dtype="Float64"),
+        status_column(column): status,
+        # ほとんどの行が NA のため、カテゴリ型（1行あたり符号1バイト程度）で保持する
+        text_column(column): pd.Categorical.from_codes(codes, categories=pd.Index(texts, dtype=object)),
+    }
+
+
+def estimate_columns(column, values, status):
+    """支払想定額の (四捨五入済みの数値, 状態コード) から {列名: 値} を作る"""
+    return {
+        column: pd.array(np.where(status == STATUS_OK, values, np.nan), dtype="Float64"),
+        status_column(column): status,
+    }
+
+
+def rank_columns(rank_index, rank_status):
+    """個別ランクの (ランクの位置, 状態コード) から {列名: 値} を作る"""
+    codes = np.where(rank_status == STATUS_OK, rank_index, -1).astype(np.int8)
+    return {
+        RANK_COLUMN: pd.Categorical.from_codes(codes, categories=INDIVIDUAL_RANKS),
+        status_column(RANK_COLUMN): rank_status,
+    }
+
+
+# --- 表記への変換 ---
+def _float_values(series):
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def render_column(frame, column):
+    """表示列 column を、CSV・画面表示と同じ表記の object 配列にする"""
+    series = frame[column]
+    if column in AMOUNT_COLUMNS:
+        status = frame[status_column(column)].to_numpy()
+        out = _format_amounts(_float_values(series), status, AMOUNT_COLUMNS[column])
+        text = frame[text_column(column)]
+        override = text.notna().to_numpy()
+        out[override] = text.to_numpy(dtype=object)[override]
+        return out
+    if column in ESTIMATE_COLUMNS:
+        status = frame[status_column(column)].to_numpy()
+        return format_statuses(_float_values(series), status, ESTIMATE_COLUMNS[column])
+    if column == RANK_COLUMN:
+        return format_ranks(series.cat.codes.to_numpy(), frame[status_column(column)].to_numpy())
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # 値の種類ごとの文字列を符号で引く（NA は NaN）
+        categories = np.append(np.asarray(series.cat.categories, dtype=object), np.nan)
+        return categories[series.cat.codes.to_numpy()]
+    return series.to_numpy()
+
+
+def render(frame):
+    """型付きの結果リストを、表示列だけの文字列の表（CSV・画面表示用）にする"""
+    # object 型のまま保持する（文字列型への変換と、to_csv での object への再変換を避ける）
+    return pd.DataFrame(
+        {column: render_column(frame, column) for column in display_columns(frame)},
+        index=frame.index,
+        dtype=object,
+    )
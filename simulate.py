@@ -0,0 +1,150 @@
+"""
+ルーム売上支払想定額のシミュレーション（What-if）
+
+「MKランクが N だったら」「個別ランクのしきい値を X% 変えたら」「レートを一律 Y 倍にしたら」の支払想定額を、
+処理をやり直さずに、型付きの結果リスト（R分配額の数値列）から ルーム × シナリオ の行列として一度にまとめて計算する。
+個別ランクの判定はしきい値の組ごとに1回だけ行い、レートは RATE_MATRIX から シナリオの列をまとめて引く。
+計算式・四捨五入は engine.payment_estimate_values と同じため、実績のシナリオは結果リストの R支払想定額 と一致する。
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from engine import (
+    INDIVIDUAL_RANKS,
+    INDIVIDUAL_RANK_THRESHOLDS,
+    MK_RANK_TO_RATE_KEY,
+    RATE_KEYS,
+    RATE_MATRIX,
+)
+
+
+# --- 定数 ---
+MK_RANKS = sorted(MK_RANK_TO_RATE_KEY)
+ACTUAL_NAME = "実績"
+# 1回にまとめて計算するシナリオの数（ルーム × シナリオ の一時配列の大きさを抑える）
+SCENARIO_CHUNK = 16
+# しきい値の変更率（%）の下限（この値以下では全てのしきい値が 0 以下になり、ランクの順序が保てない）
+MIN_THRESHOLD_SHIFT = -100
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """1つのシナリオ（MKランク、個別ランクのしきい値（D 〜 SSS の下限）、レートの倍率）"""
+    name: str
+    mk_rank: int
+    thresholds: tuple = tuple(INDIVIDUAL_RANK_THRESHOLDS)
+    rate_factor: float = 1.0
+
+
+def shift_thresholds(percent, thresholds=INDIVIDUAL_RANK_THRESHOLDS):
+    """
+    個別ランクのしきい値を percent% 変えた組（1円単位に四捨五入）
+    percent が MIN_THRESHOLD_SHIFT 以下の場合は ValueError（しきい値が 0 以下・逆順になり、ランクを判定できない）
+    """
+    if not percent > MIN_THRESHOLD_SHIFT:
+        raise ValueError(f"しきい値の変更率は {MIN_THRESHOLD_SHIFT}% より大きい値にしてください: {percent}")
+    return tuple(int(round(threshold * (1 + percent / 100))) for threshold in thresholds)
+
+
+def parse_numbers(text):
+    """カンマ区切りの数値の入力（例: "-10, 10"）をリストにする（数値にできない・nan / inf の場合は ValueError）"""
+    numbers = [float(value) for value in text.replace("、", ",").split(",") if value.strip()]
+    if not all(np.isfinite(numbers)):
+        raise ValueError(f"有限の数値を入力してください: {text}")
+    return numbers
+
+
+def build_scenarios(mk_ranks=MK_RANKS, threshold_shifts=(0,), rate_factors=(1.0,)):
+    """MKランク × しきい値の変更率（%）× レートの倍率 の全ての組み合わせのシナリオ"""
+    scenarios = []
+    for mk_rank in mk_ranks:
+        for shift in threshold_shifts:
+            for factor in rate_factors:
+                name = f"MK{mk_rank}"
+                if shift:
+                    name += f" しきい値{shift:+g}%"
+                if factor != 1:
+                    name += f" レート×{factor:g}"
+                scenarios.append(Scenario(name, mk_rank, shift_thresholds(shift), factor))
+    return scenarios
+
+
+class Simulator:
+    """1回の処理結果に対するシミュレーション（対象ルームの分配額と、しきい値の組ごとの個別ランクを保持する）"""
+
+    def __init__(self, results_df, mk_rank):
+        amounts = results_df["R分配額"].to_numpy(dtype=np.float64, na_value=np.nan)
+        # 支払想定額を計算できるルーム（"#N/A" / 数値にできない分配額 / 無限大は対象外）
+        self.positions = np.flatnonzero(np.isfinite(amounts))
+        self.amounts = amounts[self.positions]
+        self.results = results_df
+        self.actual = Scenario(ACTUAL_NAME, mk_rank)
+        self._rank_indexes = {}
+
+    def rank_index(self, thresholds):
+        """しきい値の組に対する各ルームの個別ランクの位置（INDIVIDUAL_RANKS の添字）"""
+        if thresholds not in self._rank_indexes:
+            self._rank_indexes[thresholds] = np.searchsorted(thresholds, self.amounts, side="right")
+        return self._rank_indexes[thresholds]
+
+    def payouts(self, scenarios):
+        """ルーム × シナリオ の支払想定額の行列（四捨五入済み。行は self.positions の順）"""
+        matrix = np.empty((len(self.amounts), len(scenarios)))
+        # しきい値の組が同じシナリオは、個別ランクの判定を共有してまとめて計算する
+        groups = {}
+        for column, scenario in enumerate(scenarios):
+            groups.setdefault(scenario.thresholds, []).append(column)
+        for thresholds, columns in groups.items():
+            rates_by_rank = RATE_MATRIX[self.rank_index(thresholds)]
+            for start in range(0, len(columns), SCENARIO_CHUNK):
+                chunk = columns[start:start + SCENARIO_CHUNK]
+                keys = [RATE_KEYS.index(MK_RANK_TO_RATE_KEY[scenarios[c].mk_rank]) for c in chunk]
+                factors = np.array([scenarios[c].rate_factor for c in chunk])
+                rates = rates_by_rank[:, keys] * factors
+                # 計算式の適用: ($individualRevenue * 1.08 * $rate) / 1.10 * 1.10
+                matrix[:, chunk] = np.rint((self.amounts[:, None] * 1.08 * rates) / 1.10 * 1.10)
+        return matrix
+
+    def run(self, scenarios):
+        """
+        実績と scenarios の支払想定額を計算し、(シナリオ別の集計表, 行列) を返す
+        行列の1列目は実績、以降は scenarios の順
+        """
+        scenarios = [self.actual] + list(scenarios)
+        matrix = self.payouts(scenarios)
+        totals = matrix.sum(axis=0)
+        deltas = matrix - matrix[:, :1]
+        summary = pd.DataFrame({
+            "シナリオ": [scenario.name for scenario in scenarios],
+            "MKランク": [scenario.mk_rank for scenario in scenarios],
+            "しきい値（D下限）": [scenario.thresholds[0] for scenario in scenarios],
+            "レート倍率": [scenario.rate_factor for scenario in scenarios],
+            "R支払想定額合計": totals,
+            "実績との差額": totals - totals[0],
+            "差額率(%)": np.round((totals / totals[0] - 1) * 100, 3) if totals[0] else np.nan,
+            "増額ルーム数": (deltas > 0).sum(axis=0),
+            "減額ルーム数": (deltas < 0).sum(axis=0),
+        })
+        return summary, matrix
+
+    def room_deltas(self, matrix, scenario, column, limit=100):
+        """
+        scenario（matrix の column 列目）の実績との差額が大きいルームの一覧（差額の絶対値の大きい順に limit 件）
+        """
+        delta = matrix[:, column] - matrix[:, 0]
+        top = np.argsort(-np.abs(delta), kind="stable")[:limit]
+        rows = self.positions[top]
+        actual_ranks = np.asarray(INDIVIDUAL_RANKS, dtype=object)[self.rank_index(self.actual.thresholds)[top]]
+        ranks = np.asarray(INDIVIDUAL_RANKS, dtype=object)[self.rank_index(scenario.thresholds)[top]]
+        return pd.DataFrame({
+            "ルームID": self.results["ルームID"].to_numpy()[rows],
+            "ライバー愛称": self.results["ライバー愛称"].to_numpy()[rows],
+            "R分配額": self.amounts[top],
+            "個別ランク（実績）": actual_ranks,
+            f"個別ランク（{scenario.name}）": ranks,
+            "R支払想定額（実績）": matrix[top, 0],
+            f"R支払想定額（{scenario.name}）": matrix[top, column],
+            "差額": delta[top],
+        })
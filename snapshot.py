@@ -0,0 +1,201 @@
+"""
+月次スナップショット
+
+処理月ごとに、正規化済みの入力データ（管理ライバーリスト・ルームリスト・KPI・3種類の分配額）と
+結果リストを列指向のファイル（Arrow IPC / Feather、非圧縮）として保存し、パースせずに型付きのまま読み戻す。
+（DataFrame への変換でデータはコピーされるため、読み込み後の DataFrame はファイルと独立している）
+締め済みの月は、CSVの再ダウンロード・再パースなしで結果を表示できる。
+保存数には上限があり（処理月の新しい順に SNAPSHOT_KEEP_MONTHS 件）、画面から一覧表示・削除できる。
+処理月の全てのファイルは一時ディレクトリに書き終えてからディレクトリごと差し替え、
+各テーブルには meta.json と同じ保存ID を記録する（別の保存のテーブルとメタ情報を組み合わせて読むことはない）。
+"""
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+
+
+# --- 定数（保存先・保持ポリシー） ---
+SNAPSHOT_DIR = os.environ.get(
+    "SR_SUMMARY_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshots"),
+)
+# 保持する処理月の数（超えた場合は処理月が古いものから削除）
+SNAPSHOT_KEEP_MONTHS = int(os.environ.get("SR_SUMMARY_SNAPSHOT_KEEP_MONTHS", 24))
+# 保存形式を変更した場合は番号を上げ、古いスナップショットを読まないようにする
+SNAPSHOT_VERSION = 2
+
+RESULTS_NAME = "results"
+META_FILE = "meta.json"
+# テーブルのスキーマに記録する保存ID のキー
+SNAPSHOT_ID_KEY = b"snapshot_id"
+# 他の保存と同時にディレクトリを差し替えようとした場合の試行回数
+REPLACE_ATTEMPTS = 5
+
+
+def _write_table(path, df, snapshot_id):
+    """DataFrame を非圧縮の Feather（Arrow IPC）で書き出す（読み込み時に展開しないよう圧縮しない）"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), SNAPSHOT_ID_KEY: snapshot_id.encode()})
+    feather.write_feather(table, path, compression="uncompressed")
+
+
+def _read_table(path):
+    """
+    Feather ファイルを読み込み、(DataFrame, 保存ID) を返す
+    to_pandas はデータをコピーするため、ファイルは開いたままにしない（差し替え・削除を妨げない）
+    """
+    table = feather.read_table(path, memory_map=False)
+    snapshot_id = (table.schema.metadata or {}).get(SNAPSHOT_ID_KEY, b"").decode()
+    return table.to_pandas(), snapshot_id
+
+
+class SnapshotStore:
+    """処理月ごとのスナップショット（{YYYYMM}/ ディレクトリ）の保存先"""
+
+    def __init__(self, directory=SNAPSHOT_DIR, keep_months=SNAPSHOT_KEEP_MONTHS):
+        self.directory = directory
+        self.keep_months = keep_months
+
+    def _month_dir(self, year, month):
+        return os.path.join(self.directory, f"{year}{month:02d}")
+
+    def save(self, year, month, results, inputs, total_revenue, mk_rank, fingerprints=None):
+        """
+        スナップショットを保存し、保持ポリシーを適用する
+        inputs: {名前: DataFrame} の正規化済み入力データ（None のものは保存しない）
+        全てのファイルを一時ディレクトリに書き終えてから処理月のディレクトリと差し替えるため、
+        読み手が書きかけの状態を見ることはなく、同じ月を同時に保存した場合も一方の保存だけが残る
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_id = uuid.uuid4().hex
+        tables = {name: df for name, df in inputs.items() if df is not None}
+        tables[RESULTS_NAME] = results
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "snapshot_id": snapshot_id,
+            "year": year,
+            "month": month,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "rows": len(results),
+            "total_revenue": total_revenue,
+            "mk_rank": mk_rank,
+            "tables": sorted(tables),
+            "fingerprints": fingerprints or {},
+        }
+        # 一時ディレクトリは "." で始まるため、処理月の一覧（_months）には含まれない
+        tmp_dir = tempfile.mkdtemp(dir=self.directory, prefix=f".{year}{month:02d}-")
+        try:
+            for name, df in tables.items():
+                _write_table(os.path.join(tmp_dir, f"{name}.feather"), df, snapshot_id)
+            with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            self._replace_dir(tmp_dir, self._month_dir(year, month))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.apply_retention()
+
+    def _replace_dir(self, tmp_dir, month_dir):
+        """書き終えた tmp_dir を month_dir に差し替える（既存のディレクトリは退避してから削除する）"""
+        for _ in range(REPLACE_ATTEMPTS):
+            old_dir = tmp_dir + ".old"
+            moved = False
+            try:
+                if os.path.isdir(month_dir):
+                    os.rename(month_dir, old_dir)
+                    moved = True
+                os.rename(tmp_dir, month_dir)
+                return
+            except OSError:
+                # 他の保存が同時に差し替えた（退避する前に消えた・差し替えた後に作られた）場合はやり直す
+                continue
+            finally:
+                if moved:
+                    shutil.rmtree(old_dir, ignore_errors=True)
+        raise OSError(f"スナップショットを差し替えられませんでした: {month_dir}")
+
+    def meta(self, year, month):
+        """保存済みスナップショットのメタ情報を返す。無い・読めない・形式が古い場合は None"""
+        try:
+            with open(os.path.join(self._month_dir(year, month), META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("version") == SNAPSHOT_VERSION else None
+
+    def load(self, year, month, name=RESULTS_NAME, meta=None):
+        """
+        保存済みのテーブル（既定は結果リスト）を返す。無い・読めない場合は None
+        meta: 先に読んだメタ情報（指定した場合は、その保存のテーブルでなければ None）
+        """
+        meta = meta or self.meta(year, month)
+        if meta is None or name not in meta["tables"]:
+            return None
+        try:
+            df, snapshot_id = _read_table(os.path.join(self._month_dir(year, month), f"{name}.feather"))
+        except (OSError, pa.ArrowInvalid):
+            return None
+        # メタ情報を読んだ後に別の保存で差し替えられた場合は、組み合わせずに None を返す
+        # （保存ID を記録する前に保存したスナップショットは、テーブル・メタ情報とも "" として扱う）
+        if snapshot_id != meta.get("snapshot_id", ""):
+            return None
+        return df if name != RESULTS_NAME or len(df) == meta["rows"] else None
+
+    def entries(self):
+        """保存済みスナップショットの一覧表（処理月の新しい順）"""
+        rows = []
+        for year, month in self._months():
+            meta = self.meta(year, month)
+            if meta is None:
+                continue
+            rows.append({
+                "処理月": f"{year}-{month:02d}",
+                "作成日時": meta["created_at"],
+                "件数": meta["rows"],
+                "MKランク": meta["mk_rank"],
+                "サイズ(KB)": round(self._size(year, month) / 1024),
+            })
+        return pd.DataFrame(rows, columns=["処理月", "作成日時", "件数", "MKランク", "サイズ(KB)"])
+
+    def purge(self, year, month):
+        """指定した処理月のスナップショットを削除する"""
+        shutil.rmtree(self._month_dir(year, month), ignore_errors=True)
+
+    def apply_retention(self):
+        """処理月の新しい順に keep_months 件を残し、それより古いスナップショットを削除する"""
+        for year, month in self._months()[self.keep_months:]:
+            self.purge(year, month)
+
+    def _months(self):
+        """保存済みの処理月 [(year, month)]（新しい順）"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        months = [(int(name[:4]), int(name[4:])) for name in names if len(name) == 6 and name.isdigit()]
+        return sorted(months, reverse=True)
+
+    def _size(self, year, month):
+        month_dir = self._month_dir(year, month)
+        total = 0
+        try:
+            names = os.listdir(month_dir)
+        except OSError:
+            return 0
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(month_dir, name))
+            except OSError:
+                pass
+        return total
+
+
+# プロセス内で共有する既定の保存先
+snapshot_store = SnapshotStore()
@@ -0,0 +1,99 @@
+"""
+パース済みCSVのプロセス内共有キャッシュ
+
+Streamlit の全セッションは同じプロセスで動くため、月初に複数の担当者が同時にボタンを押すと、
+同じ6つのCSVを担当者の数だけダウンロード・パースすることになる。これを次の2つで1回にまとめる。
+- 同時実行の集約（single-flight）: 同じソースの読み込みが実行中の場合は、新たに取得せずその結果を待つ
+- パース済みの DataFrame の共有: 本文の指紋（SHA-256）が同じ場合は、パースせずに保存済みの DataFrame を使う
+
+サーバーへの条件付きGETは読み込みのたびに行うため、「常に最新データ」の方針は維持される
+（サーバー側で更新されていれば本文の指紋が変わり、パースし直す）。
+共有する DataFrame は読み取り専用として扱うこと（呼び出し側で変更しない）。
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+
+# --- 定数（キャッシュ設定） ---
+# 保持するパース済み DataFrame の合計サイズの上限（超えた場合は最終利用が古いものから削除）
+SOURCE_CACHE_MAX_BYTES = int(os.environ.get("SR_SUMMARY_SOURCE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+class SourceCache:
+    """ソース（URL と読み込み方）ごとのパース済み DataFrame と、実行中の読み込みの一覧"""
+
+    def __init__(self, max_bytes=SOURCE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # {キー: (本文の指紋, 文字コード, DataFrame, バイト数)}（最終利用が古い順）
+        self._entries = OrderedDict()
+        # {キー: Future}（実行中の読み込み）
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def single_flight(self, key, load, waiting=nullcontext):
+        """
+        load() を実行して結果を返す。同じ key の load() が実行中の場合は、実行せずにその結果（例外を含む）を待つ
+        waiting: 結果を待つ間に使うコンテキストマネージャーを返す関数（待ち時間の計測用）
+        戻り値: (load() の結果, 他の読み込みの結果を共有したか)
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+        if not leader:
+            with waiting():
+                return future.result(), True
+        try:
+            result = load()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def get(self, key, sha256):
+        """本文の指紋が sha256 のパース済み DataFrame を (DataFrame, 文字コード) で返す。無い・指紋が異なる場合は None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != sha256:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2], entry[1]
+
+    def put(self, key, sha256, encoding, df):
+        """パース済み DataFrame を保存する（同じキーの古い内容は差し替え、上限を超えた分は古いものから削除）"""
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (sha256, encoding, df, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[3]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# プロセス内（Streamlit の全セッション）で共有する既定のキャッシュ
+source_cache = SourceCache()
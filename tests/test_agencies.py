@@ -0,0 +1,20 @@
+from agencies import agency_file_names, liver_lists_digest, parse_liver_lists
+
+
+def test_agency_file_names_are_unique():
+    file_names = agency_file_names(["A B", "A_B", "A/B", "A_B_2", "C"], 2024, 5)
+    assert len(set(file_names.values())) == 5
+    assert file_names["A B"] == "A_B_showroom_liver_sales_estimate_202405.csv"
+    assert file_names["A_B"] == "A_B_2_showroom_liver_sales_estimate_202405.csv"
+    # "_2" を付けた名前がさらに重なる場合は次の番号にする
+    assert file_names["A_B_2"] == "A_B_2_2_showroom_liver_sales_estimate_202405.csv"
+    assert file_names["C"] == "C_showroom_liver_sales_estimate_202405.csv"
+
+
+def test_liver_lists_digest_depends_on_names_and_contents():
+    url = {"A": "https://example.com/a.csv"}
+    assert liver_lists_digest(url) == liver_lists_digest(parse_liver_lists("A,https://example.com/a.csv"))
+    assert liver_lists_digest(url) != liver_lists_digest({"B": "https://example.com/a.csv"})
+    assert liver_lists_digest({"A": b"1,x\n"}) != liver_lists_digest({"A": b"1,y\n"})
+    # URL と、同じ文字列をアップロードした内容は区別する
+    assert liver_lists_digest(url) != liver_lists_digest({"A": b"https://example.com/a.csv"})
@@ -0,0 +1,27 @@
+import logging
+import os
+
+import batch
+
+
+def _run_month(year, month, out_dir, *args):
+    """2月だけ失敗する run_month の代わり"""
+    if month == 2:
+        raise ValueError("boom")
+    return year, month, os.path.join(out_dir, f"{year}{month:02d}.csv"), 1, [("info", "done")]
+
+
+def test_run_batch_continues_after_failed_month(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(batch, "run_month", _run_month)
+    with caplog.at_level(logging.INFO, logger="batch"):
+        outputs = batch.run_batch([(2024, 1), (2024, 2), (2024, 3)], str(tmp_path), workers=2)
+    assert outputs == {
+        (2024, 1): os.path.join(str(tmp_path), "202401.csv"),
+        (2024, 2): None,
+        (2024, 3): os.path.join(str(tmp_path), "202403.csv"),
+    }
+    assert "[2024-02] 処理に失敗しました: boom" in caplog.text
+
+
+def test_month_range():
+    assert batch.month_range((2024, 11), (2025, 2)) == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+import pytest
+
+from engine import (
+    INDIVIDUAL_RANK_THRESHOLDS, PAID_LIVE_RATE, RANK_RATES, TIME_CHARGE_RATE,
+    calculate_paid_live_payment_estimate, calculate_payment_estimate, calculate_time_charge_payment_estimate,
+    compute_fixed_rate_estimates, compute_individual_ranks, compute_payment_estimates, get_individual_rank,
+)
+
+# 数値にできない値・エラー表記・特殊な数値の表記（float() が受け付けるものを含む）
+SPECIAL_VALUES = [
+    "#N/A", "", " ", "#ERROR", "abc", "1,000", "１２３", "1e3", " 42 ", "-5", "-0", "0", "+7", "1_000",
+    "nan", "NaN", "inf", "-inf", "Infinity", "1e400", "-1e400", "0x10", "12.5", "-0.5", "9" * 30,
+]
+
+
+def _ties(rate, count=20):
+    """(分配額 * 1.08 * rate) / 1.10 * 1.10 が ちょうど x.5 になる整数の分配額（四捨五入の偶数丸めの確認用）"""
+    ties = []
+    amount = 1
+    while len(ties) < count and amount < 10 ** 6:
+        estimate = (amount * 1.08 * rate) / 1.10 * 1.10
+        if estimate - math.floor(estimate) == 0.5:
+            ties.append(str(amount))
+        amount += 1
+    return ties
+
+
+def _scalar_fixed_rate(scalar, value):
+    """
+    1件ずつの関数の結果（無限大の分配額は round() が OverflowError を送出して処理が止まるため、
+    列版と同じく #ERROR_CALC として比べる）
+    """
+    try:
+        return scalar(value)
+    except OverflowError:
+        return "#ERROR_CALC"
+
+
+def _random_amounts(seed, size=5000):
+    """ランクのしきい値の前後・小数・特殊な値・ちょうど x.5 になる値を含む分配額の配列"""
+    rng = np.random.default_rng(seed)
+    thresholds = np.array(INDIVIDUAL_RANK_THRESHOLDS)
+    near = (rng.choice(thresholds, size) + rng.integers(-2, 3, size)).astype(str)
+    integers = rng.integers(-1000, 2_000_000, size).astype(str)
+    decimals = np.round(rng.uniform(-100, 1_000_000, size), 2).astype(str)
+    specials = rng.choice(np.array(SPECIAL_VALUES, dtype=object), size)
+    ties = rng.choice(np.array(_ties(PAID_LIVE_RATE) + _ties(RANK_RATES["C"][5]), dtype=object), size)
+    pools = np.stack([near.astype(object), integers.astype(object), decimals.astype(object), specials, ties])
+    values = pools[rng.integers(0, len(pools), size), np.arange(size)]
+    # 文字列以外の値（欠損・数値）も混ぜる
+    values[rng.random(size) < 0.02] = np.nan
+    values[rng.random(size) < 0.02] = 123.5
+    return values
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_individual_ranks_match_scalar(seed):
+    values = _random_amounts(seed)
+    expected = [get_individual_rank(value) for value in values]
+    assert compute_individual_ranks(values).tolist() == expected
+
+
+@pytest.mark.parametrize("mk_rank", range(13))
+def test_payment_estimates_match_scalar(mk_rank):
+    values = _random_amounts(mk_rank)
+    ranks, estimates = compute_payment_estimates(values, mk_rank)
+    expected_ranks = [get_individual_rank(value) for value in values]
+    expected = [calculate_payment_estimate(rank, mk_rank, value) for rank, value in zip(expected_ranks, values)]
+    assert ranks.tolist() == expected_ranks
+    assert estimates.tolist() == expected
+
+
+@pytest.mark.parametrize("rate, scalar", [
+    (PAID_LIVE_RATE, calculate_paid_live_payment_estimate),
+    (TIME_CHARGE_RATE, calculate_time_charge_payment_estimate),
+])
+@pytest.mark.parametrize("seed", range(3))
+def test_fixed_rate_estimates_match_scalar(rate, scalar, seed):
+    values = _random_amounts(seed)
+    assert compute_fixed_rate_estimates(values, rate).tolist() == [_scalar_fixed_rate(scalar, value) for value in values]
+
+
+def test_half_even_ties():
+    # 0.5 ちょうどは偶数側に丸める（round() と同じ）
+    ties = _ties(PAID_LIVE_RATE)
+    assert ties
+    expected = [calculate_paid_live_payment_estimate(value) for value in ties]
+    assert compute_fixed_rate_estimates(np.array(ties, dtype=object), PAID_LIVE_RATE).tolist() == expected
+    assert all(int(value) % 2 == 0 for value in expected)
+
+
+def test_empty_input():
+    ranks, estimates = compute_payment_estimates(np.array([], dtype=object), 1)
+    assert len(ranks) == len(estimates) == 0
+    assert len(compute_fixed_rate_estimates(np.array([], dtype=object), PAID_LIVE_RATE)) == 0
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from bench.server import Faults, serve
+from fetch import HttpCache, atomic_write, fetch
+from http_client import HttpClient
+
+SIZE = 4096
+
+
+def _body(name, size=SIZE):
+    return (name.encode() * size)[:size]
+
+
+@pytest.fixture
+def directory(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    for name in ("a", "b", "c"):
+        (served / f"{name}.csv").write_bytes(_body(name))
+    return str(served)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path / "cache"))
+
+
+def _client():
+    return HttpClient(sleep=lambda seconds: None)
+
+
+def _leftovers(cache):
+    return [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_not_modified_reuses_cached_body(directory, cache):
+    faults = Faults()
+    with serve(directory, faults) as base_url:
+        url = base_url + "/a.csv"
+        first = fetch(url, cache=cache, client=_client())
+        second = fetch(url, cache=cache, client=_client())
+    assert first.status == 200 and not first.from_cache
+    assert second.status == 304 and second.from_cache
+    assert second.body == first.body == _body("a") and second.etag == first.etag
+    assert faults.counts["requests"] == 2
+
+
+def test_unreadable_cached_body_is_fetched_again(directory, cache):
+    with serve(directory) as base_url:
+        url = base_url + "/a.csv"
+        fetch(url, cache=cache, client=_client())
+        body_path, _ = cache._paths(url)
+        with open(body_path, "wb") as f:
+            f.write(b"broken")
+        # 304 でも保存済みの本文がメタ情報と一致しない場合は、条件なしで取り直す
+        result = fetch(url, cache=cache, client=_client())
+    assert result.status == 200 and not result.from_cache and result.body == _body("a")
+    assert cache.read_body(url, cache.lookup(url)) == _body("a")
+
+
+def test_changed_file_replaces_cache_entry(directory, cache):
+    path = os.path.join(directory, "a.csv")
+    with serve(directory) as base_url:
+        url = base_url + "/a.csv"
+        first = fetch(url, cache=cache, client=_client())
+        old_meta = cache.lookup(url)
+        with open(path, "ab") as f:
+            f.write(b"added\n")
+        second = fetch(url, cache=cache, client=_client())
+        third = fetch(url, cache=cache, client=_client())
+    assert second.status == 200 and second.body == first.body + b"added\n" and second.etag != first.etag
+    assert third.status == 304 and third.body == second.body
+    # 本文とメタ情報は揃って差し替わり、古いメタ情報では読めない・一時ファイルも残らない
+    assert cache.read_body(url, old_meta) is None
+    assert cache.lookup(url)["etag"] == second.etag
+    assert _leftovers(cache) == []
+
+
+def test_atomic_write_keeps_previous_content_on_failure(cache, monkeypatch):
+    os.makedirs(cache.directory)
+    path = os.path.join(cache.directory, "entry.body")
+    atomic_write(path, b"old")
+
+    def fail(src, dst):
+        raise OSError("replace failed")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        atomic_write(path, b"new")
+    with open(path, "rb") as f:
+        assert f.read() == b"old"
+    assert _leftovers(cache) == []
+
+
+def test_evicts_least_recently_used_over_size_limit(directory, tmp_path):
+    cache = HttpCache(str(tmp_path / "cache"), max_bytes=SIZE * 2)
+    with serve(directory) as base_url:
+        urls = {name: f"{base_url}/{name}.csv" for name in ("a", "b", "c")}
+        for name in ("a", "b"):
+            fetch(urls[name], cache=cache, client=_client())
+        # a の方が先に保存されたものとする
+        for seconds, name in ((1000, "a"), (2000, "b")):
+            body_path, _ = cache._paths(urls[name])
+            os.utime(body_path, (seconds, seconds))
+        # 304 で再利用した a は最終利用が新しくなり、c の保存で上限を超えた分は b から削除する
+        assert fetch(urls["a"], cache=cache, client=_client()).from_cache
+        fetch(urls["c"], cache=cache, client=_client())
+    assert cache.lookup(urls["b"]) is None
+    assert not os.path.exists(cache._paths(urls["b"])[0])
+    for name in ("a", "c"):
+        assert cache.read_body(urls[name], cache.lookup(urls[name])) == _body(name)
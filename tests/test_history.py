@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import PAID_LIVE_RATE, TIME_CHARGE_RATE, fixed_rate_estimate_values, payment_estimate_values
+from history import HistoryIndex
+from result_model import amount_columns, estimate_columns, flag_categorical, rank_columns, render
+
+
+def _results(rows, mk_rank=1):
+    """[(ルームID, 愛称, ルーム売上分配額, プレミアムライブ分配額, 配信有無, 管理対象)] から型付きの結果リストを作る"""
+    room_ids, aliases, sales, paid_live, streamed, managed = (np.array(column, dtype=object) for column in zip(*rows))
+    rank_index, rank_status, estimates, status = payment_estimate_values(sales, mk_rank)
+    columns = {
+        "ルームID": room_ids,
+        "ライバー愛称": aliases,
+        "管理対象": flag_categorical("管理対象", managed.astype(bool)),
+        "配信有無": flag_categorical("配信有無", streamed.astype(bool)),
+    }
+    columns.update(amount_columns("R分配額", sales))
+    columns.update(rank_columns(rank_index, rank_status))
+    columns.update(estimate_columns("R支払想定額", estimates, status))
+    columns.update(amount_columns("PL分配額", paid_live))
+    columns.update(estimate_columns("PL支払想定額", *fixed_rate_estimate_values(paid_live, PAID_LIVE_RATE)))
+    columns.update(estimate_columns("TC支払想定額", *fixed_rate_estimate_values(np.full(len(rows), ""), TIME_CHARGE_RATE)))
+    return pd.DataFrame(columns)
+
+
+@pytest.fixture
+def index(tmp_path):
+    return HistoryIndex(path=str(tmp_path / "history.sqlite3"))
+
+
+def test_history_matches_rendered_results(index):
+    results = _results([
+        ("r1", "Alice", "50000", "1000", True, True),
+        ("r2", "Bob", "#N/A", "", False, False),
+        ("r3", "Carol", "abc", "#N/A", True, True),
+    ])
+    index.add_month(2024, 5, results)
+    rendered = render(results).set_index("ルームID")
+    for room_id in ("r1", "r2", "r3"):
+        row = index.history(room_id).iloc[0]
+        assert row["処理月"] == "2024-05"
+        for column in ("ライバー愛称", "個別ランク", "R分配額", "R支払想定額", "PL分配額", "PL支払想定額", "TC支払想定額",
+                       "配信有無", "管理対象"):
+            assert row[column] == rendered.loc[room_id, column], column
+
+
+def test_history_is_newest_first_and_filters_months(index):
+    for month, sales in ((3, "10000"), (4, "50000"), (5, "100000")):
+        index.add_month(2024, month, _results([("r1", "Alice", sales, "", True, True)]))
+    assert index.history("r1")["処理月"].tolist() == ["2024-05", "2024-04", "2024-03"]
+    assert index.history("r1", months=[(2024, 5), (2024, 3)])["R分配額"].tolist() == ["100000", "10000"]
+    assert index.indexed_months() == [(2024, 5), (2024, 4), (2024, 3)]
+
+
+def test_add_month_replaces_month(index):
+    index.add_month(2024, 5, _results([("r1", "Alice", "10000", "", True, True), ("r2", "Bob", "1", "", True, True)]))
+    index.add_month(2024, 5, _results([("r1", "Alice", "20000", "", True, True)]))
+    assert index.history("r1")["R分配額"].tolist() == ["20000"]
+    assert index.history("r2").empty
+
+
+def test_retention_drops_oldest_months(tmp_path):
+    index = HistoryIndex(path=str(tmp_path / "history.sqlite3"), keep_months=2)
+    for month in (1, 2, 3):
+        index.add_month(2024, month, _results([("r1", f"name{month}", "1", "", True, True)]))
+    assert index.indexed_months() == [(2024, 3), (2024, 2)]
+    assert index.search("name1").empty
+
+
+def test_search_by_room_and_account_id_without_alias(index):
+    results = _results([("r1", np.nan, "1", "", True, True), ("r2", "", "1", "", True, True)])
+    accounts = pd.DataFrame({"account_id": ["a1", "a2", "a3"], "room_id": ["r1", "r2", "r9"]})
+    index.add_month(2024, 5, results, accounts)
+    assert index.search("r1").values.tolist() == [["r1", ""]]
+    assert index.search("a2").values.tolist() == [["r2", ""]]
+    # 結果リストに無いルームのアカウントは記録しない
+    assert index.search("a3").empty
+
+
+def test_search_lists_aliases_newest_first(index):
+    index.add_month(2024, 3, _results([("r1", "Old_name", "1", "", True, True)]))
+    index.add_month(2024, 5, _results([("r1", "New 100%", "1", "", True, True)]))
+    index.add_month(2024, 4, _results([("r1", "Middle", "1", "", True, True), ("r2", "Other", "1", "", True, True)]))
+    assert index.search("r1").values.tolist() == [["r1", "New 100% / Middle / Old_name"]]
+    # % と _ はそのままの文字として部分一致させる
+    assert index.search("100%")["ルームID"].tolist() == ["r1"]
+    assert index.search("d_n")["ルームID"].tolist() == ["r1"]
+    assert index.search("dxn").empty
+    assert index.search("e", limit=1)["ルームID"].tolist() == ["r1"]
+    assert index.search("  ").empty
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from bench.server import Faults, serve
+from fetch import HttpCache, fetch
+from http_client import HttpClient, HttpError
+
+BODY = b"".join(b"%d,room%d,%d\n" % (i, i, i * 7) for i in range(20000))
+
+
+@pytest.fixture
+def directory(tmp_path):
+    (tmp_path / "data.csv").write_bytes(BODY)
+    return str(tmp_path)
+
+
+def _client(retries=3):
+    # 再試行の間は待たない
+    return HttpClient(retries=retries, sleep=lambda seconds: None)
+
+
+def test_retries_5xx(directory):
+    faults = Faults(error_rate=1, every=2)
+    with serve(directory, faults) as base_url:
+        response = _client().request("GET", base_url + "/data.csv")
+    assert response.status == 200 and response.body == BODY
+    assert response.attempts == 2
+    assert faults.counts["error"] == 1
+
+
+def test_gives_up_after_retries(directory):
+    faults = Faults(error_rate=1)
+    with serve(directory, faults) as base_url, pytest.raises(HttpError) as raised:
+        _client(retries=2).request("GET", base_url + "/data.csv")
+    assert raised.value.status == 503
+    assert faults.counts["requests"] == 3
+
+
+def test_retries_reset_connection(directory):
+    faults = Faults(reset_rate=1, every=2)
+    with serve(directory, faults) as base_url:
+        response = _client().request("GET", base_url + "/data.csv")
+    assert response.body == BODY and response.attempts == 2
+
+
+def test_resumes_truncated_body_with_range(directory):
+    faults = Faults(truncate_rate=1, every=2, compress=False)
+    with serve(directory, faults) as base_url:
+        response = _client().request("GET", base_url + "/data.csv")
+    assert response.status == 200 and response.body == BODY
+    assert response.resumed == 1 and response.attempts == 2
+
+
+def test_restarts_truncated_body_without_range_support(directory):
+    faults = Faults(truncate_rate=1, every=2, compress=False, ranges=False)
+    with serve(directory, faults) as base_url:
+        response = _client().request("GET", base_url + "/data.csv")
+    assert response.body == BODY and response.resumed == 0
+
+
+def test_restarts_truncated_compressed_body(directory):
+    faults = Faults(truncate_rate=1, every=2)
+    with serve(directory, faults) as base_url:
+        response = _client().request("GET", base_url + "/data.csv")
+    assert response.body == BODY and response.resumed == 0 and response.attempts == 2
+
+
+def test_restarts_when_file_changed_before_resume(directory):
+    faults = Faults(truncate_rate=1, every=2, compress=False)
+    path = os.path.join(directory, "data.csv")
+    client = _client()
+    original_sleep = client._sleep
+
+    def change_file(seconds):
+        # 続きを取得する前にファイルが更新された（If-Range が一致せず、最初から返される）
+        with open(path, "ab") as f:
+            f.write(b"added\n")
+        original_sleep(seconds)
+
+    client._sleep = change_file
+    with serve(directory, faults) as base_url:
+        response = client.request("GET", base_url + "/data.csv")
+    assert response.body == BODY + b"added\n"
+
+
+def test_fetch_uses_cache_and_reports_attempts(directory, tmp_path):
+    cache = HttpCache(str(tmp_path / "cache"))
+    with serve(directory, Faults(error_rate=1, every=2)) as base_url:
+        first = fetch(base_url + "/data.csv", cache=cache, client=_client())
+        second = fetch(base_url + "/data.csv", cache=cache, client=_client())
+    assert first.body == second.body == BODY
+    assert first.attempts == 2 and not first.from_cache
+    assert second.status == 304 and second.from_cache
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental import AFFECTED_COLUMNS, ALL_REVENUES, update_results
+from pipeline import ACCOUNT_ID, ALIAS, AMOUNT, ROOM_ID, build_results, join_sources
+
+MK_RANK = 5
+ROOMS = np.array([f"r{i}" for i in range(60)], dtype=object)
+ACCOUNTS = np.array([f"a{i}" for i in range(80)], dtype=object)
+
+
+def _revenue(rng, size):
+    amounts = rng.choice(np.array(["#N/A", "", "abc", "0"] + [str(v) for v in rng.integers(1, 2_000_000, 20)]), size)
+    return pd.DataFrame({ACCOUNT_ID: rng.choice(ACCOUNTS, size), AMOUNT: amounts.astype(object)})
+
+
+def _random_inputs(seed):
+    """{ソースのキー: 正規化済みの入力} （ソースのキーは incremental.AFFECTED_COLUMNS と同じ）"""
+    rng = np.random.default_rng(seed)
+    return {
+        "liver": pd.DataFrame({ROOM_ID: rng.choice(ROOMS, 30, replace=False), ALIAS: [f"name{i}" for i in range(30)]}),
+        "kpi": rng.choice(ROOMS, 25, replace=False),
+        "room_list": pd.DataFrame({ACCOUNT_ID: rng.choice(ACCOUNTS, 50, replace=False), ROOM_ID: rng.choice(ROOMS, 50)}),
+        "sales": _revenue(rng, 40),
+        "paid_live": _revenue(rng, 15),
+        "time_charge": _revenue(rng, 10),
+    }
+
+
+def _changed(inputs, key, seed):
+    """key のソースだけを別の内容に差し替えた入力"""
+    rng = np.random.default_rng(seed + 1000)
+    changed = dict(inputs)
+    if key == "liver":
+        liver = inputs["liver"]
+        # 一部のルームを削除し、新しいルームを追加して、愛称も変える
+        kept = liver.iloc[rng.permutation(len(liver))[:20]]
+        added_ids = rng.choice(np.setdiff1d(ROOMS, liver[ROOM_ID]).astype(object), 8, replace=False)
+        added = pd.DataFrame({ROOM_ID: added_ids, ALIAS: [f"new{i}" for i in range(8)]})
+        changed["liver"] = pd.concat([kept, added]).sample(frac=1, random_state=seed).reset_index(drop=True)
+        changed["liver"].loc[0, ALIAS] = "renamed"
+    else:
+        changed[key] = _random_inputs(seed + 1000)[key]
+    return changed
+
+
+def _build(inputs):
+    """pipeline.summarize と同じく、入力から build(liver_rows, revenue_keys) を作る"""
+    room_accounts = inputs["room_list"]
+
+    def build(liver_rows, revenue_keys):
+        joined = join_sources(
+            liver_rows, room_accounts[ROOM_ID].unique(), room_accounts, inputs["kpi"],
+            {key: inputs[key] for key in revenue_keys},
+        )
+        return build_results(joined, MK_RANK, "2024/05", "2024/06")
+
+    return build
+
+
+def _fingerprints(version, changed_key=None):
+    return {key: f"{key}-{version + (key == changed_key)}" for key in AFFECTED_COLUMNS}
+
+
+@pytest.mark.parametrize("key", list(AFFECTED_COLUMNS))
+@pytest.mark.parametrize("seed", range(5))
+def test_update_matches_full_recompute(key, seed):
+    inputs = _random_inputs(seed)
+    previous = (_fingerprints(0), _build(inputs)(inputs["liver"], ALL_REVENUES))
+    changed = _changed(inputs, key, seed)
+    build = _build(changed)
+
+    results, plan = update_results(previous, _fingerprints(0, key), changed["liver"], build)
+    assert not plan.full and plan.changed_sources == [key]
+    pd.testing.assert_frame_equal(results, build(changed["liver"], ALL_REVENUES))
+    if key == "liver":
+        assert plan.added_rows == 8 and plan.removed_rows == 10 and plan.reused_rows == 20
+
+
+def test_unchanged_sources_reuse_previous_results():
+    inputs = _random_inputs(0)
+    build = _build(inputs)
+    previous_results = build(inputs["liver"], ALL_REVENUES)
+    results, plan = update_results((_fingerprints(0), previous_results), _fingerprints(0), inputs["liver"], build)
+    assert not plan.changed_sources and plan.reused_rows == len(inputs["liver"])
+    pd.testing.assert_frame_equal(results, previous_results)
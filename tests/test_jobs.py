@@ -0,0 +1,70 @@
+import threading
+
+from jobs import CANCELLED, DONE, AgencyJob, Job, JobRegistry
+
+
+class _BlockingJob(Job):
+    """release が設定されるまで終わらないジョブ（集計処理は行わない）"""
+    kind = "test"
+    release = threading.Event()
+
+    def _execute(self):
+        self.release.wait(5)
+        with self.recorder.stage("load"):
+            pass
+        return True
+
+
+def test_start_returns_running_job_without_starting_new():
+    registry = JobRegistry()
+    _BlockingJob.release.clear()
+    job, started = registry.start(2024, 5, job_class=_BlockingJob)
+    assert started
+    # 実行中は force=True でも新たに開始せず、開始しなかったことを返す
+    again, started = registry.start(2024, 5, force=True, job_class=_BlockingJob)
+    assert again is job and not started
+    _BlockingJob.release.set()
+    job.join(5)
+    assert job.status == DONE
+
+    rerun, started = registry.start(2024, 5, force=True, job_class=_BlockingJob)
+    assert started and rerun is not job and rerun.force
+    rerun.join(5)
+    assert registry.get(2024, 5, job_class=_BlockingJob) is rerun
+
+
+def test_cancel_stops_at_next_stage():
+    registry = JobRegistry()
+    _BlockingJob.release.clear()
+    job, _ = registry.start(2024, 6, job_class=_BlockingJob)
+    job.cancel()
+    _BlockingJob.release.set()
+    job.join(5)
+    assert job.status == CANCELLED
+
+
+class _BlockingAgencyJob(AgencyJob):
+    release = threading.Event()
+
+    def _execute(self):
+        self.release.wait(5)
+        return True
+
+
+def test_agency_jobs_are_keyed_by_liver_lists():
+    registry = JobRegistry()
+    _BlockingAgencyJob.release.clear()
+    own = {"A": "https://example.com/a.csv", "B": b"1,x\n"}
+    other = {"A": "https://example.com/a.csv", "B": b"2,y\n"}
+    job, started = registry.start(2024, 5, job_class=_BlockingAgencyJob, liver_lists=own)
+    # 指定が異なる一括作成は、実行中のジョブに合流せず別のジョブとして開始する
+    other_job, other_started = registry.start(2024, 5, job_class=_BlockingAgencyJob, liver_lists=other)
+    assert started and other_started and other_job is not job
+    same, same_started = registry.start(2024, 5, job_class=_BlockingAgencyJob, liver_lists=dict(own))
+    assert same is job and not same_started
+    _BlockingAgencyJob.release.set()
+    for started_job in (job, other_job):
+        started_job.join(5)
+    assert registry.get(2024, 5, job_class=_BlockingAgencyJob, liver_lists=own) is job
+    assert registry.get(2024, 5, job_class=_BlockingAgencyJob, liver_lists=other) is other_job
+    assert registry.get(2024, 5, job_class=_BlockingAgencyJob, liver_lists={"C": b""}) is None
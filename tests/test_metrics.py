@@ -0,0 +1,33 @@
+import numpy as np
+
+from metrics import RunRecorder
+
+
+def test_prometheus_values_are_not_rounded():
+    recorder = RunRecorder(2024, 5)
+    with recorder.stage("export", rows=np.int64(200001), nbytes=123456789) as stage:
+        pass
+    stage.duration_s = 1.23456789
+    text = recorder.to_prometheus()
+    assert 'sr_summary_stage_bytes{month="2024-05",stage="export"} 123456789\n' in text
+    assert 'sr_summary_stage_rows{month="2024-05",stage="export"} 200001\n' in text
+    assert 'sr_summary_stage_duration_seconds{month="2024-05",stage="export"} 1.23456789\n' in text
+    assert "e+" not in text
+
+
+def test_peak_rss_of_overlapping_runs_is_marked_shared():
+    first, second = RunRecorder(2024, 5), RunRecorder(2024, 6)
+    with first.stage("load") as outer:
+        # 同じ実行の並列のステージは概算にしない
+        with first.stage("parse") as inner:
+            pass
+        with second.stage("load") as other:
+            pass
+    with first.stage("results") as alone:
+        pass
+    assert not inner.peak_rss_shared and not alone.peak_rss_shared
+    assert outer.peak_rss_shared and other.peak_rss_shared
+    assert "概算" in first.table().set_index("ステージ").loc["load", "備考"]
+    text = first.to_prometheus()
+    assert 'sr_summary_stage_peak_rss_bytes{month="2024-05",stage="results"}' in text
+    assert 'sr_summary_stage_peak_rss_bytes{month="2024-05",stage="load"}' not in text
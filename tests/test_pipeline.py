@@ -0,0 +1,18 @@
+import pandas as pd
+
+from pipeline import ACCOUNT_ID, ALIAS, AMOUNT, ROOM_ID, MonthlySummary, build_results, join_sources
+
+
+def _summary():
+    liver = pd.DataFrame({ROOM_ID: ["r1", "r2", "r3"], ALIAS: ["Alice", "Bob", "Carol"]})
+    room_accounts = pd.DataFrame({ACCOUNT_ID: ["a1", "a2", "a3"], ROOM_ID: ["r1", "r2", "r3"]})
+    revenues = {"sales": pd.DataFrame({ACCOUNT_ID: ["a1", "a3"], AMOUNT: ["50000", "1000"]})}
+    joined = join_sources(liver, ["r1", "r2"], room_accounts, ["r1", "r3"], revenues)
+    return MonthlySummary(2024, 5, build_results(joined, 3, "2024/05", "2024/06"), 0, 3)
+
+
+def test_result_view_and_simulator_are_built_once():
+    summary = _summary()
+    view, simulator = summary.result_view(), summary.simulator()
+    # 画面の再実行では同じ索引・シミュレーションを使う
+    assert summary.result_view() is view and summary.simulator() is simulator
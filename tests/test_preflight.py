@@ -0,0 +1,35 @@
+import datetime
+
+from bench.server import Faults, serve
+from fetch import HttpCache, fetch
+from preflight import FRESH, MISSING, STALE, UNKNOWN, JST, probe
+
+BODY = b"".join(b"%d,room%d\n" % (i, i) for i in range(20000))
+
+
+def test_probe_reports_uncompressed_size(tmp_path):
+    (tmp_path / "data.csv").write_bytes(BODY)
+    cache = HttpCache(str(tmp_path / "cache"))
+    past = datetime.datetime(2000, 1, 1, tzinfo=JST)
+    future = datetime.datetime.now(JST) + datetime.timedelta(days=1)
+    # 転送圧縮に対応したサーバーでも、サイズは圧縮前のファイルのサイズ
+    with serve(str(tmp_path), Faults(compress=True)) as base_url:
+        url = base_url + "/data.csv"
+        result = probe("sales", url, past, cache=cache)
+        assert result.verdict == FRESH and result.size == len(BODY) and result.changed is None
+        assert probe("sales", url, future, cache=cache).verdict == STALE
+        fetch(url, cache=cache)
+        assert probe("sales", url, past, cache=cache).changed is False
+        missing = probe("sales", base_url + "/none.csv", past, cache=cache)
+    assert missing.verdict == MISSING and missing.status == 404
+
+
+def test_probe_reports_unreachable_or_failing_server_as_unknown(tmp_path):
+    (tmp_path / "data.csv").write_bytes(BODY)
+    cache = HttpCache(str(tmp_path / "cache"))
+    since = datetime.datetime(2000, 1, 1, tzinfo=JST)
+    # 接続できない・5xx が続く場合はファイルの有無が分からないため、取得不可ではなく不明
+    assert probe("sales", "http://127.0.0.1:1/data.csv", since, timeout=1, cache=cache).verdict == UNKNOWN
+    with serve(str(tmp_path), Faults(error_rate=1)) as base_url:
+        result = probe("sales", base_url + "/data.csv", since, cache=cache)
+    assert result.verdict == UNKNOWN and result.status == 503
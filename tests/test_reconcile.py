@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline import ACCOUNT_ID, ALIAS, AMOUNT, ROOM_ID, join_sources
+from reconcile import REASON_NO_ACCOUNT, reconcile
+
+
+def _random_inputs(seed):
+    """空欄（NaN）のアカウントID・重複・未登録のアカウントを含む入力"""
+    rng = np.random.default_rng(seed)
+    pool = np.array([f"a{i}" for i in range(40)] + [np.nan], dtype=object)
+    rooms = np.array([f"r{i}" for i in range(30)], dtype=object)
+    room_accounts = pd.DataFrame({
+        ACCOUNT_ID: rng.choice(pool[:30].tolist() + [np.nan], 35),
+        ROOM_ID: rng.choice(rooms, 35),
+    })
+    revenues = {
+        source: pd.DataFrame({
+            ACCOUNT_ID: rng.choice(pool, size),
+            AMOUNT: rng.integers(1, 10000, size).astype(str).astype(object),
+        })
+        for source, size in (("sales", 60), ("paid_live", 20), ("time_charge", 10))
+    }
+    liver = pd.DataFrame({ROOM_ID: rng.choice(rooms, 20, replace=False), ALIAS: "x"})
+    return liver, room_accounts, revenues
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_reflected_amount_matches_join(seed):
+    liver, room_accounts, revenues = _random_inputs(seed)
+    result = reconcile(revenues, room_accounts, liver[ROOM_ID])
+    joined = join_sources(liver, room_accounts[ROOM_ID].unique(), room_accounts, [], revenues)
+    for source, row in zip(revenues, result.summary.to_dict("records")):
+        reflected = pd.to_numeric(joined[source], errors="coerce").sum()
+        assert row["結果に反映した金額"] == pytest.approx(reflected)
+        assert row["行数"] == len(revenues[source])
+
+
+def test_blank_account_id_does_not_fail():
+    revenues = {
+        "sales": pd.DataFrame({ACCOUNT_ID: ["a1", np.nan, "a2"], AMOUNT: ["10", "20", "30"]}),
+        "paid_live": None,
+        "time_charge": None,
+    }
+    room_accounts = pd.DataFrame({ACCOUNT_ID: ["a1", "a2", np.nan], ROOM_ID: ["r1", "r2", "r9"]})
+    result = reconcile(revenues, room_accounts, pd.Series(["r1", "r2"]))
+    # 空欄のアカウントIDは1つの値として扱い、実在のアカウントの紐づけを上書きしない
+    assert result.summary.loc[0, "結果に反映した金額"] == 40
+    assert result.orphans["ルームID"].tolist() == ["r9"]
+    assert REASON_NO_ACCOUNT not in result.orphans["理由"].tolist()
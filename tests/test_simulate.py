@@ -0,0 +1,27 @@
+import pytest
+
+from engine import INDIVIDUAL_RANK_THRESHOLDS
+from simulate import build_scenarios, parse_numbers, shift_thresholds
+
+
+@pytest.mark.parametrize("percent", [-100, -100.0, -150, float("nan")])
+def test_shift_thresholds_rejects_shift_at_or_below_minus_100(percent):
+    with pytest.raises(ValueError):
+        shift_thresholds(percent)
+    with pytest.raises(ValueError):
+        build_scenarios([1], [percent])
+
+
+@pytest.mark.parametrize("percent", [-99.999, -50, 0, 10, 300])
+def test_shifted_thresholds_keep_rank_order(percent):
+    thresholds = shift_thresholds(percent)
+    assert len(thresholds) == len(INDIVIDUAL_RANK_THRESHOLDS)
+    assert list(thresholds) == sorted(thresholds) and thresholds[0] >= 0
+
+
+def test_parse_numbers():
+    assert parse_numbers("-10, 10、2.5") == [-10.0, 10.0, 2.5]
+    assert parse_numbers(" ") == []
+    for text in ("abc", "1, nan", "inf"):
+        with pytest.raises(ValueError):
+            parse_numbers(text)
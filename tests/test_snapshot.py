@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from snapshot import SnapshotStore
+
+
+def _frame(value, rows=1000):
+    return pd.DataFrame({"ルームID": [f"r{i}" for i in range(rows)], "値": [value] * rows})
+
+
+def _save(store, value, year=2024, month=5):
+    store.save(year, month, _frame(value), {"liver": _frame(value), "paid_live": None}, 100.0 * value, value)
+
+
+def test_save_and_load(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    _save(store, 1)
+    meta = store.meta(2024, 5)
+    assert meta["rows"] == 1000 and meta["mk_rank"] == 1 and meta["tables"] == ["liver", "results"]
+    pd.testing.assert_frame_equal(store.load(2024, 5), _frame(1))
+    assert store.load(2024, 5, "paid_live") is None
+    assert store.load(2024, 6) is None
+
+
+def test_concurrent_saves_leave_one_consistent_snapshot(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda value: _save(store, value), range(1, 17)))
+    meta = store.meta(2024, 5)
+    # メタ情報・全てのテーブルが同じ保存のもの
+    for name in ("results", "liver"):
+        assert store.load(2024, 5, name)["値"].eq(meta["mk_rank"]).all()
+    # 一時ディレクトリ・退避したディレクトリは残らない
+    assert os.listdir(tmp_path) == ["202405"]
+
+
+def test_load_rejects_tables_of_another_save(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    _save(store, 1)
+    stale = store.meta(2024, 5)
+    _save(store, 2)
+    # 先に読んだメタ情報と、その後に差し替えられたテーブルは組み合わせない
+    assert store.load(2024, 5, meta=stale) is None
+    assert store.load(2024, 5)["値"].eq(2).all()
+
+
+def test_retention_keeps_newest_months(tmp_path):
+    store = SnapshotStore(str(tmp_path), keep_months=2)
+    for month in (1, 2, 3):
+        _save(store, month, month=month)
+    assert store.entries()["処理月"].tolist() == ["2024-03", "2024-02"]
+    store.purge(2024, 3)
+    assert store.meta(2024, 3) is None
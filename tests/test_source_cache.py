@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from source_cache import SourceCache
+
+
+def _concurrent(cache, key, load, count=8):
+    """count 個のスレッドから同時に single_flight(key, load) を呼び、結果（または例外）のリストを返す"""
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        try:
+            return cache.single_flight(key, load)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return list(executor.map(lambda _: call(), range(count)))
+
+
+def test_single_flight_runs_load_once():
+    cache = SourceCache()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        # 他のスレッドが待ちに入るまで終わらない
+        release.wait(5)
+        return "result"
+
+    threading.Timer(0.3, release.set).start()
+    results = _concurrent(cache, "key", load)
+    assert len(calls) == 1
+    assert [result for result, _ in results] == ["result"] * 8
+    assert sorted(shared for _, shared in results) == [False] + [True] * 7
+
+
+def test_single_flight_shares_exception_and_retries_afterwards():
+    cache = SourceCache()
+    calls = []
+    release = threading.Event()
+
+    def fail():
+        calls.append(1)
+        release.wait(5)
+        raise OSError("down")
+
+    threading.Timer(0.3, release.set).start()
+    results = _concurrent(cache, "key", fail)
+    assert len(calls) == 1
+    assert all(isinstance(result, OSError) for result in results)
+    # 失敗した読み込みは残らず、次の呼び出しで改めて実行する
+    assert cache.single_flight("key", lambda: "again") == ("again", False)
+
+
+def test_get_put_by_fingerprint_and_eviction():
+    df = pd.DataFrame({"a": ["x"] * 100})
+    nbytes = int(df.memory_usage(deep=True).sum())
+    cache = SourceCache(max_bytes=nbytes * 2)
+    cache.put("k1", "sha-1", "utf-8", df)
+    cached, encoding = cache.get("k1", "sha-1")
+    assert cached is df and encoding == "utf-8"
+    assert cache.get("k1", "sha-2") is None
+
+    cache.put("k2", "sha-1", "utf-8", df)
+    cache.get("k1", "sha-1")
+    cache.put("k3", "sha-1", "utf-8", df)
+    # 最終利用が古い k2 から削除する
+    assert cache.get("k2", "sha-1") is None
+    assert cache.get("k1", "sha-1") is not None
+    assert cache.total_bytes == nbytes * 2
+
+
+def test_put_skips_entry_larger_than_limit():
+    df = pd.DataFrame({"a": ["x"] * 100})
+    cache = SourceCache(max_bytes=int(df.memory_usage(deep=True).sum()) // 3)
+    cache.put("k", "sha", "utf-8", df)
+    assert len(cache) == 0 and cache.total_bytes == 0
@@ -0,0 +1,101 @@
+"""
+結果リストのビューア（サーバー側での絞り込み・並べ替え・ページ分割）
+
+結果リスト全体はサーバー側に保持し、画面には現在のページの行だけを送る。
+個別ランク・管理対象・配信有無ごとの行位置の索引、ルームID・愛称の検索用文字列、
+ランク別件数は、結果リストごとに1回だけ作る。並べ替え・合計は型付きの結果リストの数値列をそのまま使い、
+表記（"#N/A" など）への変換は表示するページの行だけに行う。
+"""
+import numpy as np
+import pandas as pd
+
+from engine import INDIVIDUAL_RANKS
+from result_model import render, render_column
+
+
+# --- 定数 ---
+# 索引を作る列
+INDEX_COLUMNS = ["個別ランク", "管理対象", "配信有無"]
+# 並べ替えできる列（数値として並べ替える）
+SORT_COLUMNS = ["R支払想定額", "PL支払想定額", "TC支払想定額", "R分配額", "PL分配額"]
+# 合計を表示する支払想定額の列
+PAYOUT_COLUMNS = ["R支払想定額", "PL支払想定額", "TC支払想定額"]
+# ランク別件数の表示順（数値のランクの後に "#N/A" / "#ERROR" などの表記）
+RANK_ORDER = list(reversed(INDIVIDUAL_RANKS))
+
+
+def _numeric(series):
+    """金額の列（Float64）を数値の配列にする（"#N/A" / "#ERROR_CALC" / 空欄などの行は NaN）"""
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _positions(labels):
+    """{値: 行位置の配列}"""
+    labels = pd.Series(labels)
+    return dict(labels.groupby(labels, sort=False).indices)
+
+
+class ResultView:
+    """1回の処理結果に対する索引と集計（絞り込み・並べ替えは行位置の配列で行い、結果リストはコピーしない）"""
+
+    def __init__(self, results_df):
+        self.results = results_df
+        self.size = len(results_df)
+        # {列: {表記: 行位置の配列}}（個別ランクは "#N/A" / "#ERROR" も1つの値として扱う）
+        self.indexes = {
+            column: _positions(render_column(results_df, column))
+            for column in INDEX_COLUMNS if column in results_df.columns
+        }
+        self.sort_keys = {column: _numeric(results_df[column]) for column in SORT_COLUMNS if column in results_df.columns}
+        self.search_keys = (
+            results_df["ルームID"].astype(str) + "\t" + results_df["ライバー愛称"].astype(str)
+        ).str.lower()
+        self.rank_counts = self._rank_counts()
+        self.totals = {column: float(np.nansum(self.sort_keys[column])) for column in PAYOUT_COLUMNS if column in self.sort_keys}
+
+    def _rank_counts(self):
+        counts = {value: len(positions) for value, positions in self.indexes.get("個別ランク", {}).items()}
+        order = [rank for rank in RANK_ORDER if rank in counts] + sorted(rank for rank in counts if rank not in RANK_ORDER)
+        return pd.DataFrame({"個別ランク": order, "件数": [counts[rank] for rank in order]})
+
+    def values(self, column):
+        """索引のある列の値の一覧"""
+        if column == "個別ランク":
+            return self.rank_counts["個別ランク"].tolist()
+        return sorted(self.indexes.get(column, {}))
+
+    def _mask(self, column, selected):
+        """selected のいずれかの値を持つ行の真偽配列（索引の行位置から作る）"""
+        mask = np.zeros(self.size, dtype=bool)
+        for value in selected:
+            positions = self.indexes.get(column, {}).get(value)
+            if positions is not None:
+                mask[positions] = True
+        return mask
+
+    def query(self, filters=None, search="", sort_by=None, descending=True):
+        """
+        条件に合う行の位置の配列を返す
+        filters: {列: 選択した値のリスト}（空のリスト・None の列は絞り込まない）
+        search: ルームID・愛称の部分一致（大文字・小文字を区別しない）
+        sort_by: SORT_COLUMNS のいずれか（数値にできない値は常に末尾）。None の場合は元の並び順
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for column, selected in (filters or {}).items():
+            if selected:
+                mask &= self._mask(column, selected)
+        if search:
+            mask &= self.search_keys.str.contains(search.strip().lower(), regex=False).to_numpy()
+        positions = np.flatnonzero(mask)
+
+        if sort_by in self.sort_keys and len(positions):
+            keys = self.sort_keys[sort_by][positions]
+            # NaN を末尾にするため、降順の場合は符号を反転して昇順に並べる（同じ値は元の並び順のまま）
+            order = np.argsort(-keys if descending else keys, kind="stable")
+            positions = positions[order]
+        return positions
+
+    def page(self, positions, page, page_size):
+        """positions のうち page ページ目（1始まり）の行だけを取り出し、表記の表にする"""
+        start = (page - 1) * page_size
+        return render(self.results.iloc[positions[start:start + page_size]])